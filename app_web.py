@@ -12,7 +12,8 @@ import sys
 # Agregar el directorio actual al path para importar nuestros módulos
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import DatabaseManager
+from database import DatabaseManager, CONSULTAS
+from detectores import detectores_disponibles
 from gestion_estudiantes import GestorEstudiantes
 from sistema_asistencias import SistemaAsistencias
 
@@ -60,15 +61,10 @@ class InterfazWeb:
         estudiantes_con_rostro = len(set(ids))
         
         hoy = date.today()
-        conn = self.db._get_connection()
+        conn = self.db.conexion()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT COUNT(DISTINCT estudiante_id) 
-            FROM asistencias 
-            WHERE fecha = ?
-        ''', (hoy,))
+        cursor.execute(CONSULTAS['asistencias_hoy'], (hoy,))
         asistencias_hoy = cursor.fetchone()[0]
-        conn.close()
         
         # Mostrar métricas
         col1, col2, col3, col4 = st.columns(4)
@@ -95,19 +91,10 @@ class InterfazWeb:
     
     def mostrar_grafico_semanal(self):
         """Mostrar gráfico de asistencias de la semana"""
-        conn = self.db._get_connection()
+        conn = self.db.conexion()
         
         # Obtener asistencias de los últimos 7 días
-        query = '''
-            SELECT fecha, COUNT(DISTINCT estudiante_id) as asistencias
-            FROM asistencias 
-            WHERE fecha >= date('now', '-7 days')
-            GROUP BY fecha
-            ORDER BY fecha
-        '''
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        df = pd.read_sql_query(CONSULTAS['grafico_semanal'], conn)
         
         if not df.empty:
             fig = px.line(
@@ -124,18 +111,9 @@ class InterfazWeb:
     
     def mostrar_ultimas_asistencias(self):
         """Mostrar tabla de últimas asistencias"""
-        conn = self.db._get_connection()
-        
-        query = '''
-            SELECT a.fecha, a.hora, e.nombre, e.apellido, a.estado, a.metodo_deteccion
-            FROM asistencias a
-            JOIN estudiantes e ON a.estudiante_id = e.id
-            ORDER BY a.fecha DESC, a.hora DESC
-            LIMIT 10
-        '''
+        conn = self.db.conexion()
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        df = pd.read_sql_query(CONSULTAS['ultimas_asistencias'], conn)
         
         if not df.empty:
             # Mejorar formato de la tabla
@@ -255,11 +233,10 @@ class InterfazWeb:
             estudiante_id = estudiantes[opciones_estudiantes.index(estudiante_seleccionado)][0]
             
             # Cargar datos actuales
-            conn = self.db._get_connection()
+            conn = self.db.conexion()
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM estudiantes WHERE id = ?', (estudiante_id,))
             estudiante = cursor.fetchone()
-            conn.close()
             
             if estudiante:
                 with st.form("editar_estudiante"):
@@ -276,15 +253,14 @@ class InterfazWeb:
                     submitted = st.form_submit_button("Actualizar Información")
                     
                     if submitted:
-                        conn = self.db._get_connection()
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            UPDATE estudiantes 
-                            SET nombre=?, apellido=?, edad=?, seccion=?
-                            WHERE id=?
-                        ''', (nuevo_nombre, nuevo_apellido, nueva_edad, nueva_seccion, estudiante_id))
-                        conn.commit()
-                        conn.close()
+                        with self.db.transaccion() as cursor:
+                            cursor.execute('''
+                                UPDATE estudiantes 
+                                SET nombre=?, apellido=?, edad=?, seccion=?
+                                WHERE id=?
+                            ''', (nuevo_nombre, nuevo_apellido, nueva_edad, nueva_seccion, estudiante_id))
+                        # El snapshot guarda los nombres; la versión de la galería ya cambió con el UPDATE
+                        self.db.actualizar_snapshot_galeria()
                         st.success("✅ Información actualizada correctamente")
     
     def capturar_rostros_existente(self):
@@ -353,19 +329,14 @@ class InterfazWeb:
             submitted = st.form_submit_button("💾 Guardar Asistencias")
             
             if submitted:
-                conn = self.db._get_connection()
-                cursor = conn.cursor()
-                
-                for id_est, estado in asistencias_data:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO asistencias 
-                        (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (id_est, fecha, datetime.now().time().strftime('%H:%M:%S'), 
-                          'manual', estado, 1.0))
-                
-                conn.commit()
-                conn.close()
+                with self.db.transaccion() as cursor:
+                    for id_est, estado in asistencias_data:
+                        cursor.execute('''
+                            INSERT OR REPLACE INTO asistencias 
+                            (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (id_est, fecha, datetime.now().time().strftime('%H:%M:%S'), 
+                              'manual', estado, 1.0))
                 st.success(f"✅ {len(asistencias_data)} asistencias guardadas correctamente")
     
     def mostrar_reportes(self):
@@ -388,22 +359,16 @@ class InterfazWeb:
         st.subheader("Estadísticas Generales")
         
         # Aquí puedes agregar más gráficos y estadísticas
-        conn = self.db._get_connection()
+        conn = self.db.conexion()
         
         # Porcentaje de asistencias por estado
-        query = '''
-            SELECT estado, COUNT(*) as count
-            FROM asistencias
-            GROUP BY estado
-        '''
-        df_estados = pd.read_sql_query(query, conn)
+        df_estados = pd.read_sql_query(CONSULTAS['asistencias_por_estado'], conn)
         
         if not df_estados.empty:
             fig = px.pie(df_estados, values='count', names='estado', 
                         title="Distribución de Asistencias por Estado")
             st.plotly_chart(fig, use_container_width=True)
         
-        conn.close()
     
     def configuracion(self):
         """Interfaz de configuración"""
@@ -414,17 +379,23 @@ class InterfazWeb:
         with st.form("config_form"):
             hora_entrada = st.time_input("Hora de entrada", value=datetime.strptime("08:00", "%H:%M").time())
             tolerancia = st.number_input("Tolerancia en minutos", min_value=0, max_value=60, value=15)
+            # Solo los que cargan: guardar uno sin modelos impediría arrancar el monitor
+            detectores = sorted(detectores_disponibles())
+            configurado = self.db.detector_configurado()
+            detector = st.selectbox("Detector de rostros", detectores,
+                                    index=detectores.index(configurado) if configurado in detectores else detectores.index('hog'),
+                                    help="hog: equilibrado | haar: más rápido | dnn: más robusto (requiere modelos/)")
             
             if st.form_submit_button("💾 Guardar Configuración"):
-                conn = self.db._get_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE configuracion 
-                    SET hora_entrada=?, tolerancia_minutos=?, ultima_actualizacion=CURRENT_TIMESTAMP
-                    WHERE id=1
-                ''', (hora_entrada.strftime('%H:%M:%S'), tolerancia))
-                conn.commit()
-                conn.close()
+                if detector not in detectores_disponibles():
+                    st.error(f"❌ El detector '{detector}' no se puede cargar en esta instalación")
+                    return
+                with self.db.transaccion() as cursor:
+                    cursor.execute('''
+                        UPDATE configuracion 
+                        SET hora_entrada=?, tolerancia_minutos=?, detector=?, ultima_actualizacion=CURRENT_TIMESTAMP
+                        WHERE id=1
+                    ''', (hora_entrada.strftime('%H:%M:%S'), tolerancia, detector))
                 st.success("✅ Configuración guardada correctamente")
 
 
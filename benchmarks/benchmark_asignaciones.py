@@ -0,0 +1,128 @@
+# benchmarks/benchmark_asignaciones.py
+"""Memoria asignada por frame en el bucle de captura: copias por frame vs anillo de CamaraManager
+
+Uso: python benchmarks/benchmark_asignaciones.py [--frames 300] [--ancho 640] [--alto 480] [--escala 0.5]
+
+Usa una fuente sintética con la interfaz de cv2.VideoCapture (sin cámara). Cada
+iteración hace lo que el bucle de captura e inscripción: leer, convertir a RGB,
+reducir y preparar un lienzo para dibujar. La memoria se mide con tracemalloc
+(numpy y OpenCV registran ahí los datos de los arreglos).
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camara_utils import CamaraManager
+
+
+class FuenteSintetica:
+    """Imita cv2.VideoCapture: decodifica en `image` si se entrega uno compatible"""
+
+    def __init__(self, ancho=640, alto=480, num_frames=300, semilla=0):
+        rng = np.random.default_rng(semilla)
+        # Pocos frames base que se recorren: el costo de "decodificar" es una copia
+        self._base = [rng.integers(0, 255, size=(alto, ancho, 3), dtype=np.uint8) for _ in range(4)]
+        self.num_frames = num_frames
+        self.leidos = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.leidos >= self.num_frames:
+            return False, None
+        origen = self._base[self.leidos % len(self._base)]
+        self.leidos += 1
+        if image is None or image.shape != origen.shape:
+            image = np.empty_like(origen)
+        np.copyto(image, origen)
+        return True, image
+
+    def get(self, propiedad):
+        return 30.0 if propiedad == cv2.CAP_PROP_FPS else 0.0
+
+    def set(self, propiedad, valor):
+        return False
+
+    def release(self):
+        pass
+
+
+def iteracion_con_copias(fuente, escala):
+    """El bucle anterior: cada paso crea un arreglo nuevo"""
+    ok, frame = fuente.read()
+    if not ok:
+        return False
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    reducido = cv2.resize(frame, (0, 0), fx=escala, fy=escala)
+    lienzo = frame.copy()
+    cv2.putText(lienzo, "lienzo", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return rgb, reducido
+
+
+def iteracion_con_anillo(camara, escala):
+    frame, ok = camara.capturar_frame()
+    if not ok:
+        return False
+    rgb = camara.rgb(frame)
+    reducido = camara.reducir(frame, escala)
+    lienzo = camara.lienzo(frame)
+    cv2.putText(lienzo, "lienzo", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return rgb, reducido
+
+
+def medir(paso, num_frames, calentamiento=10):
+    """Bytes asignados por frame (pico sobre lo vivo al empezar) y ms por frame"""
+    for _ in range(calentamiento):
+        paso()
+    tracemalloc.start()
+    bytes_por_frame = []
+    inicio_total = time.perf_counter()
+    for _ in range(num_frames):
+        vivo, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        if paso() is False:
+            break
+        _, pico = tracemalloc.get_traced_memory()
+        bytes_por_frame.append(pico - vivo)
+    transcurrido = time.perf_counter() - inicio_total
+    tracemalloc.stop()
+    return np.array(bytes_por_frame), 1000 * transcurrido / max(len(bytes_por_frame), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--ancho', type=int, default=640)
+    parser.add_argument('--alto', type=int, default=480)
+    parser.add_argument('--escala', type=float, default=0.5)
+    args = parser.parse_args()
+
+    bytes_frame = args.ancho * args.alto * 3
+    total = args.frames + 20
+
+    fuente = FuenteSintetica(args.ancho, args.alto, total)
+    copias, ms_copias = medir(lambda: iteracion_con_copias(fuente, args.escala), args.frames)
+
+    camara = CamaraManager(FuenteSintetica(args.ancho, args.alto, total))
+    camara.inicializar_camara()
+    anillo, ms_anillo = medir(lambda: iteracion_con_anillo(camara, args.escala), args.frames)
+    camara.liberar_camara(cerrar_ventanas=False)
+
+    print(f"Frames de {args.ancho}x{args.alto} ({bytes_frame / 1024:.0f} KB), {len(copias)} iteraciones")
+    print(f"{'bucle':<14} {'KB/frame':>10} {'frames/iter':>12} {'máx KB':>9} {'ms/frame':>9}")
+    for nombre, medidas, ms in (('con copias', copias, ms_copias), ('anillo', anillo, ms_anillo)):
+        print(f"{nombre:<14} {medidas.mean() / 1024:10.1f} {medidas.mean() / bytes_frame:12.2f} "
+              f"{medidas.max() / 1024:9.1f} {ms:9.2f}")
+    print(f"Buffers de frame creados por el anillo: {camara.asignaciones} (anillo de {camara.num_buffers})")
+
+
+if __name__ == "__main__":
+    main()
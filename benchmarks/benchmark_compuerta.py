@@ -0,0 +1,102 @@
+# benchmarks/benchmark_compuerta.py
+"""Compuerta de movimiento sobre video grabado: frames y área enviados a detección, costo y rostros perdidos
+
+Uso: python benchmarks/benchmark_compuerta.py VIDEO [--paso 2] [--detectar] [--max-frames 3000]
+     python benchmarks/benchmark_compuerta.py --sintetico   (pasillo vacío con una persona de paso)
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compuerta_movimiento import CompuertaMovimiento
+
+
+def video_sintetico(num_frames=900, ancho=640, alto=480, semilla=0):
+    """Fondo estático con ruido de sensor; una 'persona' cruza entre el 40% y el 60% del video"""
+    rng = np.random.default_rng(semilla)
+    fondo = cv2.GaussianBlur(rng.integers(40, 200, size=(alto, ancho, 3), dtype=np.uint8), (21, 21), 0)
+    for i in range(num_frames):
+        frame = cv2.add(fondo, rng.integers(0, 4, size=fondo.shape, dtype=np.uint8))
+        avance = (i - 0.4 * num_frames) / (0.2 * num_frames)
+        if 0 <= avance <= 1:
+            x = int(avance * (ancho - 120))
+            cv2.rectangle(frame, (x, 120), (x + 120, 460), (70, 90, 160), -1)
+            cv2.circle(frame, (x + 60, 90), 45, (150, 170, 210), -1)
+        yield frame
+
+
+def frames_de_video(ruta):
+    cap = cv2.VideoCapture(ruta)
+    if not cap.isOpened():
+        raise SystemExit(f"No se puede abrir el video: {ruta}")
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield frame
+    cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--sintetico', action='store_true')
+    parser.add_argument('--paso', type=int, default=2, help='evaluar 1 de cada N frames (como el monitor)')
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--detectar', action='store_true',
+                        help='comparar detección HOG en frame completo vs solo en las regiones')
+    args = parser.parse_args()
+    if not args.video and not args.sintetico:
+        parser.error("indica un VIDEO o --sintetico")
+
+    frames = video_sintetico() if args.sintetico else frames_de_video(args.video)
+    compuerta = CompuertaMovimiento()
+    if args.detectar:
+        from motor_procesos import detectar_y_codificar
+
+    t_compuerta = 0.0
+    t_completo = t_regiones = 0.0
+    rostros_completo = rostros_regiones = 0
+    evaluados = 0
+    for numero, frame in enumerate(frames, start=1):
+        if args.max_frames and numero > args.max_frames:
+            break
+        if numero % args.paso:
+            continue
+        evaluados += 1
+        inicio = time.perf_counter()
+        regiones = compuerta.regiones(frame)
+        t_compuerta += time.perf_counter() - inicio
+
+        if args.detectar:
+            inicio = time.perf_counter()
+            completo, _ = detectar_y_codificar(frame, omitir=lambda locs: [True] * len(locs))
+            t_completo += time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            en_regiones, _ = detectar_y_codificar(frame, omitir=lambda locs: [True] * len(locs), regiones=regiones)
+            t_regiones += time.perf_counter() - inicio
+            rostros_completo += len(completo)
+            rostros_regiones += len(en_regiones)
+
+    metricas = compuerta.metricas()
+    pasan = evaluados - metricas['sin_cambios']
+    print(f"Frames evaluados:            {evaluados}")
+    print(f"Pasan a detección:           {pasan} ({100 * pasan / max(evaluados, 1):.1f}%)")
+    print(f"  con regiones / completos:  {metricas['con_regiones']} / {metricas['frame_completo']} "
+          f"(+{metricas['latidos']} latidos)")
+    print(f"Área media enviada:          {100 * metricas['fraccion_area_media']:.1f}% del frame")
+    print(f"Costo de la compuerta:       {1000 * t_compuerta / max(evaluados, 1):.2f} ms/frame")
+    if args.detectar:
+        print(f"Detección frame completo:    {1000 * t_completo / evaluados:.1f} ms/frame, {rostros_completo} rostros")
+        print(f"Detección con compuerta:     {1000 * (t_regiones + t_compuerta) / evaluados:.1f} ms/frame, "
+              f"{rostros_regiones} rostros ({rostros_completo - rostros_regiones} perdidos)")
+
+
+if __name__ == "__main__":
+    main()
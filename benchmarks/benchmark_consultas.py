@@ -0,0 +1,116 @@
+# benchmarks/benchmark_consultas.py
+"""Genera años de asistencias sintéticas y verifica que las consultas frecuentes usen índices
+
+Uso: python benchmarks/benchmark_consultas.py [--anios 3] [--estudiantes 1500] [--db /tmp/bench.db]
+
+Falla (código de salida 1) si el EXPLAIN QUERY PLAN de alguna consulta hace un
+recorrido completo de asistencias sin índice.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, CONSULTAS
+
+PARAMETROS = {
+    'asistencias_hoy': lambda hoy, est: (hoy,),
+    'grafico_semanal': lambda hoy, est: (),
+    'ultimas_asistencias': lambda hoy, est: (),
+    'asistencias_por_estado': lambda hoy, est: (),
+    'presentes_por_fecha': lambda hoy, est: (hoy, 'rostro'),
+    'asistencia_del_dia': lambda hoy, est: (est, hoy, 'rostro'),
+}
+
+
+def poblar(db, anios, num_estudiantes, semilla=0):
+    """Estudiantes + un registro por estudiante y día lectivo (~90% de asistencia)"""
+    rng = random.Random(semilla)
+    with db.transaccion() as cursor:
+        cursor.executemany(
+            "INSERT INTO estudiantes (codigo, nombre, apellido, fecha_registro) VALUES (?, ?, ?, ?)",
+            [(f"B{i}", f"Nombre{i}", f"Apellido{i}", date.today()) for i in range(num_estudiantes)]
+        )
+        cursor.execute("SELECT id FROM estudiantes")
+        ids = [row[0] for row in cursor.fetchall()]
+
+    dia = date.today() - timedelta(days=365 * anios)
+    total = 0
+    while dia <= date.today():
+        if dia.weekday() < 5:
+            filas = []
+            for estudiante_id in ids:
+                if rng.random() < 0.9:
+                    hora = f"07:{rng.randint(30, 59):02d}:{rng.randint(0, 59):02d}"
+                    estado = 'tardanza' if rng.random() < 0.1 else 'presente'
+                    filas.append((estudiante_id, dia, hora, 'rostro', estado, 0.8))
+            with db.transaccion() as cursor:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO asistencias (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', filas)
+            total += len(filas)
+        dia += timedelta(days=1)
+    with db.transaccion() as cursor:
+        cursor.execute("ANALYZE")
+    return ids, total
+
+
+def plan_usa_indice(plan, tablas=('asistencias', 'a')):
+    """True si ninguna línea del plan recorre asistencias sin índice"""
+    for linea in plan:
+        partes = linea[-1].split()
+        if len(partes) > 1 and partes[0] == 'SCAN' and partes[1] in tablas and 'INDEX' not in partes:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--anios', type=int, default=3)
+    parser.add_argument('--estudiantes', type=int, default=1500)
+    parser.add_argument('--db', default='bench_consultas.db')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    for sufijo in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + sufijo):
+            os.remove(args.db + sufijo)
+
+    db = DatabaseManager(args.db)
+    inicio = time.perf_counter()
+    ids, total = poblar(db, args.anios, args.estudiantes)
+    print(f"📦 {total} asistencias sintéticas en {time.perf_counter() - inicio:.1f} s "
+          f"(esquema v{db.version_esquema()})")
+
+    conn = db.conexion()
+    hoy = date.today() - timedelta(days=1)
+    fallas = []
+    print(f"\n{'consulta':<24} {'ms':>9}  plan")
+    for nombre, sql in CONSULTAS.items():
+        parametros = PARAMETROS[nombre](hoy, ids[len(ids) // 2])
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, parametros).fetchall()
+
+        inicio = time.perf_counter()
+        for _ in range(args.repeticiones):
+            conn.execute(sql, parametros).fetchall()
+        ms = 1000 * (time.perf_counter() - inicio) / args.repeticiones
+
+        ok = plan_usa_indice(plan)
+        if not ok:
+            fallas.append(nombre)
+        print(f"{nombre:<24} {ms:>9.3f}  {'✅' if ok else '❌'} {' | '.join(linea[-1] for linea in plan)}")
+
+    db.cerrar()
+    if fallas:
+        print(f"\n❌ Consultas sin índice: {', '.join(fallas)}")
+        sys.exit(1)
+    print("\n✅ Todas las consultas usan índices")
+
+
+if __name__ == "__main__":
+    main()
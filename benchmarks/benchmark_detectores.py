@@ -0,0 +1,110 @@
+# benchmarks/benchmark_detectores.py
+"""Latencia y recall de cada detector de rostros sobre un conjunto de imágenes
+
+Uso: python benchmarks/benchmark_detectores.py [CARPETA] [--anotaciones rostros.csv]
+         [--detectores hog haar dnn] [--escala 0.5] [--upsample 1]
+
+Por defecto usa las fotos de inscripción (imagenes_estudiantes/), que tienen un
+rostro cada una. Con --anotaciones (CSV archivo,top,right,bottom,left; una fila
+por rostro) el recall cuenta solo detecciones con IoU >= 0.3 sobre cada rostro
+anotado y las detecciones sobrantes se reportan como falsos positivos.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectores import DETECTORES, crear_detector
+from seguimiento_rostros import iou
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def cargar_imagenes(carpeta, escala):
+    """{archivo: imagen RGB reducida por `escala`}"""
+    imagenes = {}
+    for archivo in sorted(os.listdir(carpeta)):
+        if not archivo.lower().endswith(EXTENSIONES):
+            continue
+        imagen = cv2.imread(os.path.join(carpeta, archivo))
+        if imagen is None:
+            continue
+        if escala != 1.0:
+            imagen = cv2.resize(imagen, (0, 0), fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        imagenes[archivo] = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+    return imagenes
+
+
+def cargar_anotaciones(ruta, escala):
+    anotaciones = defaultdict(list)
+    with open(ruta, newline='', encoding='utf-8') as archivo:
+        for fila in csv.DictReader(archivo):
+            caja = tuple(int(int(fila[c]) * escala) for c in ('top', 'right', 'bottom', 'left'))
+            anotaciones[fila['archivo']].append(caja)
+    return anotaciones
+
+
+def evaluar(detector, imagenes, anotaciones, upsample):
+    """Tiempos por imagen (ms), rostros encontrados, rostros esperados y falsos positivos"""
+    tiempos = []
+    encontrados = esperados = falsos = 0
+    for archivo, imagen in imagenes.items():
+        inicio = time.perf_counter()
+        cajas = detector.detectar(imagen, upsample)
+        tiempos.append(1000 * (time.perf_counter() - inicio))
+
+        if anotaciones is None:
+            # Fotos de inscripción: exactamente un rostro por imagen
+            esperados += 1
+            encontrados += min(len(cajas), 1)
+            falsos += max(len(cajas) - 1, 0)
+            continue
+        reales = anotaciones.get(archivo, [])
+        esperados += len(reales)
+        if not reales or not cajas:
+            falsos += len(cajas)
+            continue
+        coincide = iou(reales, cajas) >= 0.3
+        encontrados += int(coincide.any(axis=1).sum())
+        falsos += int((~coincide.any(axis=0)).sum())
+    return np.array(tiempos), encontrados, esperados, falsos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('carpeta', nargs='?', default='imagenes_estudiantes')
+    parser.add_argument('--anotaciones', default=None)
+    parser.add_argument('--detectores', nargs='+', default=['hog', 'haar', 'dnn'], choices=sorted(DETECTORES))
+    parser.add_argument('--escala', type=float, default=1.0, help='reducir las imágenes como lo hace el monitor')
+    parser.add_argument('--upsample', type=int, default=1)
+    args = parser.parse_args()
+
+    imagenes = cargar_imagenes(args.carpeta, args.escala)
+    if not imagenes:
+        raise SystemExit(f"No hay imágenes en {args.carpeta}")
+    anotaciones = cargar_anotaciones(args.anotaciones, args.escala) if args.anotaciones else None
+    print(f"🖼️ {len(imagenes)} imágenes de {args.carpeta} (escala {args.escala}, upsample {args.upsample})")
+
+    print(f"{'detector':>8} {'ms media':>9} {'ms p95':>8} {'recall':>7} {'falsos +':>9}")
+    for nombre in args.detectores:
+        try:
+            detector = crear_detector(nombre)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"{nombre:>8}  omitido: {e}")
+            continue
+        # La primera llamada carga modelos y reserva memoria: no cuenta
+        detector.detectar(next(iter(imagenes.values())), args.upsample)
+        tiempos, encontrados, esperados, falsos = evaluar(detector, imagenes, anotaciones, args.upsample)
+        recall = encontrados / esperados if esperados else 0.0
+        print(f"{nombre:>8} {tiempos.mean():9.1f} {np.percentile(tiempos, 95):8.1f} {recall:7.1%} {falsos:9d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# benchmarks/benchmark_etapas.py
+"""Latencia por etapa del reconocimiento con resultados en JSON comparables entre commits
+
+Uso: python benchmarks/benchmark_etapas.py [--fuente sintetico|CARPETA|VIDEO] [--frames 100]
+         [--detector hog] [--galerias 1000 10000 100000] [--json resultados.json]
+         [--comparar base.json] [--tolerancia 0.15] [--etapas decodificacion ...]
+
+Etapas: decodificación del frame, conversión (cvtColor y resize), detección,
+encoding, comparación contra galerías sintéticas de cada tamaño, escritura de
+asistencias y consultas del dashboard. La fuente puede ser una carpeta de
+imágenes, un archivo de video o frames sintéticos comprimidos en JPEG, siempre a
+través de CamaraManager como en el monitor.
+
+Con --comparar se compara la mediana (ms_p50) de cada etapa con un resultado
+anterior y el código de salida es 1 si alguna empeora más que --tolerancia.
+Las etapas que requieren face_recognition o modelos ausentes se marcan como
+omitidas en lugar de fallar.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camara_utils import CamaraManager, FuenteImagenes
+from database import CONSULTAS, DatabaseManager
+from galeria import GaleriaFacial, IndiceEstudiantes
+
+from benchmark_consultas import PARAMETROS, poblar
+from benchmark_indices import consultas_sinteticas, galeria_sintetica
+
+ETAPAS = ('decodificacion', 'conversion', 'deteccion', 'codificacion', 'comparacion', 'escritura', 'consultas')
+VERSION_FORMATO = 1
+
+
+class FuenteSinteticaJPEG:
+    """Frames sintéticos guardados como JPEG: leer cuesta una decodificación real (cv2.imdecode)"""
+
+    def __init__(self, ancho=640, alto=480, num_frames=100, semilla=0):
+        rng = np.random.default_rng(semilla)
+        self._jpegs = []
+        for _ in range(8):
+            frame = cv2.GaussianBlur(rng.integers(0, 255, size=(alto, ancho, 3), dtype=np.uint8), (9, 9), 0)
+            cv2.ellipse(frame, (ancho // 2, alto // 2), (ancho // 8, alto // 5), 0, 0, 360, (150, 170, 210), -1)
+            self._jpegs.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1])
+        self.num_frames = num_frames
+        self.leidos = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.leidos >= self.num_frames:
+            return False, None
+        frame = cv2.imdecode(self._jpegs[self.leidos % len(self._jpegs)], cv2.IMREAD_COLOR)
+        self.leidos += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def get(self, propiedad):
+        return 30.0 if propiedad == cv2.CAP_PROP_FPS else 0.0
+
+    def set(self, propiedad, valor):
+        return False
+
+    def release(self):
+        pass
+
+
+def abrir_fuente(fuente, num_frames, ancho, alto):
+    """'sintetico', carpeta de imágenes (escaladas a ancho x alto) o archivo de video"""
+    if fuente == 'sintetico':
+        return FuenteSinteticaJPEG(ancho, alto, num_frames)
+    if os.path.isdir(fuente):
+        return FuenteImagenes(fuente, tamano=(ancho, alto))
+    return cv2.VideoCapture(fuente)
+
+
+def resumir(tiempos_ms, **extra):
+    """Estadísticos de una lista de tiempos en milisegundos"""
+    tiempos = np.asarray(tiempos_ms, dtype=np.float64)
+    if len(tiempos) == 0:
+        return {'omitida': 'sin mediciones', **extra}
+    return {
+        'n': int(len(tiempos)),
+        'ms_media': round(float(tiempos.mean()), 4),
+        'ms_p50': round(float(np.percentile(tiempos, 50)), 4),
+        'ms_p95': round(float(np.percentile(tiempos, 95)), 4),
+        **extra,
+    }
+
+
+def medir_frames(args, etapas):
+    """Decodificación, conversión, detección y encoding sobre los frames de la fuente"""
+    camara = CamaraManager(abrir_fuente(args.fuente, args.frames, args.ancho, args.alto))
+    if not camara.inicializar_camara():
+        raise SystemExit(f"No se pudo abrir la fuente: {args.fuente}")
+
+    detector = codificar_recortes = None
+    omitidas = {}
+    if 'deteccion' in etapas or 'codificacion' in etapas:
+        try:
+            from detectores import crear_detector
+            detector = crear_detector(args.detector)
+            # Carga perezosa del modelo: la primera llamada no se mide
+            detector.detectar(np.zeros((args.alto // 2, args.ancho // 2, 3), dtype=np.uint8), args.upsample)
+        except (ImportError, FileNotFoundError) as e:
+            detector = None
+            omitidas['deteccion'] = str(e)
+    if 'codificacion' in etapas:
+        try:
+            import face_recognition  # noqa: F401 (solo verificar que está instalado)
+            from motor_procesos import codificar_recortes
+        except ImportError as e:
+            omitidas['codificacion'] = str(e)
+
+    tiempos = {etapa: [] for etapa in ('decodificacion', 'conversion', 'deteccion', 'codificacion')}
+    rostros = codificados = 0
+    forma = None
+    for _ in range(args.frames):
+        inicio = time.perf_counter()
+        frame, ok = camara.capturar_frame()
+        if not ok:
+            break
+        tiempos['decodificacion'].append(1000 * (time.perf_counter() - inicio))
+        forma = list(frame.shape)
+
+        inicio = time.perf_counter()
+        camara.rgb(frame)
+        reducido = camara.reducir(frame, args.escala)
+        rgb_reducido = cv2.cvtColor(reducido, cv2.COLOR_BGR2RGB)
+        tiempos['conversion'].append(1000 * (time.perf_counter() - inicio))
+
+        ubicaciones = []
+        if detector is not None:
+            inicio = time.perf_counter()
+            ubicaciones = detector.detectar(rgb_reducido, args.upsample)
+            tiempos['deteccion'].append(1000 * (time.perf_counter() - inicio))
+            rostros += len(ubicaciones)
+
+        if codificar_recortes is not None:
+            factor = 1 / args.escala
+            ubicaciones = [tuple(int(v * factor) for v in caja) for caja in ubicaciones]
+            if not ubicaciones:
+                # Sin rostros detectados (p. ej. frames sintéticos): codificar una caja central
+                alto, ancho = frame.shape[:2]
+                lado = min(alto, ancho) // 3
+                ubicaciones = [((alto - lado) // 2, (ancho + lado) // 2, (alto + lado) // 2, (ancho - lado) // 2)]
+            inicio = time.perf_counter()
+            codificar_recortes(frame, ubicaciones)
+            tiempos['codificacion'].append(1000 * (time.perf_counter() - inicio))
+            codificados += len(ubicaciones)
+    camara.liberar_camara(cerrar_ventanas=False)
+
+    resultados = {}
+    extras = {
+        'decodificacion': {'forma': forma},
+        'conversion': {'escala': args.escala},
+        'deteccion': {'detector': args.detector, 'rostros': rostros},
+        'codificacion': {'rostros': codificados},
+    }
+    for etapa, medidas in tiempos.items():
+        if etapa not in etapas:
+            continue
+        if etapa in omitidas:
+            resultados[etapa] = {'omitida': omitidas[etapa]}
+        else:
+            resultados[etapa] = resumir(medidas, **extras[etapa])
+    if 'deteccion' in omitidas and 'codificacion' in etapas and 'codificacion' not in omitidas:
+        resultados['codificacion']['nota'] = 'caja central fija (sin detector)'
+    return resultados
+
+
+def medir_comparacion(tamano, rostros_por_frame=4, repeticiones=200, semilla=0):
+    """comparar_lote con la mitad de los rostros de estudiantes inscritos y la mitad desconocidos"""
+    vectores, etiquetas, centros = galeria_sintetica(tamano, semilla=semilla)
+    nombres = [f"Estudiante {e}" for e in etiquetas]
+    inicio = time.perf_counter()
+    indice = IndiceEstudiantes(GaleriaFacial(vectores, nombres, etiquetas), 'min', backend='auto')
+    construccion_ms = 1000 * (time.perf_counter() - inicio)
+
+    conocidos = consultas_sinteticas(centros, repeticiones * rostros_por_frame // 2, semilla=semilla + 1)
+    desconocidos, _, _ = galeria_sintetica(repeticiones * rostros_por_frame // 2, 1, semilla=semilla + 2)
+    consultas = np.vstack([conocidos, desconocidos])
+    np.random.default_rng(semilla).shuffle(consultas)
+
+    indice.comparar_lote(consultas[:rostros_por_frame])
+    indice.rechazos_tempranos = 0
+    tiempos = []
+    for i in range(0, len(consultas), rostros_por_frame):
+        inicio = time.perf_counter()
+        indice.comparar_lote(consultas[i:i + rostros_por_frame])
+        tiempos.append(1000 * (time.perf_counter() - inicio))
+    return resumir(tiempos, encodings=tamano, rostros_por_frame=rostros_por_frame,
+                   backend=indice.tipo_backend, construccion_ms=round(construccion_ms, 1),
+                   fraccion_rechazo_temprano=round(indice.rechazos_tempranos / len(consultas), 3))
+
+
+def medir_escritura(db, ids, num_registros, lote=20):
+    """registrar_asistencias_lote en lotes de `lote` (como el escritor de asistencias): ms por lote"""
+    metodos = ('rostro', 'qr')
+    manana = datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).replace(hour=7, minute=45)
+    # Fechas futuras (poblar llega hasta hoy); cada vuelta sobre los estudiantes usa otro
+    # método y, agotados los métodos, otro día: el índice único no descarta ninguno
+    registros = []
+    for i in range(num_registros):
+        vuelta = i // len(ids)
+        momento = manana + timedelta(days=vuelta // len(metodos))
+        registros.append((ids[i % len(ids)], metodos[vuelta % len(metodos)], 0.8, momento))
+    tiempos = []
+    insertados = 0
+    for i in range(0, len(registros), lote):
+        inicio = time.perf_counter()
+        estados = db.registrar_asistencias_lote(registros[i:i + lote])
+        tiempos.append(1000 * (time.perf_counter() - inicio))
+        insertados += sum(estado is not None for estado in estados)
+    if insertados != num_registros:
+        raise SystemExit(f"Escritura: solo {insertados} de {num_registros} asistencias insertadas")
+    return resumir(tiempos, registros=num_registros, registros_por_lote=lote)
+
+
+def medir_consultas(db, ids, repeticiones=20):
+    """Cada consulta frecuente del dashboard y del monitor"""
+    conn = db.conexion()
+    hoy = date.today() - timedelta(days=1)
+    resultados = {}
+    for nombre, sql in CONSULTAS.items():
+        parametros = PARAMETROS[nombre](hoy, ids[len(ids) // 2])
+        conn.execute(sql, parametros).fetchall()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            conn.execute(sql, parametros).fetchall()
+            tiempos.append(1000 * (time.perf_counter() - inicio))
+        resultados[nombre] = resumir(tiempos)
+    return resultados
+
+
+def entorno():
+    """Versión del código y de la plataforma para interpretar la comparación"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit or None,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def aplanar(etapas, prefijo=''):
+    """{'comparacion/10000': {...}, ...}: una entrada por medición con ms_p50"""
+    planas = {}
+    for nombre, valor in etapas.items():
+        if 'ms_p50' in valor:
+            planas[prefijo + nombre] = valor
+        elif 'omitida' not in valor:
+            planas.update(aplanar(valor, f"{prefijo}{nombre}/"))
+    return planas
+
+
+def comparar(actual, anterior, tolerancia):
+    """Imprimir la variación de cada medición; retorna las que empeoraron más que `tolerancia`"""
+    nuevas, base = aplanar(actual['etapas']), aplanar(anterior['etapas'])
+    print(f"\nComparación con {anterior.get('entorno', {}).get('commit') or 'resultado anterior'}")
+    distintos = [clave for clave, valor in actual['parametros'].items()
+                 if clave not in ('etapas', 'tolerancia') and anterior.get('parametros', {}).get(clave, valor) != valor]
+    if distintos:
+        print(f"⚠️ Parámetros distintos ({', '.join(distintos)}): las mediciones afectadas no son comparables")
+    print(f"{'medición':<36} {'antes p50':>10} {'ahora p50':>10} {'cambio':>8}")
+    regresiones = []
+    for nombre in sorted(set(nuevas) & set(base)):
+        antes, ahora = base[nombre]['ms_p50'], nuevas[nombre]['ms_p50']
+        cambio = ahora / antes - 1 if antes > 0 else 0.0
+        marca = ''
+        if cambio > tolerancia:
+            regresiones.append(nombre)
+            marca = ' ❌'
+        print(f"{nombre:<36} {antes:10.3f} {ahora:10.3f} {cambio:+8.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fuente', default='sintetico', help="'sintetico', carpeta de imágenes o archivo de video")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--ancho', type=int, default=640)
+    parser.add_argument('--alto', type=int, default=480)
+    parser.add_argument('--escala', type=float, default=0.5)
+    parser.add_argument('--detector', default='hog')
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--galerias', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--escrituras', type=int, default=2000, help='asistencias a registrar')
+    parser.add_argument('--estudiantes', type=int, default=500, help='estudiantes de la base sintética')
+    parser.add_argument('--anios', type=int, default=1, help='años de asistencias sintéticas para las consultas')
+    parser.add_argument('--etapas', nargs='+', default=list(ETAPAS), choices=ETAPAS)
+    parser.add_argument('--json', default=None, help='guardar los resultados en este archivo')
+    parser.add_argument('--comparar', default=None, help='resultado JSON anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='empeoramiento máximo de ms_p50')
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)  # mediciones de un solo núcleo, estables entre máquinas
+    etapas = {}
+    if set(args.etapas) & {'decodificacion', 'conversion', 'deteccion', 'codificacion'}:
+        print(f"🎞️ Etapas por frame sobre {args.fuente} ({args.frames} frames)")
+        etapas.update(medir_frames(args, args.etapas))
+
+    if 'comparacion' in args.etapas:
+        etapas['comparacion'] = {}
+        for tamano in args.galerias:
+            print(f"🔍 Comparación contra {tamano} encodings")
+            etapas['comparacion'][str(tamano)] = medir_comparacion(tamano)
+
+    if 'escritura' in args.etapas or 'consultas' in args.etapas:
+        with tempfile.TemporaryDirectory() as directorio:
+            db = DatabaseManager(os.path.join(directorio, 'bench.db'))
+            print(f"📦 Base sintética: {args.estudiantes} estudiantes, {args.anios} año(s) de asistencias")
+            ids, _ = poblar(db, args.anios, args.estudiantes)
+            if 'consultas' in args.etapas:
+                etapas['consultas'] = medir_consultas(db, ids)
+            if 'escritura' in args.etapas:
+                etapas['escritura'] = medir_escritura(db, ids, args.escrituras)
+            db.cerrar()
+
+    resultado = {
+        'formato': VERSION_FORMATO,
+        'entorno': entorno(),
+        'parametros': {clave: valor for clave, valor in vars(args).items() if clave not in ('json', 'comparar')},
+        'etapas': etapas,
+    }
+
+    print(f"\n{'medición':<36} {'p50 ms':>9} {'p95 ms':>9} {'n':>6}")
+    for nombre, valor in aplanar(etapas).items():
+        print(f"{nombre:<36} {valor['ms_p50']:9.3f} {valor['ms_p95']:9.3f} {valor['n']:6d}")
+    for nombre, valor in etapas.items():
+        if 'omitida' in valor:
+            print(f"{nombre:<36} omitida: {valor['omitida']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {args.json}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        regresiones = comparar(resultado, anterior, args.tolerancia)
+        if regresiones:
+            print(f"\n❌ Regresiones de más de {args.tolerancia:.0%}: {', '.join(regresiones)}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
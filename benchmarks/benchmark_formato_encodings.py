@@ -0,0 +1,126 @@
+# benchmarks/benchmark_formato_encodings.py
+"""Tiempo de carga, RAM y precisión de los formatos de encodings (float64 antiguo, float32, int8)
+
+Uso: python benchmarks/benchmark_formato_encodings.py [--encodings 100000] [--dir /tmp]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_indices import galeria_sintetica, consultas_sinteticas
+from database import DatabaseManager
+from formato_encodings import codificar
+from galeria import distancias_euclidianas
+
+
+def crear_db(ruta, vectores, etiquetas, formato):
+    """Base con un estudiante por etiqueta y un BLOB por vector en el formato indicado"""
+    db = DatabaseManager(ruta)
+    with db.transaccion() as cursor:
+        cursor.executemany(
+            "INSERT INTO estudiantes (id, codigo, nombre, apellido, fecha_registro) VALUES (?, ?, ?, ?, ?)",
+            [(int(e) + 1, f"B{e}", f"Nombre{e}", "Apellido", date.today()) for e in np.unique(etiquetas)]
+        )
+        if formato == 'float64':
+            blobs = (v.tobytes() for v in vectores)
+        else:
+            blobs = (codificar(v, formato) for v in vectores)
+        cursor.executemany(
+            "INSERT INTO encodings_faciales (estudiante_id, encoding_data, fecha_creacion) VALUES (?, ?, ?)",
+            ((int(e) + 1, blob, date.today()) for e, blob in zip(etiquetas, blobs))
+        )
+    return db
+
+
+def cargar_por_fila(db):
+    """Carga anterior: np.frombuffer por fila y np.vstack al construir la galería"""
+    cursor = db.conexion().cursor()
+    cursor.execute('''
+        SELECT e.id, e.estudiante_id, est.nombre, est.apellido, e.encoding_data
+        FROM encodings_faciales e
+        JOIN estudiantes est ON e.estudiante_id = est.id
+        WHERE est.activo = 1
+        ORDER BY e.id
+    ''')
+    encodings = [np.frombuffer(row[4], dtype=np.float64) for row in cursor.fetchall()]
+    cursor.close()
+    return np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+
+
+def medir_carga(funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    matriz = funcion()
+    transcurrido = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return matriz, transcurrido, pico
+
+
+def comparar_con_referencia(consultas, referencia, matriz, bloque=100):
+    """Coincidencia del vecino más cercano y error de distancia frente a float64 (por bloques de consultas)"""
+    iguales, suma, maximo = 0, 0.0, 0.0
+    matriz = matriz.astype(np.float64)
+    for inicio in range(0, len(consultas), bloque):
+        lote = consultas[inicio:inicio + bloque]
+        exactas = distancias_euclidianas(lote, referencia)
+        distancias = distancias_euclidianas(lote, matriz)
+        iguales += int(np.sum(distancias.argmin(axis=1) == exactas.argmin(axis=1)))
+        delta = np.abs(distancias - exactas)
+        suma += float(delta.sum())
+        maximo = max(maximo, float(delta.max()))
+    return iguales / len(consultas), suma / (len(consultas) * len(referencia)), maximo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--encodings', type=int, default=100000)
+    parser.add_argument('--consultas', type=int, default=2000)
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    vectores, etiquetas, centros = galeria_sintetica(args.encodings)
+    # Los encodings de dlib son float64 de precisión completa
+    rng = np.random.default_rng(2)
+    vectores = vectores.astype(np.float64) + rng.normal(0, 1e-4, size=vectores.shape)
+    referencia = vectores
+    consultas = consultas_sinteticas(centros, args.consultas).astype(np.float64)
+
+    casos = [
+        ('float64 por fila', 'float64', True),
+        ('float64 en bloque', 'float64', False),
+        ('float32', 'float32', False),
+        ('int8', 'int8', False),
+    ]
+    print(f"{'formato':<18} {'carga s':>8} {'pico MB':>8} {'matriz MB':>10} {'DB MB':>7} "
+          f"{'top-1 igual':>11} {'Δdist media':>12} {'Δdist máx':>10}")
+    for nombre, formato, por_fila in casos:
+        ruta = os.path.join(args.dir, f"bench_formato_{formato}.db")
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+        db = crear_db(ruta, vectores, etiquetas, formato)
+        db.conexion().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        if por_fila:
+            matriz, segundos, pico = medir_carga(lambda: cargar_por_fila(db))
+        else:
+            matriz, segundos, pico = medir_carga(lambda: db.cargar_galeria()[1])
+
+        igual, delta_media, delta_max = comparar_con_referencia(consultas, referencia, matriz)
+        tamano_db = os.path.getsize(ruta) / 1e6
+        print(f"{nombre:<18} {segundos:>8.2f} {pico / 1e6:>8.1f} {matriz.nbytes / 1e6:>10.1f} {tamano_db:>7.1f} "
+              f"{igual:>11.4f} {delta_media:>12.2e} {delta_max:>10.2e}")
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/benchmark_indices.py
+"""Recall vs latencia del índice IVF frente a fuerza bruta en galerías sintéticas de 128-d
+
+Uso: python benchmarks/benchmark_indices.py [--tamanos 10000 50000] [--sondeos 1 4 8 16]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indices_galeria import IndiceFuerzaBruta, IndiceIVF
+
+
+def galeria_sintetica(num_encodings, capturas_por_estudiante=5, dimension=128, semilla=0):
+    """Estudiantes como centros aleatorios y capturas con ruido alrededor de cada centro"""
+    rng = np.random.default_rng(semilla)
+    num_estudiantes = max(1, num_encodings // capturas_por_estudiante)
+    # Escala similar a los encodings de dlib (distancias entre personas ~0.8-1.0)
+    centros = rng.normal(0, 0.065, size=(num_estudiantes, dimension)).astype(np.float32)
+    etiquetas = np.repeat(np.arange(num_estudiantes), capturas_por_estudiante)[:num_encodings]
+    vectores = centros[etiquetas] + rng.normal(0, 0.02, size=(len(etiquetas), dimension)).astype(np.float32)
+    return vectores, etiquetas, centros
+
+
+def consultas_sinteticas(centros, num_consultas, semilla=1):
+    rng = np.random.default_rng(semilla)
+    elegidos = rng.choice(len(centros), num_consultas)
+    ruido = rng.normal(0, 0.02, size=(num_consultas, centros.shape[1])).astype(np.float32)
+    return centros[elegidos] + ruido
+
+
+def medir(indice, consultas, k, lote):
+    inicio = time.perf_counter()
+    posiciones = []
+    for i in range(0, len(consultas), lote):
+        _, pos = indice.buscar(consultas[i:i + lote], k)
+        posiciones.append(pos)
+    transcurrido = time.perf_counter() - inicio
+    return np.vstack(posiciones), transcurrido * 1000 / len(consultas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--sondeos', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--lote', type=int, default=8, help='rostros por frame')
+    parser.add_argument('--k', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'encodings':>10} {'backend':<16} {'recall@' + str(args.k):>9} {'ms/consulta':>12} {'construcción s':>15}")
+    for tamano in args.tamanos:
+        vectores, etiquetas, centros = galeria_sintetica(tamano)
+        claves = np.arange(tamano)
+        consultas = consultas_sinteticas(centros, args.consultas)
+
+        inicio = time.perf_counter()
+        exacto = IndiceFuerzaBruta().construir(vectores, claves)
+        t_exacto = time.perf_counter() - inicio
+        verdad, ms_exacto = medir(exacto, consultas, args.k, args.lote)
+        print(f"{tamano:>10} {'fuerza_bruta':<16} {1.0:>9.3f} {ms_exacto:>12.3f} {t_exacto:>15.2f}")
+
+        inicio = time.perf_counter()
+        ivf = IndiceIVF().construir(vectores, claves)
+        t_ivf = time.perf_counter() - inicio
+        for sondeos in args.sondeos:
+            ivf.n_sondeos = sondeos
+            resultado, ms_ivf = medir(ivf, consultas, args.k, args.lote)
+            aciertos = sum(len(np.intersect1d(a, b)) for a, b in zip(verdad, resultado))
+            recall = aciertos / verdad.size
+            print(f"{tamano:>10} {'ivf/' + str(sondeos) + ' sondeos':<16} {recall:>9.3f} {ms_ivf:>12.3f} {t_ivf:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# benchmarks/benchmark_pipeline.py
+"""Benchmark del pipeline de monitoreo sobre un archivo de video (sin cámara ni ventana)
+
+Uso: python benchmarks/benchmark_pipeline.py video.mp4 [--trabajadores 1 2 4] [--db bench.db]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline_monitoreo import PipelineMonitoreo
+from sistema_asistencias import SistemaAsistencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('video')
+    parser.add_argument('--trabajadores', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--tiempo-real', action='store_true',
+                        help='leer el video a sus FPS nominales en lugar de lo más rápido posible')
+    args = parser.parse_args()
+
+    sistema = SistemaAsistencias(db_path=args.db)
+    for trabajadores in args.trabajadores:
+        pipeline = PipelineMonitoreo(sistema, args.video, num_trabajadores=trabajadores,
+                                     respetar_fps_archivo=args.tiempo_real)
+        print(f"\n=== {trabajadores} trabajador(es) ===")
+        if pipeline.ejecutar(mostrar=False) is None:
+            print(f"❌ No se pudo abrir {args.video}")
+            return
+        pipeline.imprimir_resumen()
+
+
+if __name__ == "__main__":
+    main()
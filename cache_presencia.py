@@ -0,0 +1,51 @@
+# cache_presencia.py
+import threading
+from datetime import date
+
+
+class CachePresencia:
+    """Conjunto en memoria de estudiantes ya marcados hoy
+
+    Se precarga desde la tabla asistencias y se reinicia al cambiar el día, de
+    modo que la verificación de duplicados es O(1) y no consulta SQLite.
+    """
+
+    def __init__(self, db, metodo_deteccion='rostro'):
+        self.db = db
+        self.metodo_deteccion = metodo_deteccion
+        self._lock = threading.Lock()
+        self.fecha = None
+        self._presentes = set()
+        self._asegurar_dia(date.today())
+
+    def _asegurar_dia(self, hoy):
+        """Cambio de día: recargar el conjunto para la nueva fecha (llamar con el lock)"""
+        if hoy != self.fecha:
+            self._presentes = self.db.obtener_presentes(hoy, self.metodo_deteccion)
+            self.fecha = hoy
+
+    def marcar_si_nuevo(self, estudiante_id, hoy=None):
+        """Marcar al estudiante; retorna True solo la primera vez en el día"""
+        hoy = hoy or date.today()
+        with self._lock:
+            self._asegurar_dia(hoy)
+            if estudiante_id in self._presentes:
+                return False
+            self._presentes.add(estudiante_id)
+            return True
+
+    def desmarcar(self, estudiante_id, hoy):
+        """Quitar una marca cuya escritura falló, para que la próxima detección la reintente"""
+        with self._lock:
+            if hoy == self.fecha:
+                self._presentes.discard(estudiante_id)
+
+    def esta_presente(self, estudiante_id, hoy=None):
+        hoy = hoy or date.today()
+        with self._lock:
+            self._asegurar_dia(hoy)
+            return estudiante_id in self._presentes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._presentes)
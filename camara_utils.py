@@ -1,18 +1,119 @@
 # camara_utils.py
 import cv2
-import face_recognition
+import queue
+import threading
 import time
 import os
 
+import numpy as np
+
+from motor_procesos import codificar_recortes
+from detectores import detector_compartido
+
+def _solo_lectura(buffer):
+    vista = buffer.view()
+    vista.flags.writeable = False
+    return vista
+
+
+class FuenteImagenes:
+    """Carpeta de imágenes con la interfaz de cv2.VideoCapture (un frame por archivo, en orden)
+
+    Con `tamano` (ancho, alto) todas las imágenes se escalan a esa resolución,
+    directamente sobre el buffer del anillo de CamaraManager.
+    """
+
+    EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, carpeta, fps=0.0, tamano=None):
+        self.archivos = sorted(os.path.join(carpeta, a) for a in os.listdir(carpeta)
+                               if a.lower().endswith(self.EXTENSIONES))
+        self.fps = fps
+        self.tamano = tamano
+        self.posicion = 0
+
+    def isOpened(self):
+        return bool(self.archivos)
+
+    def read(self, image=None):
+        while self.posicion < len(self.archivos):
+            frame = cv2.imread(self.archivos[self.posicion])
+            self.posicion += 1
+            if frame is None:
+                continue  # archivo ilegible: se salta
+            if self.tamano is not None and (frame.shape[1], frame.shape[0]) != tuple(self.tamano):
+                forma = (self.tamano[1], self.tamano[0], 3)
+                destino = image if image is not None and image.shape == forma else None
+                return True, cv2.resize(frame, tuple(self.tamano), dst=destino, interpolation=cv2.INTER_AREA)
+            if image is not None and image.shape == frame.shape:
+                np.copyto(image, frame)
+                return True, image
+            return True, frame
+        return False, None
+
+    def get(self, propiedad):
+        if propiedad == cv2.CAP_PROP_FPS:
+            return self.fps
+        if propiedad == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.archivos))
+        return 0.0
+
+    def set(self, propiedad, valor):
+        if propiedad == cv2.CAP_PROP_POS_FRAMES:
+            self.posicion = int(valor)
+            return True
+        return False
+
+    def release(self):
+        pass
+
+
 class CamaraManager:
-    def __init__(self):
+    """Captura con un anillo de buffers preasignados
+
+    `capturar_frame` decodifica directamente en un buffer libre del anillo y
+    retorna una vista de solo lectura: el bucle de captura no asigna memoria por
+    frame. Un frame es válido hasta que la cámara reutiliza su ranura; quien lo
+    conserve más allá de la siguiente captura (colas, otros hilos) debe llamar a
+    `retener` y luego a `liberar`. Si todas las ranuras están retenidas, el anillo
+    crece. Las conversiones (`rgb`, `reducir`, `lienzo`) también escriben en
+    buffers fijos.
+    """
+
+    def __init__(self, fuente=0, num_buffers=4):
+        # Índice de cámara, ruta de un archivo de video o de una carpeta de imágenes
+        # (para pruebas sin hardware) u objeto con la interfaz de cv2.VideoCapture
+        self.fuente = fuente
         self.cap = None
+        self.num_buffers = num_buffers
+        self._buffers = []
+        self._vistas = []
+        self._rgb = []
+        self._reducidos = []
+        self._retenidos = []
+        self._lienzo = None
+        self._ranura = -1
+        self._lock = threading.Lock()
+        self.asignaciones = 0  # buffers de frame creados (debe estabilizarse tras el arranque)
         
+    @property
+    def es_archivo(self):
+        return isinstance(self.fuente, str)
+    
     def inicializar_camara(self):
         """Inicializar cámara con configuración optimizada"""
-        self.cap = cv2.VideoCapture(0)
+        if hasattr(self.fuente, 'read'):
+            self.cap = self.fuente
+            return self.cap.isOpened()
+        if self.es_archivo and os.path.isdir(self.fuente):
+            self.cap = FuenteImagenes(self.fuente)
+            return self.cap.isOpened()
+        self.cap = cv2.VideoCapture(self.fuente)
         if not self.cap.isOpened():
             return False
+        
+        if self.es_archivo:
+            return True
             
         # Configuración optimizada para mejor performance
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
@@ -22,26 +123,186 @@ class CamaraManager:
         
         return True
     
+    def _agregar_ranura(self, forma):
+        buffer = np.empty(forma, dtype=np.uint8)
+        self._buffers.append(buffer)
+        self._vistas.append(_solo_lectura(buffer))
+        self._rgb.append(None)
+        self._reducidos.append(None)
+        self._retenidos.append(0)
+        self.asignaciones += 1
+    
+    def _asignar_anillo(self, forma):
+        with self._lock:
+            self._buffers, self._vistas, self._rgb, self._reducidos, self._retenidos = [], [], [], [], []
+            for _ in range(self.num_buffers):
+                self._agregar_ranura(forma)
+    
+    def _siguiente_ranura(self):
+        """Primera ranura libre después de la actual (sin repetir la actual); crece si no hay"""
+        with self._lock:
+            n = len(self._buffers)
+            for paso in range(1, n):
+                ranura = (self._ranura + paso) % n
+                if not self._retenidos[ranura]:
+                    return ranura
+            self._agregar_ranura(self._buffers[0].shape)
+            return n
+    
     def capturar_frame(self):
-        """Capturar frame con manejo de errores"""
+        """Capturar el siguiente frame en el anillo; retorna (vista de solo lectura, éxito)"""
         if not self.cap:
             return None, False
-            
-        # Leer frame
-        ret, frame = self.cap.read()
+        
+        if not self._buffers:
+            ret, frame = self.cap.read()
+            if not ret:
+                return None, False
+            self._asignar_anillo(frame.shape)
+            self._ranura = 0
+            np.copyto(self._buffers[0], frame)
+            return self._vistas[0], True
+        
+        ranura = self._siguiente_ranura()
+        ret, frame = self.cap.read(self._buffers[ranura])
         if not ret:
             return None, False
-            
-        return frame, True
+        if frame is not self._buffers[ranura]:
+            # Cambió la resolución de la fuente: rehacer el anillo una vez
+            self._asignar_anillo(frame.shape)
+            ranura = 0
+            np.copyto(self._buffers[0], frame)
+        self._ranura = ranura
+        return self._vistas[ranura], True
+    
+    def retener(self, frame):
+        """Impedir que la captura reutilice la ranura de este frame hasta `liberar`"""
+        i = self._ranura_de(frame)
+        if i is not None:
+            with self._lock:
+                self._retenidos[i] += 1
+    
+    def liberar(self, frame):
+        i = self._ranura_de(frame)
+        if i is not None:
+            with self._lock:
+                self._retenidos[i] = max(0, self._retenidos[i] - 1)
+    
+    def _ranura_de(self, frame):
+        for i, vista in enumerate(list(self._vistas)):
+            if frame is vista or frame is self._buffers[i]:
+                return i
+        return None
+    
+    def rgb(self, frame):
+        """Versión RGB de un frame del anillo, convertida en un buffer fijo de su ranura"""
+        i = self._ranura_de(frame)
+        if i is None:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self._rgb[i] is None:
+            self._rgb[i] = np.empty_like(self._buffers[i])
+        cv2.cvtColor(self._buffers[i], cv2.COLOR_BGR2RGB, dst=self._rgb[i])
+        return _solo_lectura(self._rgb[i])
+    
+    def reducir(self, frame, escala):
+        """Frame del anillo reducido por `escala` en un buffer fijo de su ranura (se reasigna si cambia la escala)"""
+        alto, ancho = frame.shape[:2]
+        forma = (max(1, int(round(alto * escala))), max(1, int(round(ancho * escala))), frame.shape[2])
+        i = self._ranura_de(frame)
+        if i is None:
+            return cv2.resize(frame, (forma[1], forma[0]), interpolation=cv2.INTER_AREA)
+        if self._reducidos[i] is None or self._reducidos[i].shape != forma:
+            self._reducidos[i] = np.empty(forma, dtype=np.uint8)
+        cv2.resize(self._buffers[i], (forma[1], forma[0]), dst=self._reducidos[i], interpolation=cv2.INTER_AREA)
+        return _solo_lectura(self._reducidos[i])
     
-    def liberar_camara(self):
+    def lienzo(self, frame):
+        """Copia escribible del frame para dibujar encima (un solo buffer reutilizado)"""
+        if self._lienzo is None or self._lienzo.shape != frame.shape:
+            self._lienzo = np.empty_like(frame)
+        np.copyto(self._lienzo, frame)
+        return self._lienzo
+    
+    def fps_fuente(self):
+        """FPS declarados por la cámara o el archivo de video"""
+        if not self.cap:
+            return 0.0
+        return self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+    
+    def liberar_camara(self, cerrar_ventanas=True):
         """Liberar recursos de la cámara"""
         if self.cap:
             self.cap.release()
-            cv2.destroyAllWindows()
+            self.cap = None
+            with self._lock:
+                self._buffers, self._vistas, self._retenidos, self._lienzo = [], [], [], None
+            if cerrar_ventanas:
+                cv2.destroyAllWindows()
+
+class CodificadorSegundoPlano:
+    """Guarda la foto y calcula el encoding de cada captura en un hilo aparte
+
+    La vista previa solo entrega el frame (retenido en el anillo de la cámara, sin
+    copiarlo) y sigue a velocidad completa. Los resultados se recogen sin bloquear
+    con `completados`; nada se escribe en la base de datos hasta el final.
+    """
+
+    def __init__(self, camara):
+        self.camara = camara
+        self.pendientes = 0
+        self._tareas = queue.Queue()
+        self._completados = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name="codificador-inscripcion", daemon=True)
+        self._hilo.start()
 
-def capturar_rostros_interactivo(estudiante_id, nombre, apellido, db, num_capturas=5):
-    """Función mejorada para captura de rostros"""
+    def enviar(self, frame, rgb_frame, ubicacion, ruta):
+        """Encolar una captura aceptada; `frame` y `rgb_frame` deben ser del anillo de la cámara"""
+        self.camara.retener(frame)
+        self.pendientes += 1
+        self._tareas.put((frame, rgb_frame, ubicacion, ruta))
+
+    def _bucle(self):
+        while True:
+            tarea = self._tareas.get()
+            if tarea is None:
+                break
+            frame, rgb_frame, ubicacion, ruta = tarea
+            try:
+                if not cv2.imwrite(ruta, frame):
+                    raise IOError(f"no se pudo escribir {ruta}")
+                # Encoding del recorte del rostro a resolución nativa
+                encoding = codificar_recortes(rgb_frame, [ubicacion], bgr=False)[0]
+                self._completados.put((ruta, encoding, None))
+            except Exception as e:
+                self._completados.put((ruta, None, str(e)))
+            finally:
+                self.camara.liberar(frame)
+
+    def completados(self):
+        """Resultados (ruta, encoding o None, error) terminados desde la última llamada"""
+        resultados = []
+        while True:
+            try:
+                resultados.append(self._completados.get_nowait())
+            except queue.Empty:
+                break
+        self.pendientes -= len(resultados)
+        return resultados
+
+    def finalizar(self):
+        """Esperar las capturas en curso y retornar sus resultados"""
+        self._tareas.put(None)
+        self._hilo.join()
+        return self.completados()
+
+
+def capturar_rostros_interactivo(estudiante_id, nombre, apellido, db, num_capturas=5, detector=None):
+    """Función mejorada para captura de rostros
+
+    El encoding se calcula en segundo plano y todos se guardan en una sola
+    transacción al terminar la sesión (también si se cancela con ESC).
+    """
+    detector = detector_compartido(detector or db.detector_configurado())
     print(f"📸 Capturando {num_capturas} imágenes para: {nombre} {apellido}")
     print("Presiona ESPACIO para capturar, ESC para cancelar")
     
@@ -50,69 +311,71 @@ def capturar_rostros_interactivo(estudiante_id, nombre, apellido, db, num_captur
         print("❌ No se puede acceder a la cámara")
         return False
     
-    capturas_exitosas = 0
     carpeta_imagenes = "imagenes_estudiantes"
     os.makedirs(carpeta_imagenes, exist_ok=True)
+    codificador = CodificadorSegundoPlano(camara)
+    aceptadas = []  # (ruta, encoding)
+    numero_foto = 0
+    marca_hasta = 0.0
+    
+    def recoger(resultados):
+        nonlocal marca_hasta
+        for ruta, encoding, error in resultados:
+            if encoding is None:
+                print(f"❌ No se pudo extraer encoding facial: {error}")
+                continue
+            aceptadas.append((ruta, encoding))
+            marca_hasta = time.time() + 0.5
+            print(f"✅ Imagen {len(aceptadas)} capturada")
     
     try:
-        while capturas_exitosas < num_capturas:
+        while len(aceptadas) < num_capturas:
             frame, success = camara.capturar_frame()
             if not success:
                 print("❌ Error al capturar frame")
                 break
+            recoger(codificador.completados())
+            if len(aceptadas) >= num_capturas:
+                break
+            
+            # Detectar rostros sobre el frame limpio (RGB en el buffer fijo de su ranura)
+            rgb_frame = camara.rgb(frame)
+            face_locations = detector.detectar(rgb_frame)
             
-            # Mostrar instrucciones en el frame
-            cv2.putText(frame, f"Capturando: {nombre} {apellido}", (10, 30), 
+            # Instrucciones y rectángulos en el lienzo reutilizado, no en el frame capturado
+            lienzo = camara.lienzo(frame)
+            cv2.putText(lienzo, f"Capturando: {nombre} {apellido}", (10, 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(frame, f"Imagen {capturas_exitosas + 1}/{num_capturas}", (10, 60), 
+            cv2.putText(lienzo, f"Imagen {len(aceptadas) + codificador.pendientes + 1}/{num_capturas}", (10, 60), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-            cv2.putText(frame, "ESPACIO: Capturar | ESC: Cancelar", (10, 90), 
+            cv2.putText(lienzo, "ESPACIO: Capturar | ESC: Cancelar", (10, 90), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
             
-            # Detectar rostros
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-            
             # Dibujar rectángulo si se detecta rostro
             rostro_detectado = len(face_locations) > 0
             for top, right, bottom, left in face_locations:
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.putText(frame, "ROSTRO DETECTADO", (left, top-10), 
+                cv2.rectangle(lienzo, (left, top), (right, bottom), (0, 255, 0), 2)
+                cv2.putText(lienzo, "ROSTRO DETECTADO", (left, top-10), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
             
-            cv2.imshow('Captura de Rostros', frame)
+            # Feedback visual sin detener la vista previa
+            if time.time() < marca_hasta:
+                cv2.putText(lienzo, "✅ CAPTURADO", (50, 120), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            
+            cv2.imshow('Captura de Rostros', lienzo)
             
             # MEJORA: Usar waitKey más largo y verificar tecla presionada
             key = cv2.waitKey(50) & 0xFF  # 50ms para mejor respuesta
             
             if key == 32:  # Tecla ESPACIO
-                if rostro_detectado:
-                    try:
-                        # Guardar imagen
-                        filename = f"{carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{capturas_exitosas + 1}.jpg"
-                        cv2.imwrite(filename, frame)
-                        
-                        # Extraer encoding
-                        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                        if face_encodings:
-                            encoding = face_encodings[0]
-                            db.guardar_encoding_facial(estudiante_id, encoding)
-                            capturas_exitosas += 1
-                            print(f"✅ Imagen {capturas_exitosas} capturada y guardada")
-                            
-                            # Feedback visual
-                            for _ in range(10):  # Mostrar tick verde por 0.5 segundos
-                                frame_feedback = frame.copy()
-                                cv2.putText(frame_feedback, "✅ CAPTURADO", (50, 120), 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                                cv2.imshow('Captura de Rostros', frame_feedback)
-                                cv2.waitKey(50)
-                        else:
-                            print("❌ No se pudo extraer encoding facial")
-                    except Exception as e:
-                        print(f"❌ Error al guardar: {e}")
-                else:
+                if not rostro_detectado:
                     print("❌ No se detectó rostro. Posiciónate frente a la cámara.")
+                elif len(aceptadas) + codificador.pendientes < num_capturas:
+                    # Guardar imagen (sin las instrucciones dibujadas) y codificar en segundo plano
+                    numero_foto += 1
+                    filename = f"{carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{numero_foto}.jpg"
+                    codificador.enviar(frame, rgb_frame, face_locations[0], filename)
                     
             elif key == 27:  # Tecla ESC
                 print("⏹️ Captura cancelada por el usuario")
@@ -121,7 +384,210 @@ def capturar_rostros_interactivo(estudiante_id, nombre, apellido, db, num_captur
     except Exception as e:
         print(f"❌ Error durante la captura: {e}")
     finally:
+        recoger(codificador.finalizar())
         camara.liberar_camara()
     
-    print(f"📊 Resumen: {capturas_exitosas}/{num_capturas} capturas exitosas")
-    return capturas_exitosas > 0
\ No newline at end of file
+    if aceptadas:
+        try:
+            db.guardar_encodings_faciales(estudiante_id, [e for _, e in aceptadas], [r for r, _ in aceptadas])
+            print(f"💾 {len(aceptadas)} encodings guardados en una transacción")
+        except Exception as e:
+            print(f"❌ Error al guardar: {e}")
+            aceptadas = []
+    
+    print(f"📊 Resumen: {len(aceptadas)}/{num_capturas} capturas exitosas")
+    return len(aceptadas) > 0
+
+
+def calidad_rostro(rgb_frame, ubicacion, nitidez_referencia=120.0, tamano_objetivo=150):
+    """Puntaje barato de una captura para inscripción, entre 0 y 1
+
+    - nitidez: varianza del Laplaciano sobre el rostro normalizado a 128 px
+    - tamaño: alto del rostro respecto al chip de 150 px del encoding
+    - simetría: nariz centrada entre los ojos y ojos nivelados (5 landmarks)
+    El puntaje es el producto: un solo factor malo descarta la captura.
+    """
+    import face_recognition
+
+    top, right, bottom, left = ubicacion
+    rostro = rgb_frame[max(0, top):bottom, max(0, left):right]
+    if rostro.size == 0:
+        return {'nitidez': 0.0, 'tamano': 0.0, 'simetria': 0.0, 'puntaje': 0.0}
+    gris = cv2.cvtColor(cv2.resize(rostro, (128, 128), interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+    nitidez = min(1.0, cv2.Laplacian(gris, cv2.CV_64F).var() / nitidez_referencia)
+    tamano = min(1.0, (bottom - top) / tamano_objetivo)
+
+    simetria = 0.0
+    landmarks = face_recognition.face_landmarks(rgb_frame, [ubicacion], model='small')
+    if landmarks:
+        puntos = landmarks[0]
+        ojo_izq = np.mean(puntos['left_eye'], axis=0)
+        ojo_der = np.mean(puntos['right_eye'], axis=0)
+        nariz = np.asarray(puntos['nose_tip'][0], dtype=np.float64)
+        distancia_ojos = np.linalg.norm(ojo_der - ojo_izq)
+        if distancia_ojos > 0:
+            # Giro: desplazamiento de la nariz desde el punto medio de los ojos; inclinación: ángulo de los ojos
+            giro = abs(nariz[0] - (ojo_izq[0] + ojo_der[0]) / 2) / distancia_ojos
+            inclinacion = abs(np.degrees(np.arctan2(ojo_der[1] - ojo_izq[1], ojo_der[0] - ojo_izq[0])))
+            inclinacion = min(inclinacion, 180 - inclinacion)
+            simetria = max(0.0, 1 - 2 * giro) * max(0.0, 1 - inclinacion / 30)
+
+    return {'nitidez': nitidez, 'tamano': tamano, 'simetria': simetria,
+            'puntaje': nitidez * tamano * simetria}
+
+
+class SelectorCapturas:
+    """Conserva las mejores `n` capturas que además sean distintas entre sí
+
+    Una captura a menos de `distancia_minima` de otra ya elegida es casi un
+    duplicado: solo la reemplaza si tiene mejor puntaje. Con el cupo lleno, una
+    captura diversa reemplaza a la de peor puntaje si la supera.
+    """
+
+    def __init__(self, n, distancia_minima=0.12):
+        self.n = n
+        self.distancia_minima = distancia_minima
+        self.elegidas = []  # dicts con ruta, encoding y puntaje
+
+    def ofrecer(self, ruta, encoding, puntaje):
+        """Considerar una captura; retorna las rutas que quedaron fuera (la nueva o las reemplazadas)"""
+        nueva = {'ruta': ruta, 'encoding': np.asarray(encoding, dtype=np.float32), 'puntaje': puntaje}
+        if self.elegidas:
+            distancias = np.linalg.norm(np.stack([e['encoding'] for e in self.elegidas]) - nueva['encoding'], axis=1)
+            cercanas = np.flatnonzero(distancias < self.distancia_minima).tolist()
+        else:
+            cercanas = []
+
+        if cercanas:
+            if puntaje <= max(self.elegidas[i]['puntaje'] for i in cercanas):
+                return [ruta]
+            fuera = [self.elegidas[i]['ruta'] for i in cercanas]
+            self.elegidas = [e for i, e in enumerate(self.elegidas) if i not in cercanas] + [nueva]
+            return fuera
+        if len(self.elegidas) < self.n:
+            self.elegidas.append(nueva)
+            return []
+        peor = min(range(len(self.elegidas)), key=lambda i: self.elegidas[i]['puntaje'])
+        if puntaje <= self.elegidas[peor]['puntaje']:
+            return [ruta]
+        fuera = [self.elegidas[peor]['ruta']]
+        self.elegidas[peor] = nueva
+        return fuera
+
+    def completo(self, calidad_objetivo):
+        return len(self.elegidas) >= self.n and min(e['puntaje'] for e in self.elegidas) >= calidad_objetivo
+
+
+def capturar_rostros_automatico(estudiante_id, nombre, apellido, db, num_capturas=5, presupuesto=10.0,
+                                detector=None, calidad_minima=0.35, calidad_objetivo=0.7, intervalo=0.25):
+    """Inscripción sin teclas: elige las mejores capturas diversas dentro de `presupuesto` segundos
+
+    Cada frame con un solo rostro se puntúa (calidad_rostro); los que superan
+    `calidad_minima` se codifican en segundo plano como candidatos (como mucho
+    uno cada `intervalo` s) y SelectorCapturas decide cuáles quedan. Termina al
+    agotar el tiempo o antes si ya hay `num_capturas` con `calidad_objetivo`.
+    """
+    detector = detector_compartido(detector or db.detector_configurado())
+    print(f"🤖 Captura automática de {num_capturas} imágenes para: {nombre} {apellido} (máx. {presupuesto:.0f} s)")
+    print("Mira a la cámara y gira levemente la cabeza. ESC para cancelar")
+
+    camara = CamaraManager()
+    if not camara.inicializar_camara():
+        print("❌ No se puede acceder a la cámara")
+        return False
+
+    carpeta_imagenes = "imagenes_estudiantes"
+    os.makedirs(carpeta_imagenes, exist_ok=True)
+    codificador = CodificadorSegundoPlano(camara)
+    selector = SelectorCapturas(num_capturas)
+    puntajes = {}  # ruta -> puntaje de las capturas en curso
+    descartadas = []
+    numero_foto = 0
+    ultimo_candidato = 0.0
+    frames = candidatos = 0
+
+    def recoger(resultados):
+        for ruta, encoding, _ in resultados:
+            puntaje = puntajes.pop(ruta)
+            if encoding is None:
+                descartadas.append(ruta)
+                continue
+            descartadas.extend(selector.ofrecer(ruta, encoding, puntaje))
+
+    inicio = time.time()
+    try:
+        while time.time() - inicio < presupuesto:
+            frame, success = camara.capturar_frame()
+            if not success:
+                print("❌ Error al capturar frame")
+                break
+            frames += 1
+            recoger(codificador.completados())
+            if selector.completo(calidad_objetivo):
+                break
+
+            rgb_frame = camara.rgb(frame)
+            face_locations = detector.detectar(rgb_frame)
+            lienzo = camara.lienzo(frame)
+
+            calidad = None
+            if len(face_locations) == 1:
+                calidad = calidad_rostro(rgb_frame, face_locations[0])
+                ahora = time.time()
+                # Sin acumular trabajo: un candidato por intervalo y como mucho dos en cola
+                if (calidad['puntaje'] >= calidad_minima and ahora - ultimo_candidato >= intervalo
+                        and codificador.pendientes < 2):
+                    numero_foto += 1
+                    ruta = f"{carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{numero_foto}.jpg"
+                    puntajes[ruta] = calidad['puntaje']
+                    codificador.enviar(frame, rgb_frame, face_locations[0], ruta)
+                    ultimo_candidato = ahora
+                    candidatos += 1
+
+            for top, right, bottom, left in face_locations:
+                color = (0, 255, 0) if calidad and calidad['puntaje'] >= calidad_minima else (0, 165, 255)
+                cv2.rectangle(lienzo, (left, top), (right, bottom), color, 2)
+            if len(face_locations) > 1:
+                mensaje = "Solo una persona frente a la camara"
+            elif calidad is None:
+                mensaje = "Buscando rostro..."
+            else:
+                mensaje = (f"Calidad {calidad['puntaje']:.2f} (nitidez {calidad['nitidez']:.2f}, "
+                           f"tamano {calidad['tamano']:.2f}, pose {calidad['simetria']:.2f})")
+            cv2.putText(lienzo, f"Capturando: {nombre} {apellido}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(lienzo, f"Elegidas {len(selector.elegidas)}/{num_capturas} | "
+                                f"{presupuesto - (time.time() - inicio):.0f} s", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            cv2.putText(lienzo, mensaje, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            cv2.imshow('Captura de Rostros', lienzo)
+
+            if cv2.waitKey(1) & 0xFF == 27:
+                print("⏹️ Captura cancelada por el usuario")
+                break
+
+    except Exception as e:
+        print(f"❌ Error durante la captura: {e}")
+    finally:
+        recoger(codificador.finalizar())
+        camara.liberar_camara()
+
+    # Las fotos de los candidatos que no quedaron se eliminan
+    for ruta in descartadas:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    elegidas = selector.elegidas
+    if elegidas:
+        try:
+            db.guardar_encodings_faciales(estudiante_id, [e['encoding'] for e in elegidas],
+                                          [e['ruta'] for e in elegidas])
+        except Exception as e:
+            print(f"❌ Error al guardar: {e}")
+            elegidas = []
+
+    print(f"📊 Resumen: {len(elegidas)}/{num_capturas} capturas elegidas de {candidatos} candidatos "
+          f"({frames} frames en {time.time() - inicio:.1f} s)")
+    for e in sorted(elegidas, key=lambda e: -e['puntaje']):
+        print(f"   {os.path.basename(e['ruta'])}: calidad {e['puntaje']:.2f}")
+    return len(elegidas) > 0
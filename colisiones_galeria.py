@@ -0,0 +1,140 @@
+# colisiones_galeria.py
+"""Colisiones entre estudiantes de la galería y umbrales de distancia adaptativos
+
+Recorre la matriz completa de distancias entre encodings por bloques de filas
+(de estudiantes completos) para acotar la memoria: cada bloque ocupa como mucho
+--memoria-mb además de la galería. Para cada estudiante obtiene:
+
+- colisión: distancia mínima de sus encodings a los de cualquier otro estudiante
+- dispersión: peor distancia de uno de sus encodings al más cercano de sus otros encodings
+
+El umbral adaptativo es colisión - margen, acotado entre --minimo y
+UMBRAL_DISTANCIA: los estudiantes con parecidos exigen coincidencias más
+cercanas y el resto conserva el umbral general. Con --guardar se escriben en la
+tabla umbrales_estudiante, que el monitor carga junto con la galería.
+
+Uso: python colisiones_galeria.py [--db asistencias.db] [--memoria-mb 64] [--parecidos 0.5]
+         [--margen 0.1] [--minimo 0.4] [--guardar]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from galeria import UMBRAL_DISTANCIA, distancias_euclidianas
+
+
+def analizar_colisiones(matriz, ids, memoria_mb=64, umbral_parecidos=0.5):
+    """Recorrer la matriz de distancias por bloques
+
+    Retorna (estudiante_ids, vecinos, colisiones, dispersiones, parecidos); vecinos
+    es el estudiante más cercano de cada uno (-1 si no hay otro) y parecidos la
+    lista (id_a, id_b, distancia) de pares bajo `umbral_parecidos`.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    orden = np.argsort(ids, kind='stable')
+    matriz = np.ascontiguousarray(matriz[orden], dtype=np.float32)
+    estudiante_ids, inicios, conteos = np.unique(ids[orden], return_index=True, return_counts=True)
+    finales = inicios + conteos
+    normas = np.einsum('ij,ij->i', matriz, matriz)
+
+    num_estudiantes = len(estudiante_ids)
+    vecinos = np.full(num_estudiantes, -1, dtype=np.int64)
+    colisiones = np.full(num_estudiantes, np.inf, dtype=np.float32)
+    dispersiones = np.zeros(num_estudiantes, dtype=np.float32)
+    parecidos = []
+
+    filas_por_bloque = max(1, int(memoria_mb * 2 ** 20) // (4 * max(len(matriz), 1)))
+    s = 0
+    while s < num_estudiantes:
+        # Estudiantes completos hasta llenar el bloque (al menos uno)
+        t = max(s + 1, int(np.searchsorted(finales, inicios[s] + filas_por_bloque, side='right')))
+        a, b = inicios[s], finales[t - 1]
+        distancias = distancias_euclidianas(matriz[a:b], matriz, normas)
+        # (filas, estudiantes) y luego (estudiantes del bloque, estudiantes)
+        por_estudiante = np.minimum.reduceat(distancias, inicios, axis=1)
+        bloque = np.minimum.reduceat(por_estudiante, inicios[s:t] - a, axis=0)
+
+        for e in range(s, t):
+            if conteos[e] > 1:
+                propias = distancias[inicios[e] - a:finales[e] - a, inicios[e]:finales[e]].copy()
+                np.fill_diagonal(propias, np.inf)
+                dispersiones[e] = propias.min(axis=1).max()
+
+        locales = np.arange(t - s)
+        bloque[locales, locales + s] = np.inf
+        mas_cercanos = bloque.argmin(axis=1)
+        colisiones[s:t] = bloque[locales, mas_cercanos]
+        vecinos[s:t] = np.where(np.isfinite(colisiones[s:t]), estudiante_ids[mas_cercanos], -1)
+
+        for fila, columna in zip(*np.nonzero(bloque < umbral_parecidos)):
+            # La matriz es simétrica: cada par se reporta una vez
+            if s + fila < columna:
+                parecidos.append((int(estudiante_ids[s + fila]), int(estudiante_ids[columna]),
+                                  float(bloque[fila, columna])))
+        s = t
+
+    parecidos.sort(key=lambda par: par[2])
+    return estudiante_ids, vecinos, colisiones, dispersiones, parecidos
+
+
+def umbrales_adaptativos(colisiones, margen=0.1, minimo=0.4, base=UMBRAL_DISTANCIA):
+    """Umbral por estudiante: colisión - margen, entre `minimo` y el umbral general"""
+    colisiones = np.where(np.isfinite(colisiones), colisiones, base + margen)
+    return np.clip(colisiones - margen, minimo, base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--memoria-mb', type=float, default=64, help='memoria máxima por bloque de distancias')
+    parser.add_argument('--parecidos', type=float, default=0.5,
+                        help='reportar pares de estudiantes más cercanos que esta distancia')
+    parser.add_argument('--margen', type=float, default=0.1)
+    parser.add_argument('--minimo', type=float, default=0.4, help='umbral mínimo por estudiante')
+    parser.add_argument('--guardar', action='store_true', help='guardar los umbrales en la base de datos')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager(args.db)
+    _, matriz, nombres, ids = db.cargar_galeria()
+    if len(matriz) == 0:
+        raise SystemExit("La galería está vacía")
+
+    inicio = time.perf_counter()
+    estudiante_ids, vecinos, colisiones, dispersiones, parecidos = analizar_colisiones(
+        matriz, ids, args.memoria_mb, args.parecidos)
+    umbrales = umbrales_adaptativos(colisiones, args.margen, args.minimo)
+    print(f"📊 {len(matriz)} encodings de {len(estudiante_ids)} estudiantes "
+          f"analizados en {time.perf_counter() - inicio:.1f} s")
+
+    nombre_de = dict(zip(ids, nombres))
+    print(f"👥 Pares de estudiantes a menos de {args.parecidos}: {len(parecidos)}")
+    for id_a, id_b, distancia in parecidos[:20]:
+        print(f"   {distancia:.3f}  {nombre_de[id_a]} (ID {id_a}) - {nombre_de[id_b]} (ID {id_b})")
+
+    reducidos = int((umbrales < UMBRAL_DISTANCIA).sum())
+    # Capturas propias más separadas que el umbral: sus rostros reales podrían rechazarse
+    conflictos = np.flatnonzero(dispersiones >= umbrales)
+    print(f"🎯 Umbral reducido para {reducidos} estudiantes "
+          f"(mínimo {umbrales.min():.3f}, mediana {np.median(umbrales):.3f})")
+    if len(conflictos):
+        print(f"⚠️ {len(conflictos)} estudiantes con capturas propias más dispersas que su umbral "
+              "(conviene volver a inscribirlos):")
+        for e in conflictos[:10]:
+            print(f"   {nombre_de[estudiante_ids[e]]} (ID {estudiante_ids[e]}): "
+                  f"dispersión {dispersiones[e]:.3f}, umbral {umbrales[e]:.3f}")
+
+    if args.guardar:
+        db.guardar_umbrales([
+            (int(e), round(float(u), 4), int(v) if v >= 0 else None, round(float(c), 4) if np.isfinite(c) else None)
+            for e, u, v, c in zip(estudiante_ids, umbrales, vecinos, colisiones)
+        ])
+        print(f"✅ Umbrales guardados para {len(estudiante_ids)} estudiantes")
+    else:
+        print("ℹ️ Usa --guardar para que el monitor aplique estos umbrales")
+    db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
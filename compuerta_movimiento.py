@@ -0,0 +1,130 @@
+# compuerta_movimiento.py
+import time
+
+import cv2
+import numpy as np
+
+
+def unir_regiones(regiones):
+    """Unir cajas (top, right, bottom, left) que se superponen hasta que no quede ninguna superpuesta"""
+    regiones = [list(r) for r in regiones]
+    cambio = True
+    while cambio:
+        cambio = False
+        for i in range(len(regiones)):
+            for j in range(i + 1, len(regiones)):
+                a, b = regiones[i], regiones[j]
+                if a[0] < b[2] and b[0] < a[2] and a[3] < b[1] and b[3] < a[1]:
+                    regiones[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                    del regiones[j]
+                    cambio = True
+                    break
+            if cambio:
+                break
+    return [tuple(r) for r in regiones]
+
+
+class CompuertaMovimiento:
+    """Pre-filtro barato antes de la detección facial
+
+    Mantiene un fondo (media móvil) de una miniatura en gris y devuelve las
+    regiones que cambiaron, en coordenadas del frame original y con margen.
+    Sin cambios devuelve una lista vacía: el frame no pasa a detección, salvo
+    un latido periódico de frame completo que encuentra rostros inmóviles ya
+    absorbidos por el fondo. Debe llamarse con los frames en orden de captura.
+    """
+
+    def __init__(self, ancho=160, aprendizaje=0.05, umbral=18, area_minima=0.002, margen=0.25,
+                 fraccion_frame_completo=0.5, latido=2.0):
+        self.ancho = ancho
+        self.aprendizaje = aprendizaje
+        self.umbral = umbral
+        self.area_minima = area_minima
+        self.margen = margen
+        self.fraccion_frame_completo = fraccion_frame_completo
+        self.latido = latido
+        self.activa = True
+
+        self._fondo = None
+        self._ultimo_latido = 0.0
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self.contadores = {'evaluados': 0, 'sin_cambios': 0, 'con_regiones': 0,
+                           'frame_completo': 0, 'latidos': 0}
+        self.fraccion_area = 0.0  # media del área enviada a detección (1.0 = frame completo)
+
+    def _miniatura(self, frame):
+        alto = max(1, round(frame.shape[0] * self.ancho / frame.shape[1]))
+        gris = cv2.cvtColor(cv2.resize(frame, (self.ancho, alto), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gris, (5, 5), 0)
+
+    def _registrar_area(self, fraccion):
+        n = self.contadores['evaluados']
+        self.fraccion_area += (fraccion - self.fraccion_area) / n
+
+    def regiones(self, frame, adicionales=()):
+        """Regiones del frame a enviar a detección ([] = nada que detectar)
+
+        `adicionales` son cajas que se incluyen siempre (p. ej. rostros seguidos).
+        """
+        alto, ancho = frame.shape[:2]
+        completo = [(0, ancho, alto, 0)]
+        self.contadores['evaluados'] += 1
+        if not self.activa:
+            self._registrar_area(1.0)
+            return completo
+
+        gris = self._miniatura(frame)
+        if self._fondo is None:
+            self._fondo = gris.astype(np.float32)
+            self.contadores['frame_completo'] += 1
+            self._registrar_area(1.0)
+            return completo
+
+        diferencia = cv2.absdiff(gris, cv2.convertScaleAbs(self._fondo))
+        cv2.accumulateWeighted(gris, self._fondo, self.aprendizaje)
+        _, mascara = cv2.threshold(diferencia, self.umbral, 255, cv2.THRESH_BINARY)
+        mascara = cv2.dilate(mascara, self._kernel, iterations=2)
+        contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        factor = ancho / gris.shape[1]
+        area_minima = self.area_minima * gris.shape[0] * gris.shape[1]
+        cajas = []
+        for contorno in contornos:
+            if cv2.contourArea(contorno) < area_minima:
+                continue
+            x, y, w, h = cv2.boundingRect(contorno)
+            # Margen proporcional: el rostro suele estar en el borde superior del movimiento
+            mx, my = int(w * self.margen * factor), int(h * self.margen * factor)
+            cajas.append((max(0, int(y * factor) - my), min(ancho, int((x + w) * factor) + mx),
+                          min(alto, int((y + h) * factor) + my), max(0, int(x * factor) - mx)))
+        for top, right, bottom, left in adicionales:
+            mx, my = int((right - left) * self.margen), int((bottom - top) * self.margen)
+            cajas.append((max(0, top - my), min(ancho, right + mx), min(alto, bottom + my), max(0, left - mx)))
+
+        ahora = time.monotonic()
+        if not cajas:
+            if ahora - self._ultimo_latido >= self.latido:
+                self._ultimo_latido = ahora
+                self.contadores['latidos'] += 1
+                self._registrar_area(1.0)
+                return completo
+            self.contadores['sin_cambios'] += 1
+            self._registrar_area(0.0)
+            return []
+
+        cajas = unir_regiones(cajas)
+        area = sum((r - l) * (b - t) for t, r, b, l in cajas) / float(alto * ancho)
+        if area >= self.fraccion_frame_completo:
+            # Con mucho movimiento es más barato detectar una vez sobre el frame completo
+            self.contadores['frame_completo'] += 1
+            self._registrar_area(1.0)
+            return completo
+        self.contadores['con_regiones'] += 1
+        self._registrar_area(area)
+        return cajas
+
+    def reiniciar(self):
+        self._fondo = None
+
+    def metricas(self):
+        return {**self.contadores, 'fraccion_area_media': self.fraccion_area}
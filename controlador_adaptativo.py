@@ -0,0 +1,175 @@
+# controlador_adaptativo.py
+import math
+import threading
+import time
+from collections import deque
+
+# Tamaño mínimo (px) de un rostro en la imagen procesada para que HOG lo detecte sin upsampling
+ROSTRO_MINIMO_HOG = 80
+
+
+class ControladorAdaptativo:
+    """Ajusta paso de frames, escala y upsampling para mantener una latencia objetivo
+
+    - Latencia de detección sobre el objetivo: baja primero el upsampling y luego
+      la escala, sin que los rostros visibles queden bajo el mínimo de HOG. Con
+      margen de sobra recupera primero frecuencia (paso) y luego resolución; si
+      hay rostros bajo el mínimo, la resolución va primero.
+    - Paso de frames: el menor que permite a los trabajadores seguir el ritmo de
+      captura (latencia / (intervalo de captura × trabajadores)), así la cola no
+      acumula frames viejos.
+
+    Las escenas sin movimiento las filtra antes CompuertaMovimiento.
+    """
+
+    def __init__(self, latencia_objetivo_ms=120.0, escalas=(0.25, 0.35, 0.5, 0.75, 1.0), escala_inicial=0.5,
+                 paso_inicial=2, paso_maximo=8, upsample_inicial=1, upsample_maximo=1, ventana=10, trabajadores=1,
+                 olvido_rostros=30):
+        self.latencia_objetivo_ms = latencia_objetivo_ms
+        self.trabajadores = trabajadores
+        self.escalas = tuple(sorted(escalas))
+        self.indice_escala = self.escalas.index(escala_inicial) if escala_inicial in self.escalas else 0
+        self.paso = paso_inicial
+        self.paso_maximo = paso_maximo
+        # face_recognition usa 1 por defecto: detecta rostros de la mitad del tamaño a 4x de costo
+        self.upsample = upsample_inicial
+        self.upsample_maximo = upsample_maximo
+        self.ventana = ventana
+        # Detecciones seguidas sin rostros tras las que se olvida el rostro más pequeño visto
+        self.olvido_rostros = olvido_rostros
+        self.activo = True
+
+        self._latencias = deque(maxlen=ventana)
+        self._altura_minima = None
+        self._sin_rostros = 0
+        self._ultima_captura = None
+        self._intervalo_captura_ms = None
+        self._lock = threading.Lock()
+
+        self.decisiones = deque(maxlen=50)
+        self.contadores = {'procesados': 0, 'omitidos_paso': 0, 'degradaciones': 0, 'mejoras': 0}
+
+    @property
+    def escala(self):
+        return self.escalas[self.indice_escala]
+
+    def debe_procesar(self, secuencia):
+        """Decidir según el paso si el frame capturado pasa a detección"""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._ultima_captura is not None:
+                intervalo = 1000 * (ahora - self._ultima_captura)
+                previo = self._intervalo_captura_ms
+                self._intervalo_captura_ms = intervalo if previo is None else 0.9 * previo + 0.1 * intervalo
+            self._ultima_captura = ahora
+
+            if secuencia % self.paso != 0:
+                self.contadores['omitidos_paso'] += 1
+                return False
+            self.contadores['procesados'] += 1
+            return True
+
+    def registrar(self, latencia_ms, face_locations):
+        """Observar una detección (latencia y rostros en coordenadas del frame original)"""
+        with self._lock:
+            if face_locations:
+                self._altura_minima = min(bottom - top for top, _, bottom, _ in face_locations)
+                self._sin_rostros = 0
+            else:
+                self._sin_rostros += 1
+                # La persona se fue: su rostro pequeño ya no debe impedir degradar
+                if self._sin_rostros >= self.olvido_rostros:
+                    self._altura_minima = None
+
+            if not self.activo:
+                return
+            self._latencias.append(latencia_ms)
+            if len(self._latencias) < self.ventana:
+                return
+            media = sum(self._latencias) / len(self._latencias)
+            if media > 1.2 * self.latencia_objetivo_ms:
+                self._degradar(media)
+            elif media < 0.6 * self.latencia_objetivo_ms:
+                self._mejorar(media)
+            else:
+                self._ajustar_paso(media)
+
+    def _rostros_detectables(self, escala, upsample):
+        """Los rostros visibles siguen superando el tamaño mínimo de HOG con esta configuración"""
+        if self._altura_minima is None:
+            return True
+        return self._altura_minima * escala * (2 ** upsample) >= ROSTRO_MINIMO_HOG
+
+    def _degradar(self, media):
+        if self.upsample > 0 and self._rostros_detectables(self.escala, self.upsample - 1):
+            self.upsample -= 1
+        elif self.indice_escala > 0 and self._rostros_detectables(self.escalas[self.indice_escala - 1], self.upsample):
+            self.indice_escala -= 1
+        else:
+            self._ajustar_paso(media)
+            return
+        self.contadores['degradaciones'] += 1
+        self._decidir(f"latencia {media:.0f} ms > objetivo")
+
+    def _mejorar(self, media):
+        if self.paso > 1 and self._rostros_detectables(self.escala, self.upsample):
+            # Rostros detectables: procesar más frames antes que subir la resolución
+            anterior = self.paso
+            self._ajustar_paso(media)
+            if self.paso < anterior:
+                return
+        if self.indice_escala < len(self.escalas) - 1:
+            self.indice_escala += 1
+        elif self.upsample < self.upsample_maximo:
+            self.upsample += 1
+        else:
+            self._ajustar_paso(media)
+            return
+        self.contadores['mejoras'] += 1
+        self._decidir(f"latencia {media:.0f} ms < objetivo")
+
+    def _ajustar_paso(self, media):
+        """Menor paso con el que los trabajadores procesan al ritmo de la captura"""
+        if not self._intervalo_captura_ms:
+            return
+        necesario = math.ceil(media / (self._intervalo_captura_ms * self.trabajadores))
+        necesario = min(max(necesario, 1), self.paso_maximo)
+        # Histéresis: reducir el paso solo si el anterior deja margen claro
+        if necesario > self.paso or (necesario < self.paso and
+                                     media < 0.8 * (self.paso - 1) * self._intervalo_captura_ms * self.trabajadores):
+            anterior, self.paso = self.paso, necesario
+            self._decidir(f"paso {anterior} -> {necesario}: {media:.0f} ms por frame, "
+                          f"captura cada {self._intervalo_captura_ms:.0f} ms")
+
+    def _decidir(self, motivo):
+        # Las latencias medidas con la configuración anterior ya no sirven
+        self._latencias.clear()
+        self.decisiones.append((time.strftime('%H:%M:%S'), motivo, self.paso, self.escala, self.upsample))
+
+    def fijar(self, paso=2, escala=0.5, upsample=1):
+        """Desactivar el ajuste automático con una configuración fija"""
+        with self._lock:
+            self.activo = False
+            self.paso, self.upsample = paso, upsample
+            self.indice_escala = min(range(len(self.escalas)), key=lambda i: abs(self.escalas[i] - escala))
+            self._decidir("configuración fija")
+
+    def reanudar(self):
+        with self._lock:
+            self.activo = True
+            self._decidir("ajuste automático")
+
+    def metricas(self):
+        """Estado actual, contadores y últimas decisiones (para ajustar cada kiosco)"""
+        with self._lock:
+            return {
+                'activo': self.activo,
+                'paso': self.paso,
+                'escala': self.escala,
+                'upsample': self.upsample,
+                'latencia_objetivo_ms': self.latencia_objetivo_ms,
+                'latencia_reciente_ms': sum(self._latencias) / len(self._latencias) if self._latencias else None,
+                'intervalo_captura_ms': self._intervalo_captura_ms,
+                **self.contadores,
+                'decisiones': list(self.decisiones)[-10:],
+            }
@@ -1,21 +1,244 @@
 # database.py
 import sqlite3
-import json
-import numpy as np
-from datetime import datetime
-import cv2
-import os
+from datetime import datetime, timedelta
+import threading
+from contextlib import contextmanager
+from indices_galeria import IndiceIVF, ruta_indice
+from formato_encodings import FORMATOS, codificar, cargar_matriz, leer_cabecera
+from snapshot_galeria import ruta_snapshot, escribir_snapshot, leer_firma, abrir_snapshot
+
+# Migraciones versionadas del esquema (PRAGMA user_version).
+# Cada entrada: (versión, descripción, sentencias). Solo se agregan al final.
+# Una sentencia puede ser (sql, aviso): el aviso se imprime con las filas afectadas.
+MIGRACIONES = [
+    (1, "Índice único de asistencias por estudiante, fecha y método", [
+        # Los duplicados históricos se archivan (no se pierden) antes de crear el índice único
+        "CREATE TABLE IF NOT EXISTS asistencias_duplicadas AS SELECT * FROM asistencias WHERE 0",
+        ('''
+        INSERT INTO asistencias_duplicadas
+        SELECT * FROM asistencias WHERE id NOT IN (
+            SELECT MIN(id) FROM asistencias GROUP BY estudiante_id, fecha, metodo_deteccion
+        )
+        ''', "{filas} asistencias duplicadas copiadas a asistencias_duplicadas"),
+        ('''
+        DELETE FROM asistencias WHERE id IN (SELECT id FROM asistencias_duplicadas)
+        ''', "{filas} asistencias duplicadas retiradas de asistencias"),
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_asistencias_unica
+        ON asistencias (estudiante_id, fecha, metodo_deteccion)
+        ''',
+    ]),
+    (2, "Índices de cobertura para el dashboard y el monitor", [
+        # Asistencias de un día / rango de días (dashboard, gráfico semanal, caché de presencia)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_asistencias_fecha_metodo
+        ON asistencias (fecha, metodo_deteccion, estudiante_id)
+        ''',
+        # Últimas asistencias: ORDER BY fecha DESC, hora DESC sin ordenar en memoria
+        '''
+        CREATE INDEX IF NOT EXISTS idx_asistencias_fecha_hora
+        ON asistencias (fecha, hora, estudiante_id, estado, metodo_deteccion)
+        ''',
+        # Distribución por estado (reportes generales)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_asistencias_estado
+        ON asistencias (estado)
+        ''',
+        # JOIN de la galería con estudiantes
+        '''
+        CREATE INDEX IF NOT EXISTS idx_encodings_estudiante
+        ON encodings_faciales (estudiante_id)
+        ''',
+        'ANALYZE',
+    ]),
+    (3, "Seguimiento de imágenes para la inscripción masiva reanudable", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_encodings_imagen
+        ON encodings_faciales (imagen_path)
+        ''',
+        # Imágenes descartadas (sin rostro, varios rostros, ilegibles): no se reintentan
+        '''
+        CREATE TABLE IF NOT EXISTS imagenes_descartadas (
+            imagen_path TEXT PRIMARY KEY,
+            motivo TEXT,
+            fecha DATE
+        )
+        ''',
+    ]),
+    (4, "Detector de rostros configurable por instalación", [
+        "ALTER TABLE configuracion ADD COLUMN detector TEXT DEFAULT 'hog'",
+    ]),
+    (5, "Umbrales de distancia por estudiante (colisiones_galeria.py)", [
+        '''
+        CREATE TABLE IF NOT EXISTS umbrales_estudiante (
+            estudiante_id INTEGER PRIMARY KEY,
+            umbral REAL NOT NULL,
+            vecino_id INTEGER,
+            distancia_vecino REAL,
+            fecha TIMESTAMP
+        )
+        ''',
+    ]),
+    (6, "Contador de versión de la galería (cambios en estudiantes o encodings)", [
+        '''
+        CREATE TABLE IF NOT EXISTS version_galeria (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO version_galeria (id, version) VALUES (1, 0)",
+        # Cualquier escritura (también las de app_web con SQL directo) invalida la firma de la galería
+        *[f'''
+        CREATE TRIGGER IF NOT EXISTS trg_version_{tabla}_{evento.lower()}
+        AFTER {evento} ON {tabla}
+        BEGIN
+            UPDATE version_galeria SET version = version + 1 WHERE id = 1;
+        END
+        ''' for tabla in ('estudiantes', 'encodings_faciales') for evento in ('INSERT', 'UPDATE', 'DELETE')],
+    ]),
+]
+
+# Consultas frecuentes del dashboard y del monitor (usadas también por los benchmarks)
+CONSULTAS = {
+    'asistencias_hoy': '''
+        SELECT COUNT(DISTINCT estudiante_id) 
+        FROM asistencias 
+        WHERE fecha = ?
+    ''',
+    'grafico_semanal': '''
+        SELECT fecha, COUNT(DISTINCT estudiante_id) as asistencias
+        FROM asistencias 
+        WHERE fecha >= date('now', '-7 days')
+        GROUP BY fecha
+        ORDER BY fecha
+    ''',
+    'ultimas_asistencias': '''
+        SELECT a.fecha, a.hora, e.nombre, e.apellido, a.estado, a.metodo_deteccion
+        FROM asistencias a
+        JOIN estudiantes e ON a.estudiante_id = e.id
+        ORDER BY a.fecha DESC, a.hora DESC
+        LIMIT 10
+    ''',
+    'asistencias_por_estado': '''
+        SELECT estado, COUNT(*) as count
+        FROM asistencias
+        GROUP BY estado
+    ''',
+    'presentes_por_fecha': '''
+        SELECT estudiante_id FROM asistencias
+        WHERE fecha = ? AND metodo_deteccion = ?
+    ''',
+    'asistencia_del_dia': '''
+        SELECT id FROM asistencias 
+        WHERE estudiante_id = ? AND fecha = ? AND metodo_deteccion = ?
+    ''',
+}
 
 class DatabaseManager:
-    def __init__(self, db_path='asistencias.db'):
+    # PRAGMAs aplicados a cada conexión del pool
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",       # lectores (dashboard) y escritor (cámara) no se bloquean
+        "PRAGMA synchronous = NORMAL",     # seguro con WAL y mucho más rápido que FULL
+        "PRAGMA cache_size = -16000",      # ~16 MB de caché de páginas por conexión
+        "PRAGMA mmap_size = 268435456",    # lecturas vía mmap (256 MB)
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+    )
+    
+    def __init__(self, db_path='asistencias.db', formato_encoding='float32'):
+        if formato_encoding not in FORMATOS:
+            raise ValueError(f"Formato de encoding no válido: {formato_encoding}")
         self.db_path = db_path
+        # Formato de los encodings nuevos ('float32' o 'int8'); se leen todos los formatos
+        self.formato_encoding = formato_encoding
+        self.ruta_snapshot = ruta_snapshot(db_path)
+        # Pool: una conexión por hilo, reutilizada entre llamadas; (hilo, conexión)
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock_pool = threading.Lock()
         self.init_database()
     
+    def _nueva_conexion(self):
+        """Abrir una conexión configurada con WAL y caché de sentencias preparadas"""
+        conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def conexion(self):
+        """Conexión del hilo actual (se crea la primera vez; no se debe cerrar)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._nueva_conexion()
+            self._local.conn = conn
+            with self._lock_pool:
+                # Cerrar las de hilos ya terminados (recargas, escritores anteriores)
+                vivas = []
+                for hilo, otra in self._conexiones:
+                    if hilo.is_alive():
+                        vivas.append((hilo, otra))
+                    else:
+                        otra.close()
+                vivas.append((threading.current_thread(), conn))
+                self._conexiones = vivas
+        return conn
+    
+    @contextmanager
+    def transaccion(self):
+        """Transacción sobre la conexión del hilo: commit al salir, rollback si hay error"""
+        conn = self.conexion()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    def cerrar(self):
+        """Cerrar todas las conexiones del pool"""
+        with self._lock_pool:
+            for _, conn in self._conexiones:
+                conn.close()
+            self._conexiones = []
+        self._local = threading.local()
+    
     def init_database(self):
         """Inicializar la base de datos con las tablas necesarias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.transaccion() as cursor:
+            self._crear_esquema(cursor)
+            self._aplicar_migraciones(cursor)
+        print("✅ Base de datos inicializada correctamente")
+    
+    def version_esquema(self):
+        """Versión actual del esquema (PRAGMA user_version)"""
+        return self.conexion().execute("PRAGMA user_version").fetchone()[0]
+    
+    def detector_configurado(self):
+        """Nombre del detector de rostros de esta instalación (ver detectores.py)"""
+        fila = self.conexion().execute("SELECT detector FROM configuracion WHERE id = 1").fetchone()
+        return (fila and fila[0]) or 'hog'
+    
+    def _aplicar_migraciones(self, cursor):
+        """Aplicar en orden las migraciones posteriores a la versión guardada"""
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        for numero, descripcion, sentencias in MIGRACIONES:
+            if numero <= version:
+                continue
+            for sentencia in sentencias:
+                sentencia, aviso = sentencia if isinstance(sentencia, tuple) else (sentencia, None)
+                cursor.execute(sentencia)
+                if aviso and cursor.rowcount > 0:
+                    print(f"⚠️ Migración {numero}: " + aviso.format(filas=cursor.rowcount))
+            # user_version es transaccional: si algo falla, la migración se repite completa
+            cursor.execute(f"PRAGMA user_version = {numero}")
+            print(f"🛠️ Migración {numero} aplicada: {descripcion}")
+    
+    def _crear_esquema(self, cursor):
+        """Tablas e índices base"""
         # Tabla de estudiantes
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS estudiantes (
@@ -72,60 +295,61 @@ class DatabaseManager:
             INSERT OR IGNORE INTO configuracion (id, hora_entrada, tolerancia_minutos, ultima_actualizacion)
             VALUES (1, '08:00:00', 15, CURRENT_TIMESTAMP)
         ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Base de datos inicializada correctamente")
     
     def agregar_estudiante(self, nombre, apellido, edad=None, seccion=None, codigo=None, qr_code=None):
         """Agregar un nuevo estudiante a la base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Generar código automático si no se proporciona
-            if not codigo:
-                cursor.execute("SELECT COALESCE(MAX(CAST(codigo AS INTEGER)), 0) FROM estudiantes WHERE codigo GLOB '[0-9]*'")
-                max_codigo = cursor.fetchone()[0]
-                codigo = str(int(max_codigo) + 1)
-            
-            cursor.execute('''
-                INSERT INTO estudiantes (codigo, nombre, apellido, edad, seccion, fecha_registro, qr_code)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (codigo, nombre, apellido, edad, seccion, datetime.now().date(), qr_code))
-            
-            estudiante_id = cursor.lastrowid
-            conn.commit()
+            with self.transaccion() as cursor:
+                # Generar código automático si no se proporciona
+                if not codigo:
+                    cursor.execute("SELECT COALESCE(MAX(CAST(codigo AS INTEGER)), 0) FROM estudiantes WHERE codigo GLOB '[0-9]*'")
+                    max_codigo = cursor.fetchone()[0]
+                    codigo = str(int(max_codigo) + 1)
+                
+                cursor.execute('''
+                    INSERT INTO estudiantes (codigo, nombre, apellido, edad, seccion, fecha_registro, qr_code)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (codigo, nombre, apellido, edad, seccion, datetime.now().date(), qr_code))
+                
+                estudiante_id = cursor.lastrowid
             print(f"✅ Estudiante {nombre} {apellido} agregado con código: {codigo}")
             return estudiante_id, codigo
             
         except sqlite3.IntegrityError as e:
             print(f"❌ Error: {e}")
             return None, None
-        finally:
-            conn.close()
     
-    def guardar_encoding_facial(self, estudiante_id, encoding):
+    def guardar_encoding_facial(self, estudiante_id, encoding, imagen_path=None):
         """Guardar el encoding facial de un estudiante"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Convertir numpy array a bytes
-        encoding_bytes = encoding.tobytes()
+        encoding_id = self.guardar_encodings_faciales(estudiante_id, [encoding], [imagen_path])[0]
+        print(f"✅ Encoding facial guardado para estudiante ID: {estudiante_id}")
+        return encoding_id
+    
+    def guardar_encodings_faciales(self, estudiante_id, encodings, imagenes_path=None):
+        """Guardar varios encodings de un estudiante en una sola transacción; retorna sus ids"""
+        if not len(encodings):
+            return []
+        imagenes_path = imagenes_path or [None] * len(encodings)
+        hoy = datetime.now().date()
         
-        cursor.execute('''
-            INSERT INTO encodings_faciales (estudiante_id, encoding_data, fecha_creacion)
-            VALUES (?, ?, ?)
-        ''', (estudiante_id, encoding_bytes, datetime.now().date()))
+        encoding_ids = []
+        with self.transaccion() as cursor:
+            for encoding, imagen_path in zip(encodings, imagenes_path):
+                # BLOB con cabecera (dtype y dimensión) en el formato configurado
+                cursor.execute('''
+                    INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path, fecha_creacion)
+                    VALUES (?, ?, ?, ?)
+                ''', (estudiante_id, codificar(encoding, self.formato_encoding), imagen_path, hoy))
+                encoding_ids.append(cursor.lastrowid)
         
-        conn.commit()
-        conn.close()
-        print(f"✅ Encoding facial guardado para estudiante ID: {estudiante_id}")
+        # Actualizar incrementalmente el índice aproximado persistido (si existe) y el snapshot, una vez
+        IndiceIVF.agregar_a_persistido(ruta_indice(self.db_path, 'min'), encoding_ids, encodings)
+        self.actualizar_snapshot_galeria()
+        return encoding_ids
     
     def cargar_encodings_faciales(self):
         """Cargar todos los encodings faciales de la base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conexion().cursor()
         
         cursor.execute('''
             SELECT e.estudiante_id, est.nombre, est.apellido, e.encoding_data
@@ -134,69 +358,278 @@ class DatabaseManager:
             WHERE est.activo = 1
         ''')
         
-        encodings = []
+        blobs = []
         nombres = []
         ids = []
         
-        for row in cursor.fetchall():
-            estudiante_id, nombre, apellido, encoding_bytes = row
-            # Convertir bytes a numpy array
-            encoding = np.frombuffer(encoding_bytes, dtype=np.float64)
-            encodings.append(encoding)
+        for estudiante_id, nombre, apellido, encoding_bytes in cursor.fetchall():
+            blobs.append(encoding_bytes)
             nombres.append(f"{nombre} {apellido}")
             ids.append(estudiante_id)
         
-        conn.close()
+        cursor.close()
+        # Matriz float32 (n, 128) decodificada en bloque
+        encodings = cargar_matriz(blobs)
         print(f"✅ Cargados {len(encodings)} encodings faciales")
         return encodings, nombres, ids
     
+    def cargar_galeria(self):
+        """Igual que cargar_encodings_faciales, incluyendo el id de cada fila de encodings_faciales"""
+        cursor = self.conexion().cursor()
+        
+        cursor.execute('''
+            SELECT e.id, e.estudiante_id, est.nombre, est.apellido, e.encoding_data
+            FROM encodings_faciales e
+            JOIN estudiantes est ON e.estudiante_id = est.id
+            WHERE est.activo = 1
+            ORDER BY e.id
+        ''')
+        
+        encoding_ids = []
+        blobs = []
+        nombres = []
+        ids = []
+        
+        for encoding_id, estudiante_id, nombre, apellido, encoding_bytes in cursor.fetchall():
+            encoding_ids.append(encoding_id)
+            blobs.append(encoding_bytes)
+            nombres.append(f"{nombre} {apellido}")
+            ids.append(estudiante_id)
+        
+        cursor.close()
+        encodings = cargar_matriz(blobs)
+        print(f"✅ Cargados {len(encodings)} encodings faciales")
+        return encoding_ids, encodings, nombres, ids
+    
+    def firma_galeria(self):
+        """Firma barata de la galería activa: (máximo id, cantidad de encodings, versión)
+
+        La versión la incrementan triggers ante cualquier cambio en estudiantes o
+        encodings_faciales, así que también cubre ediciones de nombres.
+        """
+        cursor = self.conexion().cursor()
+        
+        cursor.execute('''
+            SELECT COALESCE(MAX(e.id), 0), COUNT(*),
+                   (SELECT version FROM version_galeria WHERE id = 1)
+            FROM encodings_faciales e
+            JOIN estudiantes est ON e.estudiante_id = est.id
+            WHERE est.activo = 1
+        ''')
+        firma = cursor.fetchone()
+        cursor.close()
+        return firma
+    
+    def nombres_estudiantes_activos(self):
+        """{estudiante_id: "nombre apellido"} de los estudiantes activos"""
+        cursor = self.conexion().execute("SELECT id, nombre, apellido FROM estudiantes WHERE activo = 1")
+        return {estudiante_id: f"{nombre} {apellido}" for estudiante_id, nombre, apellido in cursor.fetchall()}
+    
+    def obtener_ids_galeria(self):
+        """Ids de encodings_faciales de estudiantes activos (sin leer los BLOBs)"""
+        cursor = self.conexion().cursor()
+        
+        cursor.execute('''
+            SELECT e.id
+            FROM encodings_faciales e
+            JOIN estudiantes est ON e.estudiante_id = est.id
+            WHERE est.activo = 1
+        ''')
+        encoding_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return encoding_ids
+    
+    def cargar_encodings_por_id(self, encoding_ids):
+        """Cargar solo los encodings indicados (mismo formato que cargar_galeria)"""
+        cursor = self.conexion().cursor()
+        
+        resultado_ids, blobs, nombres, ids = [], [], [], []
+        encoding_ids = list(encoding_ids)
+        # SQLite limita la cantidad de parámetros por consulta
+        for inicio in range(0, len(encoding_ids), 500):
+            bloque = encoding_ids[inicio:inicio + 500]
+            marcadores = ','.join('?' * len(bloque))
+            cursor.execute(f'''
+                SELECT e.id, e.estudiante_id, est.nombre, est.apellido, e.encoding_data
+                FROM encodings_faciales e
+                JOIN estudiantes est ON e.estudiante_id = est.id
+                WHERE est.activo = 1 AND e.id IN ({marcadores})
+                ORDER BY e.id
+            ''', bloque)
+            for encoding_id, estudiante_id, nombre, apellido, encoding_bytes in cursor.fetchall():
+                resultado_ids.append(encoding_id)
+                blobs.append(encoding_bytes)
+                nombres.append(f"{nombre} {apellido}")
+                ids.append(estudiante_id)
+        
+        cursor.close()
+        return resultado_ids, cargar_matriz(blobs), nombres, ids
+    
+    def migrar_formato_encodings(self, formato='float32', lote=1000):
+        """Reescribir los encodings almacenados en otro formato (también las filas float64 antiguas)"""
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de encoding no válido: {formato}")
+        cursor = self.conexion().cursor()
+        cursor.execute("SELECT id, encoding_data FROM encodings_faciales")
+        pendientes = [(encoding_id, blob) for encoding_id, blob in cursor.fetchall()
+                      if leer_cabecera(blob)[0] != formato]
+        cursor.close()
+        
+        for inicio in range(0, len(pendientes), lote):
+            bloque = pendientes[inicio:inicio + lote]
+            matriz = cargar_matriz([blob for _, blob in bloque])
+            with self.transaccion() as cursor:
+                cursor.executemany(
+                    "UPDATE encodings_faciales SET encoding_data = ? WHERE id = ?",
+                    [(codificar(vector, formato), encoding_id) for (encoding_id, _), vector in zip(bloque, matriz)]
+                )
+        
+        if pendientes:
+            # Recuperar el espacio de los BLOBs anteriores (fuera de cualquier transacción)
+            self.conexion().execute("VACUUM")
+            self.actualizar_snapshot_galeria()
+        print(f"✅ {len(pendientes)} encodings migrados a {formato}")
+        return len(pendientes)
+    
+    def eliminar_encodings(self, encoding_ids, compactar=False):
+        """Eliminar filas de encodings_faciales en una sola transacción y actualizar el snapshot
+
+        El índice IVF persistido descarta las claves eliminadas al sincronizarse.
+        """
+        encoding_ids = list(encoding_ids)
+        if not encoding_ids:
+            return 0
+        with self.transaccion() as cursor:
+            cursor.executemany("DELETE FROM encodings_faciales WHERE id = ?", [(i,) for i in encoding_ids])
+        if compactar:
+            # Recuperar el espacio de los BLOBs eliminados (fuera de cualquier transacción)
+            self.conexion().execute("VACUUM")
+        self.actualizar_snapshot_galeria()
+        return len(encoding_ids)
+    
+    def guardar_umbrales(self, filas):
+        """Reemplazar los umbrales por estudiante: filas (estudiante_id, umbral, vecino_id, distancia_vecino)"""
+        fecha = datetime.now().isoformat(sep=' ', timespec='seconds')
+        with self.transaccion() as cursor:
+            cursor.execute("DELETE FROM umbrales_estudiante")
+            cursor.executemany('''
+                INSERT INTO umbrales_estudiante (estudiante_id, umbral, vecino_id, distancia_vecino, fecha)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(*fila, fecha) for fila in filas])
+    
+    def cargar_umbrales(self):
+        """{estudiante_id: umbral de distancia}; los estudiantes sin fila usan UMBRAL_DISTANCIA"""
+        cursor = self.conexion().execute("SELECT estudiante_id, umbral FROM umbrales_estudiante")
+        return dict(cursor.fetchall())
+    
+    def regenerar_snapshot_galeria(self):
+        """Escribir el snapshot mapeable de la galería activa (ver snapshot_galeria)"""
+        # La firma se toma antes de leer: un cambio concurrente deja el snapshot desactualizado, no inconsistente
+        firma = self.firma_galeria()
+        encoding_ids, encodings, nombres, ids = self.cargar_galeria()
+        escribir_snapshot(self.ruta_snapshot, encodings, nombres, ids, encoding_ids, firma)
+        return firma
+    
+    def actualizar_snapshot_galeria(self):
+        """Regenerar el snapshot solo si la galería cambió desde que se escribió"""
+        if leer_firma(self.ruta_snapshot) == tuple(self.firma_galeria()):
+            return False
+        self.regenerar_snapshot_galeria()
+        return True
+    
+    def abrir_snapshot_galeria(self):
+        """Galería mapeada en memoria (mismo formato que cargar_galeria) más su firma"""
+        self.actualizar_snapshot_galeria()
+        snapshot = abrir_snapshot(self.ruta_snapshot)
+        if snapshot is None:
+            # Archivo ilegible (p. ej. disco lleno al escribir): cargar directamente desde la base
+            firma = self.firma_galeria()
+            return (*self.cargar_galeria(), firma)
+        return snapshot
+    
+    def _calcular_estado(self, momento, config):
+        """Determinar 'presente' o 'tardanza' según la hora de entrada y la tolerancia"""
+        if not config:
+            return 'presente'  # Default si no hay configuración
+        
+        hora_entrada_str, tolerancia = config
+        
+        # Convertir hora_entrada a datetime para comparación
+        hora_entrada = datetime.strptime(hora_entrada_str, '%H:%M:%S').time()
+        
+        # Calcular si es tardanza
+        hora_limite = datetime.combine(momento.date(), hora_entrada) + timedelta(minutes=tolerancia)
+        
+        if momento > hora_limite:
+            return 'tardanza'
+        return 'presente'
+    
     def registrar_asistencia(self, estudiante_id, metodo_deteccion, confianza=1.0):
         """Registrar una asistencia"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         ahora = datetime.now()
         fecha = ahora.date()
         hora = ahora.time().strftime('%H:%M:%S')  # CONVERTIR A STRING
         
-        # Determinar estado basado en la hora
-        cursor.execute('SELECT hora_entrada, tolerancia_minutos FROM configuracion WHERE id = 1')
-        config = cursor.fetchone()
-        
-        if config:
-            hora_entrada_str = config[0]
-            tolerancia = config[1]
-            
-            # Convertir hora_entrada a datetime para comparación
-            hora_entrada = datetime.strptime(hora_entrada_str, '%H:%M:%S').time()
-            
-            # Calcular si es tardanza
-            hora_actual = ahora.time()
-            hora_limite = datetime.combine(ahora.date(), hora_entrada)
-            hora_limite = hora_limite.replace(minute=hora_limite.minute + tolerancia)
+        with self.transaccion() as cursor:
+            # Determinar estado basado en la hora
+            cursor.execute('SELECT hora_entrada, tolerancia_minutos FROM configuracion WHERE id = 1')
+            estado = self._calcular_estado(ahora, cursor.fetchone())
             
-            if ahora > hora_limite:
-                estado = 'tardanza'
-            else:
-                estado = 'presente'
-        else:
-            estado = 'presente'  # Default si no hay configuración
-        
-        cursor.execute('''
-            INSERT INTO asistencias (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza))
-        
-        conn.commit()
-        conn.close()
+            cursor.execute('''
+                INSERT INTO asistencias (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (estudiante_id, fecha, metodo_deteccion) DO NOTHING
+            ''', (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza))
+            insertada = cursor.rowcount > 0
         
+        if not insertada:
+            print(f"ℹ️ Asistencia ya registrada hoy: Estudiante {estudiante_id}")
+            return None
         print(f"✅ Asistencia registrada: Estudiante {estudiante_id} - {estado}")
         return estado
     
+    def registrar_asistencias_lote(self, registros):
+        """Registrar varias asistencias en una sola transacción
+        
+        `registros` es una lista de tuplas (estudiante_id, metodo_deteccion, confianza, momento),
+        donde `momento` es el datetime de la detección. Retorna la lista de estados
+        (None para los registros que ya existían ese día).
+        """
+        if not registros:
+            return []
+        
+        with self.transaccion() as cursor:
+            # La configuración se lee una vez por lote, no por registro
+            cursor.execute('SELECT hora_entrada, tolerancia_minutos FROM configuracion WHERE id = 1')
+            config = cursor.fetchone()
+            
+            estados = []
+            for estudiante_id, metodo_deteccion, confianza, momento in registros:
+                estado = self._calcular_estado(momento, config)
+                # El índice único descarta duplicados de otros escritores; cualquier otra
+                # violación (CHECK, NOT NULL) sí es un error
+                cursor.execute('''
+                    INSERT INTO asistencias (estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (estudiante_id, fecha, metodo_deteccion) DO NOTHING
+                ''', (estudiante_id, momento.date(), momento.time().strftime('%H:%M:%S'),
+                      metodo_deteccion, estado, confianza))
+                estados.append(estado if cursor.rowcount > 0 else None)
+        
+        return estados
+    
+    def obtener_presentes(self, fecha, metodo_deteccion='rostro'):
+        """Ids de estudiantes con asistencia registrada en una fecha"""
+        cursor = self.conexion().cursor()
+        
+        cursor.execute(CONSULTAS['presentes_por_fecha'], (fecha, metodo_deteccion))
+        presentes = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        return presentes
+    
     def obtener_estudiantes(self):
         """Obtener lista de todos los estudiantes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conexion().cursor()
         
         cursor.execute('''
             SELECT id, codigo, nombre, apellido, edad, seccion, fecha_registro
@@ -206,20 +639,32 @@ class DatabaseManager:
         ''')
         
         estudiantes = cursor.fetchall()
-        conn.close()
+        cursor.close()
         return estudiantes
     
+    def imagenes_procesadas(self):
+        """Rutas de imágenes ya inscritas o descartadas (para reanudar la inscripción masiva)"""
+        cursor = self.conexion().cursor()
+        cursor.execute('''
+            SELECT imagen_path FROM encodings_faciales WHERE imagen_path IS NOT NULL
+            UNION
+            SELECT imagen_path FROM imagenes_descartadas
+        ''')
+        rutas = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        return rutas
+    
     def buscar_estudiante_por_codigo(self, codigo):
         """Buscar estudiante por código"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conexion().cursor()
         
         cursor.execute('SELECT id, nombre, apellido FROM estudiantes WHERE codigo = ? AND activo = 1', (codigo,))
         estudiante = cursor.fetchone()
-        conn.close()
+        cursor.close()
         
         return estudiante
     
     def _get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Conexión independiente (el llamador la cierra); preferir conexion() o transaccion()"""
+        return self._nueva_conexion()
         
\ No newline at end of file
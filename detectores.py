@@ -0,0 +1,154 @@
+# detectores.py
+import os
+import threading
+
+# Modelos de OpenCV que no trae face_recognition (se descargan aparte a esta carpeta)
+DIRECTORIO_MODELOS = "modelos"
+
+
+class DetectorHOG:
+    """HOG de dlib vía face_recognition ('cnn' usa el detector CNN de dlib)"""
+
+    nombre = 'hog'
+
+    def __init__(self, modelo='hog'):
+        self.modelo = modelo
+        self.nombre = modelo
+
+    def detectar(self, imagen_rgb, upsample=1):
+        """Rostros (top, right, bottom, left) en una imagen RGB"""
+        import face_recognition
+        return face_recognition.face_locations(imagen_rgb, number_of_times_to_upsample=upsample, model=self.modelo)
+
+
+class DetectorHaar:
+    """Cascada Haar de OpenCV: la más rápida, con más falsos positivos y solo rostros frontales"""
+
+    nombre = 'haar'
+
+    def __init__(self, ruta_cascada=None, factor_escala=1.1, vecinos=5, tamano_minimo=80):
+        import cv2
+
+        if ruta_cascada is None:
+            # opencv-python trae las cascadas; las compilaciones del sistema a veces no
+            archivo = 'haarcascade_frontalface_default.xml'
+            candidatos = [os.path.join(getattr(getattr(cv2, 'data', None), 'haarcascades', ''), archivo),
+                          os.path.join(DIRECTORIO_MODELOS, archivo)]
+            ruta_cascada = next((r for r in candidatos if os.path.exists(r)), candidatos[-1])
+        if not os.path.exists(ruta_cascada):
+            raise FileNotFoundError(f"No se encuentra la cascada Haar: {ruta_cascada}")
+        self.cascada = cv2.CascadeClassifier(ruta_cascada)
+        self.factor_escala = factor_escala
+        self.vecinos = vecinos
+        # Mismo tamaño mínimo que HOG sin upsampling; cada nivel de upsample lo divide a la mitad
+        self.tamano_minimo = tamano_minimo
+        self._lock = threading.Lock()
+
+    def detectar(self, imagen_rgb, upsample=1):
+        import cv2
+
+        gris = cv2.equalizeHist(cv2.cvtColor(imagen_rgb, cv2.COLOR_RGB2GRAY))
+        minimo = max(24, self.tamano_minimo >> upsample)
+        with self._lock:
+            cajas = self.cascada.detectMultiScale(gris, scaleFactor=self.factor_escala, minNeighbors=self.vecinos,
+                                                  minSize=(minimo, minimo))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in cajas]
+
+
+class DetectorDNN:
+    """SSD res10 de OpenCV DNN en CPU: tolera mejor la pose y la iluminación que HOG
+
+    La red trabaja siempre a 300x300, así que `upsample` no aplica.
+    """
+
+    nombre = 'dnn'
+
+    def __init__(self, prototxt=None, pesos=None, confianza_minima=0.5, tamano=300):
+        import cv2
+
+        prototxt = prototxt or os.path.join(DIRECTORIO_MODELOS, 'deploy.prototxt')
+        pesos = pesos or os.path.join(DIRECTORIO_MODELOS, 'res10_300x300_ssd_iter_140000.caffemodel')
+        for ruta in (prototxt, pesos):
+            if not os.path.exists(ruta):
+                raise FileNotFoundError(f"No se encuentra el modelo DNN: {ruta}")
+        self.red = cv2.dnn.readNetFromCaffe(prototxt, pesos)
+        self.red.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.red.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confianza_minima = confianza_minima
+        self.tamano = tamano
+        self._lock = threading.Lock()
+
+    def detectar(self, imagen_rgb, upsample=1):
+        import cv2
+
+        alto, ancho = imagen_rgb.shape[:2]
+        # La red se entrenó en BGR con estas medias por canal
+        entrada = cv2.cvtColor(cv2.resize(imagen_rgb, (self.tamano, self.tamano)), cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(entrada, 1.0, (self.tamano, self.tamano), (104.0, 177.0, 123.0))
+        with self._lock:
+            self.red.setInput(blob)
+            salida = self.red.forward()
+
+        rostros = []
+        for _, _, confianza, x1, y1, x2, y2 in salida[0, 0]:
+            if confianza < self.confianza_minima:
+                continue
+            left, right = max(0, int(x1 * ancho)), min(ancho, int(x2 * ancho))
+            top, bottom = max(0, int(y1 * alto)), min(alto, int(y2 * alto))
+            if right > left and bottom > top:
+                rostros.append((top, right, bottom, left))
+        return rostros
+
+
+DETECTORES = {
+    'hog': DetectorHOG,
+    'cnn': lambda **kwargs: DetectorHOG('cnn', **kwargs),
+    'haar': DetectorHaar,
+    'dnn': DetectorDNN,
+}
+
+_compartidos = {}
+_lock_compartidos = threading.Lock()
+
+
+def crear_detector(nombre='hog', **kwargs):
+    """Crear una instancia nueva del detector solicitado"""
+    if nombre not in DETECTORES:
+        raise ValueError(f"Detector no válido: {nombre}")
+    return DETECTORES[nombre](**kwargs)
+
+
+def _cargar_compartido(nombre):
+    with _lock_compartidos:
+        if nombre not in _compartidos:
+            _compartidos[nombre] = crear_detector(nombre)
+        return _compartidos[nombre]
+
+
+def detector_compartido(nombre='hog'):
+    """Instancia única por proceso: inscripción y monitor cargan el modelo una sola vez
+
+    Si el detector configurado no se puede cargar (por ejemplo, faltan los modelos
+    de modelos/), se usa HOG con un aviso en lugar de impedir el arranque.
+    """
+    if not isinstance(nombre, str):
+        return nombre
+    try:
+        return _cargar_compartido(nombre)
+    except Exception as e:
+        if nombre == 'hog':
+            raise
+        print(f"⚠️ No se pudo cargar el detector '{nombre}' ({e}); se usa 'hog'")
+        return _cargar_compartido('hog')
+
+
+def detectores_disponibles():
+    """Nombres de los detectores que se pueden cargar en esta instalación"""
+    disponibles = []
+    for nombre in DETECTORES:
+        try:
+            _cargar_compartido(nombre)
+        except Exception:
+            continue
+        disponibles.append(nombre)
+    return disponibles
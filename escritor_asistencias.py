@@ -0,0 +1,147 @@
+# escritor_asistencias.py
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class EscritorAsistencias:
+    """Cola de escritura diferida para asistencias
+
+    El bucle de video solo encola (estudiante, método, confianza, momento); un único
+    hilo escritor agrupa los registros y los inserta en una transacción cada
+    `intervalo_ms` milisegundos o cada `max_lote` registros, lo que ocurra primero.
+
+    Si un lote no se puede escribir tras los reintentos se entrega a
+    `al_fallar(lote)` (por ejemplo, para desmarcar a esos estudiantes de la caché
+    de presencia y que una detección posterior vuelva a intentarlo).
+    """
+
+    def __init__(self, db, intervalo_ms=250, max_lote=100, al_fallar=None):
+        self.db = db
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_lote = max_lote
+        self.al_fallar = al_fallar
+        self._cola = queue.Queue()
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        # Ordena encolar frente al cierre: nada entra a la cola después del vaciado final
+        self._lock_cierre = threading.Lock()
+
+        # Estadísticas
+        self.encolados = 0
+        self.escritos = 0
+        self.lotes = 0
+        self.errores = 0
+        self.descartados = 0
+        self.profundidad_maxima = 0
+        self.ultimo_lote_ms = 0.0
+
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-asistencias", daemon=True)
+        self._hilo.start()
+        # Si el proceso termina sin cerrar(), no perder lo pendiente
+        atexit.register(self.cerrar)
+
+    def encolar(self, estudiante_id, metodo_deteccion, confianza, momento=None):
+        """Encolar una asistencia sin bloquear al llamador"""
+        registro = (estudiante_id, metodo_deteccion, confianza, momento or datetime.now())
+        with self._lock_cierre:
+            cerrado = self._detener.is_set()
+            if not cerrado:
+                self._cola.put(registro)
+        if cerrado:
+            # Escritor ya cerrado: escribir directamente para no perder el registro
+            self._escribir([registro])
+            return
+        with self._lock:
+            self.encolados += 1
+            self.profundidad_maxima = max(self.profundidad_maxima, self._cola.qsize())
+
+    def _tomar_lote(self):
+        """Esperar el primer registro y acumular hasta max_lote o hasta vencer el intervalo"""
+        try:
+            lote = [self._cola.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote, reintentos=2):
+        inicio = time.perf_counter()
+        for intento in range(reintentos + 1):
+            try:
+                estados = self.db.registrar_asistencias_lote(lote)
+                break
+            except Exception as e:
+                with self._lock:
+                    self.errores += 1
+                if intento == reintentos:
+                    print(f"❌ Error escribiendo lote de {len(lote)} asistencias: {e}")
+                    with self._lock:
+                        self.descartados += len(lote)
+                    if self.al_fallar is not None:
+                        self.al_fallar(lote)
+                    return
+                # Por ejemplo 'database is locked': esperar un poco y reintentar
+                time.sleep(0.1 * (intento + 1))
+        with self._lock:
+            self.escritos += len(lote)
+            self.lotes += 1
+            self.ultimo_lote_ms = 1000 * (time.perf_counter() - inicio)
+        for (estudiante_id, _, _, _), estado in zip(lote, estados):
+            if estado is not None:
+                print(f"✅ Asistencia registrada: Estudiante {estudiante_id} - {estado}")
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            lote = self._tomar_lote()
+            if lote:
+                self._escribir(lote)
+        # Vaciar lo que quede al cerrar
+        self.vaciar()
+
+    def vaciar(self):
+        """Escribir de inmediato todo lo pendiente en la cola"""
+        pendientes = []
+        while True:
+            try:
+                pendientes.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        for inicio in range(0, len(pendientes), self.max_lote):
+            self._escribir(pendientes[inicio:inicio + self.max_lote])
+
+    @property
+    def cerrado(self):
+        return self._detener.is_set()
+
+    def cerrar(self):
+        """Detener el hilo escritor después de persistir todo lo encolado"""
+        with self._lock_cierre:
+            if self._detener.is_set():
+                return
+            self._detener.set()
+        self._hilo.join(timeout=10)
+        atexit.unregister(self.cerrar)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'profundidad': self._cola.qsize(),
+                'profundidad_maxima': self.profundidad_maxima,
+                'encolados': self.encolados,
+                'escritos': self.escritos,
+                'lotes': self.lotes,
+                'errores': self.errores,
+                'descartados': self.descartados,
+                'ultimo_lote_ms': self.ultimo_lote_ms,
+            }
@@ -0,0 +1,114 @@
+# formato_encodings.py
+"""Formato versionado de los BLOBs de encodings_faciales
+
+Cabecera de 6 bytes: b'EF', versión, código de dtype y dimensión (uint16).
+  - float32: cabecera + dimensión * 4 bytes
+  - int8:    cabecera + escala float32 + dimensión * 1 byte (cuantización simétrica por vector)
+Las filas antiguas (float64 crudo, sin cabecera) se siguen leyendo.
+
+Uso: python formato_encodings.py migrar [--db asistencias.db] [--formato float32|int8]
+"""
+import argparse
+import struct
+
+import numpy as np
+
+MAGICO = b'EF'
+VERSION = 1
+CABECERA = struct.Struct('<2sBBH')
+
+FORMATOS = {
+    # nombre: (código, bytes de prefijo tras la cabecera, dtype almacenado)
+    'float32': (1, 0, np.dtype('<f4')),
+    'int8': (2, 4, np.dtype('i1')),
+}
+_POR_CODIGO = {codigo: nombre for nombre, (codigo, _, _) in FORMATOS.items()}
+
+
+def codificar(encoding, formato='float32'):
+    """Convertir un encoding a BLOB con cabecera"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de encoding no válido: {formato}")
+    codigo, _, dtype = FORMATOS[formato]
+    vector = np.asarray(encoding, dtype=np.float32).reshape(-1)
+    cabecera = CABECERA.pack(MAGICO, VERSION, codigo, vector.shape[0])
+
+    if formato == 'int8':
+        maximo = float(np.abs(vector).max()) if vector.size else 0.0
+        escala = maximo / 127.0 if maximo > 0 else 1.0
+        cuantizado = np.clip(np.rint(vector / escala), -127, 127).astype(dtype)
+        return cabecera + struct.pack('<f', escala) + cuantizado.tobytes()
+    return cabecera + vector.astype(dtype).tobytes()
+
+
+def leer_cabecera(blob):
+    """(formato, dimensión) del BLOB; formato 'float64' para filas antiguas sin cabecera"""
+    if len(blob) >= CABECERA.size:
+        magico, version, codigo, dimension = CABECERA.unpack_from(blob)
+        if magico == MAGICO and version == VERSION and codigo in _POR_CODIGO:
+            formato = _POR_CODIGO[codigo]
+            _, prefijo, dtype = FORMATOS[formato]
+            # Un float64 antiguo podría empezar por b'EF': la longitud desambigua
+            if len(blob) == CABECERA.size + prefijo + dimension * dtype.itemsize:
+                return formato, dimension
+    if len(blob) % 8:
+        raise ValueError(f"BLOB de encoding no reconocido ({len(blob)} bytes)")
+    return 'float64', len(blob) // 8
+
+
+def decodificar(blob):
+    """BLOB (cualquier formato) -> vector float32"""
+    return cargar_matriz([blob])[0]
+
+
+def cargar_matriz(blobs, dimension=128):
+    """Decodificar una lista de BLOBs en una matriz float32 (n, dimension)
+
+    La matriz se reserva una sola vez; las filas de un mismo formato se
+    decodifican juntas con operaciones vectorizadas en lugar de fila por fila.
+    """
+    matriz = np.empty((len(blobs), dimension), dtype=np.float32)
+    # Agrupar por (longitud, cabecera): la cabecera se interpreta una vez por grupo.
+    # Las filas float64 antiguas no tienen cabecera y se agrupan solo por longitud.
+    grupos = {}
+    for fila, blob in enumerate(blobs):
+        clave = (len(blob), blob[:CABECERA.size] if blob[:2] == MAGICO else None)
+        grupos.setdefault(clave, []).append(fila)
+
+    for filas in grupos.values():
+        formato, dim = leer_cabecera(blobs[filas[0]])
+        if dim != dimension:
+            raise ValueError(f"Encoding de dimensión {dim}, se esperaba {dimension}")
+        if len(filas) == len(blobs):
+            filas = slice(None)  # caso habitual: un solo formato, sin indexado elaborado
+            crudo = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+        else:
+            crudo = np.frombuffer(b''.join(blobs[f] for f in filas), dtype=np.uint8).reshape(len(filas), -1)
+        if formato == 'float64':
+            matriz[filas] = crudo.view('<f8')
+            continue
+        _, prefijo, dtype = FORMATOS[formato]
+        datos = crudo[:, CABECERA.size + prefijo:].view(dtype)
+        if formato == 'int8':
+            escalas = crudo[:, CABECERA.size:CABECERA.size + 4].copy().view('<f4')
+            matriz[filas] = datos * escalas
+        else:
+            matriz[filas] = datos
+    return matriz
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrar los encodings almacenados a un formato compacto")
+    parser.add_argument('accion', choices=['migrar'])
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--formato', choices=sorted(FORMATOS), default='float32')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager(args.db)
+    db.migrar_formato_encodings(args.formato)
+    db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
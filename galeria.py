@@ -0,0 +1,304 @@
+# galeria.py
+import numpy as np
+
+# Distancia máxima para aceptar una coincidencia (por defecto para todos los estudiantes)
+UMBRAL_DISTANCIA = 0.6
+# Holgura de la cota de rechazo temprano frente al redondeo float32 de distancias_euclidianas
+TOLERANCIA_COTA = 1e-3
+
+
+def distancias_euclidianas(consultas, matriz, normas_matriz=None):
+    """Calcular la matriz de distancias entre consultas (m, d) y la galería (n, d)"""
+    consultas = np.asarray(consultas, dtype=np.float32)
+    if consultas.ndim == 1:
+        consultas = consultas[np.newaxis, :]
+
+    if normas_matriz is None:
+        normas_matriz = np.einsum('ij,ij->i', matriz, matriz)
+
+    # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q·g  (una sola multiplicación de matrices)
+    normas_consultas = np.einsum('ij,ij->i', consultas, consultas)
+    cuadrados = normas_consultas[:, np.newaxis] + normas_matriz[np.newaxis, :] - 2.0 * (consultas @ matriz.T)
+    np.maximum(cuadrados, 0.0, out=cuadrados)
+    return np.sqrt(cuadrados, out=cuadrados)
+
+
+class GaleriaFacial:
+    """Galería de encodings en una matriz float32 contigua para comparación por lotes"""
+
+    def __init__(self, encodings, nombres, ids, encoding_ids=None, dimension=128):
+        self.dimension = dimension
+        if isinstance(encodings, np.ndarray) and encodings.ndim == 2:
+            # Matriz ya decodificada en bloque (cargar_matriz): se usa sin copiar
+            self.matriz = np.ascontiguousarray(encodings, dtype=np.float32)
+        elif len(encodings) > 0:
+            self.matriz = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+        else:
+            self.matriz = np.empty((0, dimension), dtype=np.float32)
+        self.nombres = list(nombres)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        # id de cada fila en encodings_faciales (clave estable entre cargas)
+        if encoding_ids is None:
+            encoding_ids = np.arange(len(self.ids))
+        self.encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+        # Normas precalculadas: se reutilizan en cada frame
+        self.normas = np.einsum('ij,ij->i', self.matriz, self.matriz)
+
+    @classmethod
+    def desde_db(cls, db):
+        """Construir la galería a partir de la base de datos"""
+        encoding_ids, encodings, nombres, ids = db.cargar_galeria()
+        return cls(encodings, nombres, ids, encoding_ids)
+
+    def __len__(self):
+        return self.matriz.shape[0]
+
+    def con_cambios(self, encodings=(), nombres=(), ids=(), encoding_ids=(), eliminar=()):
+        """Nueva galería con filas agregadas y/o eliminadas (por encoding_id)
+
+        Se devuelve una instancia nueva para que el hilo de video pueda seguir
+        usando la anterior hasta que se reemplace la referencia.
+        """
+        conservar = ~np.isin(self.encoding_ids, np.asarray(list(eliminar), dtype=np.int64))
+        nombres_conservados = [n for n, c in zip(self.nombres, conservar) if c]
+        matriz = self.matriz[conservar]
+        if len(encodings) > 0:
+            nuevos = np.asarray(np.vstack(encodings), dtype=np.float32)
+            matriz = np.vstack([matriz, nuevos])
+        return GaleriaFacial(
+            matriz,
+            nombres_conservados + list(nombres),
+            np.concatenate([self.ids[conservar], np.asarray(ids, dtype=np.int64)]),
+            np.concatenate([self.encoding_ids[conservar], np.asarray(encoding_ids, dtype=np.int64)]),
+            self.dimension,
+        )
+
+    def distancias(self, face_encodings):
+        """Distancias de todos los rostros de un frame contra toda la galería"""
+        return distancias_euclidianas(face_encodings, self.matriz, self.normas)
+
+    def comparar_lote(self, face_encodings):
+        """Comparar todos los rostros de un frame contra la galería en una sola operación
+
+        Devuelve una lista de diccionarios (uno por rostro) con el mejor candidato,
+        su distancia y el segundo mejor candidato.
+        """
+        if len(face_encodings) == 0:
+            return []
+
+        if len(self) == 0:
+            return [self._resultado_vacio() for _ in face_encodings]
+
+        distancias = self.distancias(face_encodings)
+        filas = np.arange(distancias.shape[0])
+
+        if len(self) > 1:
+            # Los dos menores por fila sin ordenar toda la galería
+            mejores_dos = np.argpartition(distancias, 1, axis=1)[:, :2]
+            dist_dos = distancias[filas[:, np.newaxis], mejores_dos]
+            orden = np.argsort(dist_dos, axis=1)
+            mejores_dos = np.take_along_axis(mejores_dos, orden, axis=1)
+        else:
+            mejores_dos = np.zeros((distancias.shape[0], 1), dtype=np.intp)
+
+        resultados = []
+        for fila in filas:
+            mejor = int(mejores_dos[fila, 0])
+            resultado = {
+                'indice': mejor,
+                'estudiante_id': int(self.ids[mejor]),
+                'nombre': self.nombres[mejor],
+                'distancia': float(distancias[fila, mejor]),
+                'segundo_id': None,
+                'segunda_distancia': None,
+            }
+            if mejores_dos.shape[1] > 1:
+                segundo = int(mejores_dos[fila, 1])
+                resultado['segundo_id'] = int(self.ids[segundo])
+                resultado['segunda_distancia'] = float(distancias[fila, segundo])
+            resultados.append(resultado)
+
+        return resultados
+
+    @staticmethod
+    def _resultado_vacio():
+        return {
+            'indice': None,
+            'estudiante_id': None,
+            'nombre': None,
+            'distancia': None,
+            'segundo_id': None,
+            'segunda_distancia': None,
+            'umbral': None,
+        }
+
+
+class IndiceEstudiantes:
+    """Índice a nivel de estudiante: agrupa los encodings por estudiante_id
+
+    modo='min'       -> distancia mínima entre todos los encodings del estudiante
+    modo='centroide' -> distancia al centroide precalculado de cada estudiante
+
+    La búsqueda de vecinos se delega en un backend de indices_galeria
+    ('fuerza_bruta', 'ivf' o 'auto').
+
+    `umbrales` ({estudiante_id: distancia}, ver colisiones_galeria.py) ajusta el
+    umbral de aceptación de cada estudiante. En modo 'min' un rostro cuya cota
+    inferior d(rostro, centroide) - radio supera el umbral de todos los
+    estudiantes se rechaza sin la búsqueda completa.
+    """
+
+    MODOS = ('min', 'centroide')
+
+    def __init__(self, galeria, modo='min', backend='fuerza_bruta', ruta_persistencia=None, umbrales=None):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de comparación no válido: {modo}")
+        self.galeria = galeria
+        self.modo = modo
+        self.tipo_backend = backend
+        self.ruta_persistencia = ruta_persistencia
+        self.umbrales_por_id = dict(umbrales or {})
+        self.rechazos_tempranos = 0
+        self._construir()
+
+    def _construir(self):
+        """Ordenar la galería por estudiante, precalcular centroides y preparar el backend"""
+        from indices_galeria import crear_indice
+
+        ids = self.galeria.ids
+        # Orden estable para que los encodings de cada estudiante queden contiguos
+        self.orden = np.argsort(ids, kind='stable')
+        # Galería ya ordenada (snapshot): usar la matriz sin copiarla
+        ya_ordenada = bool(np.all(ids[1:] >= ids[:-1]))
+        ids_ordenados = ids[self.orden]
+        self.estudiante_ids, self.inicios, self.conteos = np.unique(
+            ids_ordenados, return_index=True, return_counts=True
+        )
+
+        primer_indice = self.orden[self.inicios] if len(self.orden) else np.empty(0, dtype=np.intp)
+        self.nombres = [self.galeria.nombres[i] for i in primer_indice]
+        self.umbrales = np.array([self.umbrales_por_id.get(int(e), UMBRAL_DISTANCIA) for e in self.estudiante_ids],
+                                 dtype=np.float32)
+
+        if self.modo == 'centroide':
+            matriz_ordenada = self.galeria.matriz if ya_ordenada else self.galeria.matriz[self.orden]
+            if len(self.estudiante_ids) > 0:
+                sumas = np.add.reduceat(matriz_ordenada, self.inicios, axis=0)
+                self.vectores = np.ascontiguousarray(sumas / self.conteos[:, np.newaxis], dtype=np.float32)
+            else:
+                self.vectores = np.empty((0, self.galeria.dimension), dtype=np.float32)
+            claves = self.estudiante_ids
+            self.estudiante_de_vector = np.arange(len(self.estudiante_ids))
+        else:
+            if ya_ordenada:
+                self.vectores = self.galeria.matriz
+            else:
+                self.vectores = np.ascontiguousarray(self.galeria.matriz[self.orden])
+            claves = self.galeria.encoding_ids[self.orden]
+            self.estudiante_de_vector = np.repeat(np.arange(len(self.estudiante_ids)), self.conteos)
+        self.normas = np.einsum('ij,ij->i', self.vectores, self.vectores)
+
+        self.centroides = None
+        if self.modo == 'min' and len(self.estudiante_ids) > 0 and self.conteos.max() > 1:
+            # Centroide y radio (encoding más alejado) de cada estudiante para la cota de rechazo
+            sumas = np.add.reduceat(self.vectores, self.inicios, axis=0)
+            self.centroides = np.ascontiguousarray(sumas / self.conteos[:, np.newaxis], dtype=np.float32)
+            desvios = np.linalg.norm(self.vectores - self.centroides[self.estudiante_de_vector], axis=1)
+            self.radios = np.maximum.reduceat(desvios, self.inicios)
+            self.normas_centroides = np.einsum('ij,ij->i', self.centroides, self.centroides)
+
+        self.backend = crear_indice(self.tipo_backend, len(self.vectores))
+        if self.ruta_persistencia:
+            self.backend.sincronizar(self.ruta_persistencia, self.vectores, claves)
+        else:
+            self.backend.construir(self.vectores, claves)
+
+    def __len__(self):
+        return len(self.estudiante_ids)
+
+    def distancias_por_estudiante(self, face_encodings):
+        """Matriz exacta (rostros, estudiantes) con la distancia reducida por estudiante"""
+        distancias = distancias_euclidianas(face_encodings, self.vectores, self.normas)
+        if self.modo == 'min' and len(self) > 0:
+            distancias = np.minimum.reduceat(distancias, self.inicios, axis=1)
+        return distancias
+
+    def descartables(self, face_encodings):
+        """Máscara de rostros que no pueden quedar bajo el umbral de ningún estudiante
+
+        Por la desigualdad triangular, la distancia a cualquier encoding del
+        estudiante es al menos d(rostro, centroide) - radio: la prueba es exacta
+        y cuesta una distancia por estudiante en lugar de una por encoding.
+        """
+        consultas = np.atleast_2d(np.asarray(face_encodings, dtype=np.float32))
+        if self.centroides is None:
+            return np.zeros(consultas.shape[0], dtype=bool)
+        cotas = distancias_euclidianas(consultas, self.centroides, self.normas_centroides) - self.radios
+        return np.all(cotas > self.umbrales + TOLERANCIA_COTA, axis=1)
+
+    def top_k(self, face_encodings, k=2):
+        """Devolver los k estudiantes más cercanos a cada rostro
+
+        Retorna (distancias, posiciones), ambos de forma (rostros, k) ordenados de
+        menor a mayor distancia. Las posiciones indexan estudiante_ids / nombres;
+        -1 (con distancia inf) indica que el backend no encontró más candidatos.
+        """
+        consultas = np.atleast_2d(np.asarray(face_encodings, dtype=np.float32))
+        k = min(k, len(self))
+        if k == 0:
+            vacio = np.empty((consultas.shape[0], 0))
+            return vacio, vacio.astype(np.intp)
+
+        if self.modo == 'centroide':
+            return self.backend.buscar(consultas, k)
+
+        # Con c capturas por estudiante, los k*c vectores más cercanos contienen k estudiantes
+        dist_vec, pos_vec = self.backend.buscar(consultas, k * int(self.conteos.max()))
+        estudiantes = np.where(pos_vec >= 0, self.estudiante_de_vector[pos_vec], -1)
+
+        distancias = np.full((consultas.shape[0], k), np.inf, dtype=np.float32)
+        posiciones = np.full((consultas.shape[0], k), -1, dtype=np.intp)
+        for fila in range(consultas.shape[0]):
+            validos = estudiantes[fila] >= 0
+            unicos, primeros = np.unique(estudiantes[fila][validos], return_index=True)
+            # Los vectores ya vienen ordenados: la primera aparición es la mínima
+            orden = np.sort(primeros)[:k]
+            posiciones[fila, :len(orden)] = estudiantes[fila][validos][orden]
+            distancias[fila, :len(orden)] = dist_vec[fila][validos][orden]
+        return distancias, posiciones
+
+    def comparar_lote(self, face_encodings):
+        """Mismo formato que GaleriaFacial.comparar_lote, con el segundo candidato de otro estudiante"""
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [GaleriaFacial._resultado_vacio() for _ in face_encodings]
+
+        consultas = np.atleast_2d(np.asarray(face_encodings, dtype=np.float32))
+        resultados = [GaleriaFacial._resultado_vacio() for _ in range(consultas.shape[0])]
+        # Rechazo temprano: los rostros que no se parecen a nadie no pasan por top_k
+        pendientes = np.flatnonzero(~self.descartables(consultas))
+        self.rechazos_tempranos += consultas.shape[0] - len(pendientes)
+        if len(pendientes) == 0:
+            return resultados
+
+        distancias, posiciones = self.top_k(consultas[pendientes], k=2)
+        for fila, i in enumerate(pendientes):
+            mejor = int(posiciones[fila, 0])
+            if mejor < 0:
+                continue
+            resultado = {
+                'indice': mejor,
+                'estudiante_id': int(self.estudiante_ids[mejor]),
+                'nombre': self.nombres[mejor],
+                'distancia': float(distancias[fila, 0]),
+                'segundo_id': None,
+                'segunda_distancia': None,
+                'umbral': float(self.umbrales[mejor]),
+            }
+            if distancias.shape[1] > 1 and posiciones[fila, 1] >= 0:
+                segundo = int(posiciones[fila, 1])
+                resultado['segundo_id'] = int(self.estudiante_ids[segundo])
+                resultado['segunda_distancia'] = float(distancias[fila, 1])
+            resultados[i] = resultado
+        return resultados
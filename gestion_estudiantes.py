@@ -1,94 +1,94 @@
 # gestion_estudiantes.py (VERSIÓN CORREGIDA)
-import face_recognition
 import cv2
 import os
 import time
 from database import DatabaseManager
 from datetime import datetime
-from camara_utils import capturar_rostros_interactivo
+from camara_utils import CamaraManager, CodificadorSegundoPlano, capturar_rostros_automatico, capturar_rostros_interactivo
+from detectores import detector_compartido
 
 class GestorEstudiantes:
     def __init__(self):
         self.db = DatabaseManager()
+        # Misma instancia que usa el monitor en este proceso
+        self.detector = detector_compartido(self.db.detector_configurado())
         self.carpeta_imagenes = "imagenes_estudiantes"
         os.makedirs(self.carpeta_imagenes, exist_ok=True)
     
     def capturar_multiples_rostros(self, estudiante_id, nombre, apellido, num_capturas=5):
-        """Capturar múltiples rostros - VERSIÓN CORREGIDA"""
+        """Capturar múltiples rostros - VERSIÓN CORREGIDA
+
+        Foto y encoding se procesan en segundo plano; los encodings se guardan
+        juntos en una transacción al terminar.
+        """
         print(f"📸 Capturando {num_capturas} imágenes para: {nombre} {apellido}")
         print("Presiona ESPACIO para capturar, ESC para cancelar")
         
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        # 640x480 a 30 FPS, con buffers de frame reutilizados
+        camara = CamaraManager()
+        if not camara.inicializar_camara():
             print("❌ No se puede acceder a la cámara")
             return False
         
-        # Configurar la cámara para mejor rendimiento
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        
-        capturas_exitosas = 0
-        encodings_guardados = 0
+        codificador = CodificadorSegundoPlano(camara)
+        aceptadas = []  # (ruta, encoding)
+        numero_foto = 0
         ultima_captura = time.time()
         
+        def recoger(resultados):
+            for ruta, encoding, error in resultados:
+                if encoding is None:
+                    print(f"❌ No se pudo extraer encoding facial: {error}")
+                    continue
+                aceptadas.append((ruta, encoding))
+                print(f"✅ Imagen {len(aceptadas)} capturada")
+        
         try:
-            while capturas_exitosas < num_capturas:
-                ret, frame = cap.read()
+            while len(aceptadas) < num_capturas:
+                frame, ret = camara.capturar_frame()
                 if not ret:
                     print("❌ Error al capturar frame")
                     break
+                recoger(codificador.completados())
+                if len(aceptadas) >= num_capturas:
+                    break
                 
-                # Mostrar instrucciones
-                cv2.putText(frame, f"Capturando: {nombre} {apellido}", (10, 30), 
+                # Detectar rostros en tiempo real sobre el frame limpio
+                rgb_frame = camara.rgb(frame)
+                face_locations = self.detector.detectar(rgb_frame)
+                
+                # Mostrar instrucciones en el lienzo reutilizado
+                lienzo = camara.lienzo(frame)
+                cv2.putText(lienzo, f"Capturando: {nombre} {apellido}", (10, 30), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(frame, f"Imagen {capturas_exitosas + 1}/{num_capturas}", (10, 60), 
+                cv2.putText(lienzo, f"Imagen {len(aceptadas) + codificador.pendientes + 1}/{num_capturas}", (10, 60), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                cv2.putText(frame, "ESPACIO: Capturar | ESC: Cancelar", (10, 90), 
+                cv2.putText(lienzo, "ESPACIO: Capturar | ESC: Cancelar", (10, 90), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
                 
-                # Detectar rostros en tiempo real
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame, model="hog")  # Usar HOG para más velocidad
-                
                 # Dibujar rectángulo alrededor del rostro detectado
                 for top, right, bottom, left in face_locations:
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame, "Rostro detectado - LISTO", (left, top-10), 
+                    cv2.rectangle(lienzo, (left, top), (right, bottom), (0, 255, 0), 2)
+                    cv2.putText(lienzo, "Rostro detectado - LISTO", (left, top-10), 
                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
                 
-                cv2.imshow('Capturar Rostros', frame)
+                cv2.imshow('Capturar Rostros', lienzo)
                 
                 # MEJORA: Usar waitKey más largo y verificar mejor las teclas
                 key = cv2.waitKey(100) & 0xFF  # 100ms en lugar de 1ms
                 
                 if key == 32:  # Tecla ESPACIO
                     if len(face_locations) > 0:
-                        # Prevenir capturas demasiado rápidas
+                        # Prevenir capturas demasiado rápidas (fotos casi idénticas)
                         if time.time() - ultima_captura < 0.5:
                             continue
-                            
-                        # Guardar imagen
-                        filename = f"{self.carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{capturas_exitosas + 1}.jpg"
-                        success = cv2.imwrite(filename, frame)
+                        if len(aceptadas) + codificador.pendientes >= num_capturas:
+                            continue
                         
-                        if success:
-                            # Extraer encoding del rostro
-                            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                            if len(face_encodings) > 0:
-                                encoding = face_encodings[0]
-                                self.db.guardar_encoding_facial(estudiante_id, encoding, filename)
-                                encodings_guardados += 1
-                                capturas_exitosas += 1
-                                ultima_captura = time.time()
-                                print(f"✅ Imagen {capturas_exitosas} capturada y guardada")
-                                
-                                # Pequeña pausa entre capturas
-                                time.sleep(0.3)
-                            else:
-                                print("❌ No se pudo extraer encoding facial")
-                        else:
-                            print("❌ Error al guardar la imagen")
+                        numero_foto += 1
+                        filename = f"{self.carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{numero_foto}.jpg"
+                        codificador.enviar(frame, rgb_frame, face_locations[0], filename)
+                        ultima_captura = time.time()
                     else:
                         print("❌ No se detectó ningún rostro")
                         
@@ -102,19 +102,29 @@ class GestorEstudiantes:
         except Exception as e:
             print(f"❌ Error durante la captura: {e}")
         finally:
-            # Liberar recursos SIEMPRE
-            cap.release()
-            cv2.destroyAllWindows()
+            # Liberar recursos SIEMPRE (después de terminar las capturas en curso)
+            recoger(codificador.finalizar())
+            camara.liberar_camara()
             # Asegurarse de que todas las ventanas se cierren
             for i in range(5):
                 cv2.waitKey(1)
         
-        print(f"📊 Resumen: {capturas_exitosas}/{num_capturas} capturas exitosas")
+        if aceptadas:
+            try:
+                self.db.guardar_encodings_faciales(estudiante_id, [e for _, e in aceptadas], [r for r, _ in aceptadas])
+            except Exception as e:
+                print(f"❌ Error al guardar los encodings: {e}")
+                aceptadas = []
         
-        return capturas_exitosas > 0
+        print(f"📊 Resumen: {len(aceptadas)}/{num_capturas} capturas exitosas")
+        
+        return len(aceptadas) > 0
     
-    def capturar_fotos_primero(self, nombre, apellido):
-        """Primero capturar fotos, luego registrar en BD - VERSIÓN MEJORADA"""
+    def capturar_fotos_primero(self, nombre, apellido, automatico=False):
+        """Primero capturar fotos, luego registrar en BD - VERSIÓN MEJORADA
+
+        Con `automatico` las capturas se eligen por calidad sin pulsar ESPACIO.
+        """
         print(f"🎯 Registrando: {nombre} {apellido}")
         print("Primero capturaremos las fotos, luego el registro en base de datos")
         
@@ -122,7 +132,8 @@ class GestorEstudiantes:
         temp_id = f"temp_{int(time.time())}"
         
         # Capturar fotos primero usando la nueva función
-        if capturar_rostros_interactivo(temp_id, nombre, apellido, self.db, num_capturas=5):
+        captura = capturar_rostros_automatico if automatico else capturar_rostros_interactivo
+        if captura(temp_id, nombre, apellido, self.db, num_capturas=5, detector=self.detector):
             # Si las fotos se capturaron bien, ahora registrar en BD
             edad = input("Edad (opcional): ").strip()
             seccion = input("Sección (opcional): ").strip()
@@ -174,20 +185,16 @@ class GestorEstudiantes:
     
     def actualizar_encodings(self, temp_id, estudiante_id):
         """Actualizar encodings con el ID real del estudiante"""
-        conn = self.db._get_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute(
-                "UPDATE encodings_faciales SET estudiante_id = ? WHERE estudiante_id = ?",
-                (estudiante_id, temp_id)
-            )
-            conn.commit()
+            with self.db.transaccion() as cursor:
+                cursor.execute(
+                    "UPDATE encodings_faciales SET estudiante_id = ? WHERE estudiante_id = ?",
+                    (estudiante_id, temp_id)
+                )
+            self.db.actualizar_snapshot_galeria()
             print(f"✅ Encodings actualizados al ID real: {estudiante_id}")
         except Exception as e:
             print(f"⚠️ Error actualizando encodings: {e}")
-        finally:
-            conn.close()
     
     def eliminar_fotos_temp(self, temp_id):
         """Eliminar fotos temporales si hay error"""
@@ -215,8 +222,10 @@ class GestorEstudiantes:
             print("❌ Nombre y apellido son obligatorios")
             return None
         
+        modo = input("Captura manual con ESPACIO (M) o automática (A) [M]: ").strip().lower()
+        
         # PRIMERO capturar fotos, LUEGO datos adicionales
-        return self.capturar_fotos_primero(nombre, apellido)
+        return self.capturar_fotos_primero(nombre, apellido, automatico=modo == 'a')
 
     def listar_estudiantes(self):
         """Listar todos los estudiantes registrados"""
@@ -0,0 +1,295 @@
+# indices_galeria.py
+import os
+import numpy as np
+from galeria import distancias_euclidianas
+
+
+def _top_k_filas(distancias, k):
+    """Los k menores de cada fila, ordenados; rellena con inf / -1 si faltan columnas"""
+    filas, columnas = distancias.shape
+    k_real = min(k, columnas)
+    if k_real == 0:
+        return np.full((filas, k), np.inf, dtype=np.float32), np.full((filas, k), -1, dtype=np.intp)
+
+    if k_real < columnas:
+        posiciones = np.argpartition(distancias, k_real - 1, axis=1)[:, :k_real]
+    else:
+        posiciones = np.tile(np.arange(columnas), (filas, 1))
+    dist_k = np.take_along_axis(distancias, posiciones, axis=1)
+    orden = np.argsort(dist_k, axis=1)
+    dist_k = np.take_along_axis(dist_k, orden, axis=1)
+    posiciones = np.take_along_axis(posiciones, orden, axis=1)
+
+    if k_real < k:
+        dist_k = np.hstack([dist_k, np.full((filas, k - k_real), np.inf, dtype=dist_k.dtype)])
+        posiciones = np.hstack([posiciones, np.full((filas, k - k_real), -1, dtype=np.intp)])
+    return dist_k, posiciones
+
+
+class IndiceFuerzaBruta:
+    """Búsqueda exacta: compara cada consulta contra todos los vectores"""
+
+    nombre = 'fuerza_bruta'
+
+    def __init__(self):
+        self.vectores = np.empty((0, 0), dtype=np.float32)
+        self.normas = np.empty(0, dtype=np.float32)
+        self.claves = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.vectores.shape[0]
+
+    def construir(self, vectores, claves):
+        self.vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        self.normas = np.einsum('ij,ij->i', self.vectores, self.vectores)
+        self.claves = np.asarray(claves, dtype=np.int64)
+        return self
+
+    def agregar(self, vectores, claves):
+        vectores = np.atleast_2d(np.asarray(vectores, dtype=np.float32))
+        if len(self) == 0:
+            return self.construir(vectores, claves)
+        self.vectores = np.vstack([self.vectores, vectores])
+        self.normas = np.concatenate([self.normas, np.einsum('ij,ij->i', vectores, vectores)])
+        self.claves = np.concatenate([self.claves, np.asarray(claves, dtype=np.int64)])
+
+    def buscar(self, consultas, k):
+        """Retorna (distancias, posiciones) de forma (consultas, k), ordenadas"""
+        distancias = distancias_euclidianas(consultas, self.vectores, self.normas)
+        return _top_k_filas(distancias, k)
+
+    def guardar(self, ruta):
+        # No hay nada que entrenar: reconstruirlo es más barato que leerlo de disco
+        pass
+
+    def sincronizar(self, ruta, vectores, claves):
+        """Interfaz común con IndiceIVF"""
+        return self.construir(vectores, claves)
+
+
+class IndiceIVF:
+    """Índice aproximado IVF (archivo invertido) con particiones k-means en NumPy puro
+
+    Cada vector se asigna a su centroide más cercano; una consulta solo se compara
+    contra los vectores de las `n_sondeos` particiones más cercanas.
+    """
+
+    nombre = 'ivf'
+
+    def __init__(self, n_listas=None, n_sondeos=8, iteraciones=10, max_entrenamiento=20000, semilla=0):
+        self.n_listas = n_listas
+        self.n_sondeos = n_sondeos
+        self.iteraciones = iteraciones
+        self.max_entrenamiento = max_entrenamiento
+        self.semilla = semilla
+        self.centroides = None
+        self.vectores = np.empty((0, 0), dtype=np.float32)
+        self.normas = np.empty(0, dtype=np.float32)
+        self.claves = np.empty(0, dtype=np.int64)
+        self.asignaciones = np.empty(0, dtype=np.int32)
+        self.entrenado_con = 0
+        self._listas = None
+
+    def __len__(self):
+        return self.vectores.shape[0]
+
+    # --- Entrenamiento ---
+
+    def _entrenar(self, vectores):
+        """k-means (Lloyd) sobre una muestra de la galería"""
+        rng = np.random.default_rng(self.semilla)
+        n = vectores.shape[0]
+        n_listas = self.n_listas or max(1, int(np.sqrt(n)))
+        n_listas = min(n_listas, n)
+
+        if n > self.max_entrenamiento:
+            muestra = vectores[rng.choice(n, self.max_entrenamiento, replace=False)]
+        else:
+            muestra = vectores
+
+        centroides = muestra[rng.choice(muestra.shape[0], n_listas, replace=False)].copy()
+        for _ in range(self.iteraciones):
+            etiquetas = np.argmin(distancias_euclidianas(muestra, centroides), axis=1)
+            conteos = np.bincount(etiquetas, minlength=n_listas)
+            sumas = np.zeros_like(centroides)
+            np.add.at(sumas, etiquetas, muestra)
+            vacias = conteos == 0
+            centroides[~vacias] = sumas[~vacias] / conteos[~vacias, np.newaxis]
+            # Las particiones vacías se reinician en un punto aleatorio de la muestra
+            if vacias.any():
+                centroides[vacias] = muestra[rng.choice(muestra.shape[0], int(vacias.sum()), replace=False)]
+
+        self.centroides = np.ascontiguousarray(centroides, dtype=np.float32)
+        self.entrenado_con = n
+
+    def _asignar(self, vectores):
+        if len(vectores) == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.argmin(distancias_euclidianas(vectores, self.centroides), axis=1).astype(np.int32)
+
+    def _invalidar_listas(self):
+        self._listas = None
+
+    def _obtener_listas(self):
+        """Listas invertidas en formato CSR: posiciones ordenadas por partición"""
+        if self._listas is None:
+            orden = np.argsort(self.asignaciones, kind='stable')
+            limites = np.searchsorted(self.asignaciones[orden], np.arange(len(self.centroides) + 1))
+            self._listas = (orden, limites)
+        return self._listas
+
+    # --- Interfaz común ---
+
+    def construir(self, vectores, claves):
+        self.vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        self.normas = np.einsum('ij,ij->i', self.vectores, self.vectores)
+        self.claves = np.asarray(claves, dtype=np.int64)
+        if len(self.vectores) == 0:
+            self.centroides = None
+            self.asignaciones = np.empty(0, dtype=np.int32)
+        else:
+            self._entrenar(self.vectores)
+            self.asignaciones = self._asignar(self.vectores)
+        self._invalidar_listas()
+        return self
+
+    def agregar(self, vectores, claves):
+        """Agregar vectores sin reentrenar: se asignan a la partición más cercana"""
+        vectores = np.atleast_2d(np.asarray(vectores, dtype=np.float32))
+        if self.centroides is None:
+            return self.construir(vectores, claves)
+        self.vectores = np.vstack([self.vectores, vectores])
+        self.normas = np.concatenate([self.normas, np.einsum('ij,ij->i', vectores, vectores)])
+        self.claves = np.concatenate([self.claves, np.asarray(claves, dtype=np.int64)])
+        self.asignaciones = np.concatenate([self.asignaciones, self._asignar(vectores)])
+        self._invalidar_listas()
+
+    def buscar(self, consultas, k):
+        """Retorna (distancias, posiciones) de forma (consultas, k), ordenadas"""
+        consultas = np.asarray(consultas, dtype=np.float32)
+        if consultas.ndim == 1:
+            consultas = consultas[np.newaxis, :]
+        distancias_k = np.full((consultas.shape[0], k), np.inf, dtype=np.float32)
+        posiciones_k = np.full((consultas.shape[0], k), -1, dtype=np.intp)
+        if len(self) == 0:
+            return distancias_k, posiciones_k
+
+        orden, limites = self._obtener_listas()
+        n_sondeos = min(self.n_sondeos, len(self.centroides))
+        dist_centroides = distancias_euclidianas(consultas, self.centroides)
+        sondeos = np.argpartition(dist_centroides, n_sondeos - 1, axis=1)[:, :n_sondeos]
+
+        for fila, listas in enumerate(sondeos):
+            candidatos = np.concatenate([orden[limites[l]:limites[l + 1]] for l in listas])
+            if len(candidatos) == 0:
+                continue
+            dist = distancias_euclidianas(consultas[fila], self.vectores[candidatos], self.normas[candidatos])
+            dist_fila, pos_fila = _top_k_filas(dist, k)
+            validas = pos_fila[0] >= 0
+            distancias_k[fila, validas] = dist_fila[0, validas]
+            posiciones_k[fila, validas] = candidatos[pos_fila[0, validas]]
+        return distancias_k, posiciones_k
+
+    # --- Persistencia ---
+
+    def guardar(self, ruta):
+        """Guardar centroides y asignaciones (por clave) junto a la base de datos"""
+        if self.centroides is None:
+            return
+        ruta_temporal = ruta + '.tmp.npz'
+        np.savez(ruta_temporal, centroides=self.centroides, claves=self.claves,
+                 asignaciones=self.asignaciones, entrenado_con=np.int64(self.entrenado_con))
+        os.replace(ruta_temporal, ruta)
+
+    def sincronizar(self, ruta, vectores, claves):
+        """Reutilizar el índice persistido y asignar solo los vectores nuevos
+
+        Las claves conocidas conservan su partición, las nuevas se asignan al
+        centroide más cercano y las que ya no existen se descartan. Solo se
+        reentrena si no hay índice guardado o si la galería creció al doble.
+        """
+        vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        claves = np.asarray(claves, dtype=np.int64)
+
+        if not os.path.exists(ruta) or len(vectores) == 0:
+            self.construir(vectores, claves)
+            self.guardar(ruta)
+            return self
+
+        with np.load(ruta) as datos:
+            entrenado_con = int(datos['entrenado_con'])
+            centroides = datos['centroides']
+            claves_guardadas = datos['claves']
+            asignaciones_guardadas = datos['asignaciones']
+        if len(vectores) > 2 * max(entrenado_con, 1) or centroides.shape[1] != vectores.shape[1]:
+            self.construir(vectores, claves)
+            self.guardar(ruta)
+            return self
+
+        self.centroides = centroides
+        self.entrenado_con = entrenado_con
+        self.vectores = vectores
+        self.normas = np.einsum('ij,ij->i', vectores, vectores)
+        self.claves = claves
+
+        if len(claves_guardadas) > 0:
+            orden = np.argsort(claves_guardadas)
+            ordenadas = claves_guardadas[orden]
+            pos = np.clip(np.searchsorted(ordenadas, claves), 0, len(ordenadas) - 1)
+            conocidas = ordenadas[pos] == claves
+        else:
+            orden = pos = np.zeros(len(claves), dtype=np.intp)
+            conocidas = np.zeros(len(claves), dtype=bool)
+
+        self.asignaciones = np.empty(len(claves), dtype=np.int32)
+        self.asignaciones[conocidas] = asignaciones_guardadas[orden][pos[conocidas]]
+        self.asignaciones[~conocidas] = self._asignar(vectores[~conocidas])
+        self._invalidar_listas()
+
+        if not conocidas.all() or len(claves_guardadas) != len(claves):
+            self.guardar(ruta)
+        return self
+
+    @staticmethod
+    def agregar_a_persistido(ruta, claves, vectores):
+        """Asignar vectores nuevos a un índice guardado sin cargar la galería completa"""
+        if not os.path.exists(ruta):
+            return False
+        with np.load(ruta) as datos:
+            centroides = datos['centroides']
+            claves_guardadas = datos['claves']
+            asignaciones_guardadas = datos['asignaciones']
+            entrenado_con = datos['entrenado_con']
+        vectores = np.asarray(vectores, dtype=np.float32).reshape(-1, centroides.shape[1])
+        nuevas = np.argmin(distancias_euclidianas(vectores, centroides), axis=1).astype(np.int32)
+        ruta_temporal = ruta + '.tmp.npz'
+        np.savez(ruta_temporal, centroides=centroides,
+                 claves=np.concatenate([claves_guardadas, np.asarray(claves, dtype=np.int64)]),
+                 asignaciones=np.concatenate([asignaciones_guardadas, nuevas]),
+                 entrenado_con=entrenado_con)
+        os.replace(ruta_temporal, ruta)
+        return True
+
+
+BACKENDS = {
+    'fuerza_bruta': IndiceFuerzaBruta,
+    'ivf': IndiceIVF,
+}
+
+# A partir de este tamaño el modo 'auto' usa el índice aproximado
+UMBRAL_AUTO_IVF = 20000
+
+
+def crear_indice(backend='auto', num_vectores=0, **kwargs):
+    """Crear el backend de índice solicitado"""
+    if backend == 'auto':
+        backend = 'ivf' if num_vectores >= UMBRAL_AUTO_IVF else 'fuerza_bruta'
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de índice no válido: {backend}")
+    return BACKENDS[backend](**kwargs)
+
+
+def ruta_indice(db_path, modo):
+    """Archivo del índice persistido junto a la base de datos"""
+    base, _ = os.path.splitext(db_path)
+    return f"{base}.indice_{modo}.npz"
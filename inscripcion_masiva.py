@@ -0,0 +1,223 @@
+# inscripcion_masiva.py
+"""Inscripción masiva de estudiantes desde carpetas de imágenes o un manifiesto CSV
+
+Carpetas: RAIZ/[seccion/]CODIGO_Nombre_Apellido/*.jpg
+CSV:      codigo,nombre,apellido,seccion,imagenes  (rutas separadas por ';', relativas al CSV)
+
+Las imágenes se codifican en un pool de procesos y los resultados se escriben
+en lotes, cada uno en una sola transacción. Cada imagen queda registrada (en
+encodings_faciales o en imagenes_descartadas), así que si el proceso se
+interrumpe, al volver a ejecutarlo se continúa desde donde quedó.
+
+Uso: python inscripcion_masiva.py RUTA [--procesos N] [--lote 500] [--detector hog|haar|dnn] [--db asistencias.db]
+"""
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from detectores import DETECTORES
+from formato_encodings import codificar
+from indices_galeria import IndiceIVF, ruta_indice
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def leer_carpetas(raiz):
+    """Un estudiante por carpeta CODIGO_Nombre_Apellido; la carpeta padre (si no es la raíz) es la sección"""
+    estudiantes = []
+    for carpeta, _, archivos in sorted(os.walk(raiz)):
+        imagenes = sorted(os.path.abspath(os.path.join(carpeta, a)) for a in archivos
+                          if a.lower().endswith(EXTENSIONES))
+        if not imagenes:
+            continue
+        partes = os.path.basename(carpeta).split('_')
+        if len(partes) < 3:
+            print(f"⚠️ Carpeta ignorada (se espera CODIGO_Nombre_Apellido): {carpeta}")
+            continue
+        padre = os.path.dirname(os.path.abspath(carpeta))
+        seccion = os.path.basename(padre) if padre != os.path.abspath(raiz) else None
+        estudiantes.append({
+            'codigo': partes[0],
+            'nombre': partes[1],
+            'apellido': ' '.join(partes[2:]),
+            'seccion': seccion,
+            'imagenes': imagenes,
+        })
+    return estudiantes
+
+
+def leer_manifiesto(ruta_csv):
+    """Estudiantes desde un CSV con columnas codigo, nombre, apellido, seccion, imagenes"""
+    base = os.path.dirname(os.path.abspath(ruta_csv))
+    estudiantes = []
+    with open(ruta_csv, newline='', encoding='utf-8') as archivo:
+        for fila in csv.DictReader(archivo):
+            imagenes = [os.path.abspath(os.path.join(base, r.strip()))
+                        for r in (fila.get('imagenes') or '').split(';') if r.strip()]
+            estudiantes.append({
+                'codigo': fila['codigo'].strip(),
+                'nombre': fila['nombre'].strip(),
+                'apellido': fila['apellido'].strip(),
+                'seccion': (fila.get('seccion') or '').strip() or None,
+                'imagenes': imagenes,
+            })
+    return estudiantes
+
+
+def _inicializar_trabajador():
+    import cv2
+    # Un hilo de OpenCV por proceso para no sobresuscribir los núcleos
+    cv2.setNumThreads(1)
+
+
+def _codificar_imagen(tarea):
+    """Proceso del pool: (ruta, detector, max_lado) -> (ruta, encoding o None, motivo de descarte)"""
+    import cv2
+    import face_recognition
+    from detectores import detector_compartido
+    from motor_procesos import codificar_recortes
+
+    ruta, detector, max_lado = tarea
+    try:
+        imagen = face_recognition.load_image_file(ruta)
+        # Las fotos de carnet suelen ser grandes: detectar sobre la imagen reducida y
+        # codificar el recorte del rostro en la original
+        escala = min(1.0, max_lado / max(imagen.shape[:2]))
+        reducida = imagen
+        if escala < 1.0:
+            reducida = cv2.resize(imagen, (0, 0), fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        ubicaciones = detector_compartido(detector).detectar(reducida)
+        if len(ubicaciones) == 0:
+            return ruta, None, 'sin rostro'
+        if len(ubicaciones) > 1:
+            return ruta, None, 'varios rostros'
+        ubicacion = tuple(int(c / escala) for c in ubicaciones[0])
+        return ruta, codificar_recortes(imagen, [ubicacion], bgr=False)[0], None
+    except Exception as e:
+        return ruta, None, f"ilegible: {e}"
+
+
+class InscripcionMasiva:
+    """Inscribe estudiantes y sus encodings en bloque (reanudable)"""
+
+    def __init__(self, db, num_procesos=None, tamano_lote=500, detector=None, max_lado=1024):
+        self.db = db
+        self.num_procesos = num_procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.tamano_lote = tamano_lote
+        self.detector = detector or db.detector_configurado()
+        self.max_lado = max_lado
+
+    def _asegurar_estudiantes(self, estudiantes):
+        """Crear los estudiantes que falten (por código) en una transacción; retorna {codigo: id}"""
+        hoy = datetime.now().date()
+        with self.db.transaccion() as cursor:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO estudiantes (codigo, nombre, apellido, seccion, fecha_registro)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(e['codigo'], e['nombre'], e['apellido'], e['seccion'], hoy) for e in estudiantes])
+            cursor.execute("SELECT codigo, id FROM estudiantes")
+            return dict(cursor.fetchall())
+
+    def _guardar_lote(self, resultados, estudiante_de_ruta):
+        """Escribir encodings y descartes de un lote en una sola transacción"""
+        hoy = datetime.now().date()
+        encoding_ids, vectores = [], []
+        with self.db.transaccion() as cursor:
+            for ruta, encoding, motivo in resultados:
+                if encoding is None:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO imagenes_descartadas (imagen_path, motivo, fecha) VALUES (?, ?, ?)",
+                        (ruta, motivo, hoy)
+                    )
+                    continue
+                cursor.execute('''
+                    INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path, fecha_creacion)
+                    VALUES (?, ?, ?, ?)
+                ''', (estudiante_de_ruta[ruta], codificar(encoding, self.db.formato_encoding), ruta, hoy))
+                encoding_ids.append(cursor.lastrowid)
+                vectores.append(encoding)
+        if vectores:
+            IndiceIVF.agregar_a_persistido(ruta_indice(self.db.db_path, 'min'), encoding_ids, vectores)
+
+    def inscribir(self, estudiantes):
+        """Procesar las imágenes pendientes de los estudiantes y retornar un resumen"""
+        ids_por_codigo = self._asegurar_estudiantes(estudiantes)
+        procesadas = self.db.imagenes_procesadas()
+
+        estudiante_de_ruta = {}
+        for estudiante in estudiantes:
+            for ruta in estudiante['imagenes']:
+                if ruta not in procesadas:
+                    estudiante_de_ruta[ruta] = ids_por_codigo[estudiante['codigo']]
+        total = len(estudiante_de_ruta)
+        print(f"📋 {len(estudiantes)} estudiantes | {total} imágenes pendientes "
+              f"({sum(len(e['imagenes']) for e in estudiantes) - total} ya procesadas)")
+
+        motivos = Counter()
+        inscritas = 0
+        hechas = 0
+        lote = []
+        inicio = time.perf_counter()
+        tareas = ((ruta, self.detector, self.max_lado) for ruta in estudiante_de_ruta)
+
+        contexto = mp.get_context("spawn")
+        with contexto.Pool(self.num_procesos, initializer=_inicializar_trabajador) as pool:
+            for resultado in pool.imap_unordered(_codificar_imagen, tareas, chunksize=4):
+                lote.append(resultado)
+                hechas += 1
+                if resultado[1] is None:
+                    motivos[resultado[2].split(':')[0]] += 1
+                else:
+                    inscritas += 1
+                if len(lote) >= self.tamano_lote:
+                    self._guardar_lote(lote, estudiante_de_ruta)
+                    lote = []
+                    transcurrido = time.perf_counter() - inicio
+                    print(f"📥 {hechas}/{total} imágenes ({hechas / transcurrido:.1f} img/s)")
+        if lote:
+            self._guardar_lote(lote, estudiante_de_ruta)
+
+        transcurrido = time.perf_counter() - inicio
+        if total:
+            self.db.actualizar_snapshot_galeria()
+
+        resumen = {
+            'imagenes': total,
+            'inscritas': inscritas,
+            'descartadas': dict(motivos),
+            'segundos': transcurrido,
+            'imagenes_por_segundo': total / transcurrido if transcurrido else 0.0,
+        }
+        print(f"✅ {inscritas} encodings inscritos, {sum(motivos.values())} imágenes descartadas "
+              f"{dict(motivos) if motivos else ''}")
+        print(f"⏱️ {transcurrido:.1f} s ({resumen['imagenes_por_segundo']:.1f} img/s con {self.num_procesos} procesos)")
+        return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('ruta', help='carpeta raíz o manifiesto .csv')
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--lote', type=int, default=500, help='imágenes por transacción')
+    parser.add_argument('--detector', choices=sorted(DETECTORES), default=None,
+                        help='por defecto el configurado en la base de datos')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    if args.ruta.lower().endswith('.csv'):
+        estudiantes = leer_manifiesto(args.ruta)
+    else:
+        estudiantes = leer_carpetas(args.ruta)
+
+    db = DatabaseManager(args.db)
+    InscripcionMasiva(db, args.procesos, args.lote, args.detector).inscribir(estudiantes)
+    db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# mantenimiento_galeria.py
+"""Depurar encodings_faciales: filas huérfanas y encodings casi duplicados por estudiante
+
+Huérfanos: filas cuyo estudiante no existe, incluidas las que quedaron con un id
+`temp_<ts>` cuando actualizar_encodings falló (solo las de más de --horas-temp
+horas, para no tocar una inscripción en curso).
+
+Duplicados: para cada estudiante se calculan todas las distancias entre sus
+encodings y se conservan como mucho K representantes, elegidos de forma voraz
+desde el medoide (k-centro): se agrega el encoding más alejado de los ya
+elegidos hasta que todos queden a menos de --umbral de alguno o se llegue a K.
+
+Uso: python mantenimiento_galeria.py [--db asistencias.db] [--max-por-estudiante 10]
+         [--umbral 0.15] [--horas-temp 24] [--aplicar] [--compactar]
+Sin --aplicar solo informa lo que se eliminaría y el ahorro estimado.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from galeria import GaleriaFacial, IndiceEstudiantes, distancias_euclidianas
+
+
+def buscar_huerfanos(db, horas_temp=24.0, ahora=None):
+    """[(encoding_id, estudiante_id, motivo)] de filas sin estudiante"""
+    ahora = time.time() if ahora is None else ahora
+    cursor = db.conexion().execute('''
+        SELECT e.id, e.estudiante_id
+        FROM encodings_faciales e
+        LEFT JOIN estudiantes est ON est.id = e.estudiante_id
+        WHERE est.id IS NULL
+        ORDER BY e.id
+    ''')
+    huerfanos = []
+    for encoding_id, estudiante_id in cursor.fetchall():
+        if isinstance(estudiante_id, str) and estudiante_id.startswith('temp_'):
+            try:
+                creado = float(estudiante_id[len('temp_'):])
+            except ValueError:
+                creado = 0.0
+            if ahora - creado < horas_temp * 3600:
+                continue  # inscripción posiblemente en curso
+            huerfanos.append((encoding_id, estudiante_id, 'temporal'))
+        else:
+            huerfanos.append((encoding_id, estudiante_id, 'sin estudiante'))
+    return huerfanos
+
+
+def representantes(matriz, max_k, umbral):
+    """Índices de hasta `max_k` filas que cubren al resto a menos de `umbral` (k-centro voraz)"""
+    if len(matriz) <= 1:
+        return list(range(len(matriz)))
+    distancias = distancias_euclidianas(matriz, matriz)
+    # El medoide (menor distancia total) es el encoding más típico del estudiante
+    elegidos = [int(np.argmin(distancias.sum(axis=1)))]
+    minimas = distancias[elegidos[0]].copy()
+    while len(elegidos) < max_k:
+        siguiente = int(np.argmax(minimas))
+        if minimas[siguiente] < umbral:
+            break
+        elegidos.append(siguiente)
+        np.minimum(minimas, distancias[siguiente], out=minimas)
+    return sorted(elegidos)
+
+
+def planificar_depuracion(encoding_ids, matriz, ids, max_por_estudiante=10, umbral=0.15):
+    """Encodings a eliminar por estudiante: (ids a eliminar, {estudiante: (antes, después)})"""
+    encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+    ids = np.asarray(ids)
+    orden = np.argsort(ids, kind='stable')
+    limites = np.flatnonzero(np.diff(ids[orden])) + 1
+
+    eliminar = []
+    por_estudiante = {}
+    for grupo in np.split(orden, limites):
+        if len(grupo) == 0:
+            continue
+        conservar = representantes(matriz[grupo], max_por_estudiante, umbral)
+        mascara = np.ones(len(grupo), dtype=bool)
+        mascara[conservar] = False
+        eliminar.extend(encoding_ids[grupo[mascara]].tolist())
+        por_estudiante[ids[grupo[0]].item()] = (len(grupo), len(conservar))
+    return eliminar, por_estudiante
+
+
+def medir_comparacion(matriz, nombres, ids, encoding_ids, consultas, repeticiones=5):
+    """Milisegundos por consulta de IndiceEstudiantes.comparar_lote sobre esta galería"""
+    indice = IndiceEstudiantes(GaleriaFacial(matriz, nombres, ids, encoding_ids), 'min')
+    indice.comparar_lote(consultas[:1])
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        indice.comparar_lote(consultas)
+    return 1000 * (time.perf_counter() - inicio) / (repeticiones * len(consultas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--max-por-estudiante', type=int, default=10)
+    parser.add_argument('--umbral', type=float, default=0.15,
+                        help='distancia bajo la cual dos encodings del mismo estudiante son casi duplicados')
+    parser.add_argument('--horas-temp', type=float, default=24.0,
+                        help='antigüedad mínima de los encodings temp_ huérfanos a eliminar')
+    parser.add_argument('--aplicar', action='store_true', help='eliminar (por defecto solo informa)')
+    parser.add_argument('--compactar', action='store_true', help='VACUUM después de eliminar')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager(args.db)
+
+    huerfanos = buscar_huerfanos(db, args.horas_temp)
+    temporales = sum(1 for _, _, motivo in huerfanos if motivo == 'temporal')
+    print(f"🧹 Huérfanos: {len(huerfanos)} ({temporales} temp_, {len(huerfanos) - temporales} sin estudiante)")
+
+    encoding_ids, matriz, nombres, ids = db.cargar_galeria()
+    duplicados, por_estudiante = planificar_depuracion(encoding_ids, matriz, ids, args.max_por_estudiante,
+                                                       args.umbral)
+    reducidos = sorted(((antes - despues, e) for e, (antes, despues) in por_estudiante.items() if antes > despues),
+                       reverse=True)
+    print(f"🧹 Casi duplicados o sobre el máximo: {len(duplicados)} encodings de {len(reducidos)} estudiantes")
+    nombre_de = dict(zip(ids, nombres))
+    for _, estudiante in reducidos[:10]:
+        antes, despues = por_estudiante[estudiante]
+        print(f"   {nombre_de[estudiante]}: {antes} -> {despues}")
+
+    if len(matriz):
+        rng = np.random.default_rng(0)
+        consultas = matriz[rng.choice(len(matriz), min(64, len(matriz)), replace=False)]
+        consultas = consultas + rng.normal(0, 0.02, consultas.shape).astype(np.float32)
+        conservar = ~np.isin(encoding_ids, duplicados)
+        antes_ms = medir_comparacion(matriz, nombres, ids, encoding_ids, consultas)
+        despues_ms = medir_comparacion(matriz[conservar], [n for n, c in zip(nombres, conservar) if c],
+                                       np.asarray(ids)[conservar], np.asarray(encoding_ids)[conservar], consultas)
+        print(f"📊 Galería: {len(matriz)} -> {int(conservar.sum())} encodings "
+              f"({matriz.nbytes / 1e6:.1f} -> {matriz[conservar].nbytes / 1e6:.1f} MB)")
+        print(f"⏱️ Comparación: {antes_ms:.3f} -> {despues_ms:.3f} ms por rostro "
+              f"({100 * (1 - despues_ms / antes_ms) if antes_ms else 0:.0f}% menos)")
+
+    if args.aplicar:
+        eliminados = db.eliminar_encodings([e for e, _, _ in huerfanos] + duplicados, args.compactar)
+        print(f"✅ {eliminados} encodings eliminados")
+    else:
+        print("ℹ️ Sin cambios: usa --aplicar para eliminar")
+    db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# motor_procesos.py
+import multiprocessing as mp
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+# Lado (px) al que se normaliza cada rostro antes de codificarlo: el chip alineado de dlib mide 150
+TAMANO_ROSTRO = 150
+
+
+def codificar_recortes(imagen, face_locations, margen=0.25, tamano=TAMANO_ROSTRO, bgr=True):
+    """Encodings de rostros recortados de la imagen a resolución nativa
+
+    Cada rostro se recorta con `margen` alrededor de su caja, se escala para que
+    mida `tamano` px y se centra en una celda fija; las celdas se unen en un
+    mosaico que se codifica con una sola llamada. Así la detección puede hacerse
+    sobre un frame reducido sin que el encoding pierda detalle.
+    """
+    import cv2
+    import face_recognition
+
+    if not face_locations:
+        return []
+    celda = int(round(tamano * (1 + 2 * margen)))
+    alto, ancho = imagen.shape[:2]
+    mosaico = np.zeros((celda, celda * len(face_locations), 3), dtype=np.uint8)
+    ubicaciones = []
+    for i, (top, right, bottom, left) in enumerate(face_locations):
+        lado = max(bottom - top, right - left, 1)
+        factor = tamano / lado
+        m = int(lado * margen)
+        t, r, b, l = max(0, top - m), min(ancho, right + m), min(alto, bottom + m), max(0, left - m)
+        if b <= t or r <= l:
+            # Caja fuera de la imagen: la celda queda vacía
+            ubicaciones.append((0, (i + 1) * celda, celda, i * celda))
+            continue
+        recorte = cv2.resize(imagen[t:b, l:r], (max(1, round((r - l) * factor)), max(1, round((b - t) * factor))),
+                             interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR)
+        # Desplazamiento que centra la caja del rostro en la celda (recortado en los bordes de la imagen)
+        y = int(round(celda / 2 - ((top + bottom) / 2 - t) * factor))
+        x = int(round(celda / 2 - ((left + right) / 2 - l) * factor))
+        ys, xs = max(0, -y), max(0, -x)
+        parte = recorte[ys:ys + celda - max(0, y), xs:xs + celda - max(0, x)]
+        y0, x0 = max(0, y), i * celda + max(0, x)
+        mosaico[y0:y0 + parte.shape[0], x0:x0 + parte.shape[1]] = parte
+        ubicaciones.append((int(y + (top - t) * factor), int(i * celda + x + (right - l) * factor),
+                            int(y + (bottom - t) * factor), int(i * celda + x + (left - l) * factor)))
+    if bgr:
+        cv2.cvtColor(mosaico, cv2.COLOR_BGR2RGB, dst=mosaico)
+    return face_recognition.face_encodings(mosaico, ubicaciones)
+
+
+def detectar_y_codificar(frame, escala=0.5, detector="hog", omitir=None, upsample=1, regiones=None):
+    """Detección sobre el frame reducido y encodings sobre recortes a resolución nativa
+
+    Las ubicaciones se retornan en coordenadas del frame original. `regiones`
+    (top, right, bottom, left) limita la detección a esas zonas del frame
+    (None = frame completo, [] = nada). `detector` es un nombre de detectores.py
+    o una instancia. `omitir(face_locations)` puede devolver
+    una máscara de rostros que no hace falta codificar (p. ej. ya seguidos e
+    identificados); su encoding queda en None.
+    """
+    import cv2
+    from detectores import detector_compartido
+
+    detector = detector_compartido(detector)
+    if regiones is None:
+        regiones = [(0, frame.shape[1], frame.shape[0], 0)]
+
+    factor = 1.0 / escala
+    face_locations = []
+    for top, right, bottom, left in regiones:
+        recorte = frame[top:bottom, left:right]
+        alto, ancho = recorte.shape[:2]
+        # Regiones recortadas en el borde del frame: cv2.resize falla si quedan vacías
+        if alto <= 1 or ancho <= 1 or round(alto * escala) < 1 or round(ancho * escala) < 1:
+            continue
+        small_frame = cv2.resize(recorte, (0, 0), fx=escala, fy=escala)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        for loc in detector.detectar(rgb_small_frame, upsample):
+            t, r, b, l = (int(c * factor) for c in loc)
+            face_locations.append((t + top, r + left, b + top, l + left))
+
+    mascara = omitir(face_locations) if omitir is not None else [False] * len(face_locations)
+    pendientes = [k for k in range(len(face_locations)) if not mascara[k]]
+
+    face_encodings = [None] * len(face_locations)
+    calculados = codificar_recortes(frame, [face_locations[k] for k in pendientes])
+    for k, encoding in zip(pendientes, calculados):
+        face_encodings[k] = encoding
+    return face_locations, face_encodings
+
+
+def _trabajador(nombre_shm, bytes_por_ranura, cola_tareas, cola_resultados, detector):
+    """Proceso de reconocimiento: lee frames de la memoria compartida y devuelve encodings
+
+    Cada tarea es ('detectar', escala, upsample, regiones, codificar) o
+    ('codificar', face_locations) sobre el frame que ya está en la ranura.
+    """
+    import cv2
+    from multiprocessing import shared_memory
+
+    # Cada proceso usa un solo hilo de OpenCV para no sobresuscribir los núcleos
+    cv2.setNumThreads(1)
+    shm = shared_memory.SharedMemory(name=nombre_shm)
+    buffer = np.ndarray((shm.size,), dtype=np.uint8, buffer=shm.buf)
+
+    try:
+        while True:
+            tarea = cola_tareas.get()
+            if tarea is None:
+                break
+            secuencia, ranura, forma, liberar, trabajo = tarea
+            try:
+                inicio = ranura * bytes_por_ranura
+                frame = buffer[inicio:inicio + int(np.prod(forma))].reshape(forma)
+                if trabajo[0] == 'detectar':
+                    _, escala, upsample, regiones, codificar = trabajo
+                    # Sin codificar: el proceso principal decide después qué rostros codificar
+                    omitir = None if codificar else (lambda ubicaciones: [True] * len(ubicaciones))
+                    face_locations, face_encodings = detectar_y_codificar(
+                        frame, escala, detector, omitir=omitir, upsample=upsample, regiones=regiones)
+                else:
+                    face_locations = trabajo[1]
+                    face_encodings = codificar_recortes(frame, face_locations)
+                cola_resultados.put((secuencia, ranura, liberar, face_locations, face_encodings, None))
+            except Exception as e:
+                cola_resultados.put((secuencia, ranura, liberar, [], [], str(e)))
+    finally:
+        del buffer
+        shm.close()
+
+
+class MotorReconocimientoProcesos:
+    """Pool de procesos para detección y encoding facial
+
+    Los frames se copian a ranuras de un bloque de memoria compartida (no se
+    serializan los ndarray); por las colas solo viajan índices, parámetros y los
+    resultados, que son pequeños. Los resultados se reordenan por número de secuencia.
+    """
+
+    def __init__(self, num_procesos=None, forma_maxima=(480, 640, 3), num_ranuras=None, escala=0.5, detector="hog"):
+        from multiprocessing import shared_memory
+
+        self.num_procesos = num_procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.num_ranuras = num_ranuras or 2 * self.num_procesos
+        self.bytes_por_ranura = int(np.prod(forma_maxima))
+        self.escala = escala
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.bytes_por_ranura * self.num_ranuras)
+        self._buffer = np.ndarray((self._shm.size,), dtype=np.uint8, buffer=self._shm.buf)
+
+        contexto = mp.get_context("spawn")
+        self._cola_tareas = contexto.Queue()
+        self._cola_resultados = contexto.Queue()
+        self._procesos = [
+            contexto.Process(
+                target=_trabajador,
+                args=(self._shm.name, self.bytes_por_ranura, self._cola_tareas,
+                      self._cola_resultados, detector),
+                name=f"reconocimiento-{i}",
+                daemon=True,
+            )
+            for i in range(self.num_procesos)
+        ]
+        for proceso in self._procesos:
+            proceso.start()
+
+        self._ranuras_libres = queue.Queue()
+        for ranura in range(self.num_ranuras):
+            self._ranuras_libres.put(ranura)
+
+        self._lock = threading.Lock()
+        self._secuencia = 0
+        self._pendientes = {}
+        self._cerrado = False
+        self._hilo_resultados = threading.Thread(target=self._recibir_resultados, name="resultados-motor", daemon=True)
+        self._hilo_resultados.start()
+
+    def _recibir_resultados(self):
+        while True:
+            item = self._cola_resultados.get()
+            if item is None:
+                break
+            secuencia, ranura, liberar, face_locations, face_encodings, error = item
+            if liberar:
+                self._ranuras_libres.put(ranura)
+            if error:
+                print(f"⚠️ Error en proceso de reconocimiento: {error}")
+            with self._lock:
+                evento, resultado = self._pendientes[secuencia]
+            resultado.extend([face_locations, face_encodings])
+            evento.set()
+
+    def _copiar(self, frame):
+        """Copiar el frame a una ranura libre; retorna (ranura, forma)"""
+        if self._cerrado:
+            raise RuntimeError("El motor de reconocimiento está cerrado")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.bytes_por_ranura:
+            raise ValueError(f"Frame de {frame.shape} excede el tamaño de ranura")
+
+        # Bloquea si todas las ranuras están ocupadas (contrapresión)
+        ranura = self._ranuras_libres.get()
+        inicio = ranura * self.bytes_por_ranura
+        self._buffer[inicio:inicio + frame.nbytes] = frame.reshape(-1)
+        return ranura, frame.shape
+
+    def _encolar(self, ranura, forma, trabajo, liberar=True):
+        """Encolar un trabajo sobre el frame de la ranura; `liberar` la devuelve al terminar"""
+        with self._lock:
+            self._secuencia += 1
+            secuencia = self._secuencia
+            self._pendientes[secuencia] = (threading.Event(), [])
+        self._cola_tareas.put((secuencia, ranura, forma, liberar, trabajo))
+        return secuencia
+
+    def enviar(self, frame, escala=None, upsample=1, regiones=None):
+        """Copiar el frame a una ranura libre y encolar su procesamiento; retorna la secuencia"""
+        ranura, forma = self._copiar(frame)
+        return self._encolar(ranura, forma, ('detectar', escala or self.escala, upsample, regiones, True))
+
+    def obtener(self, secuencia, timeout=None):
+        """Esperar el resultado (face_locations, face_encodings) de una secuencia"""
+        with self._lock:
+            evento, resultado = self._pendientes[secuencia]
+        esperado = 0.0
+        while not evento.wait(0.5):
+            esperado += 0.5
+            if not any(proceso.is_alive() for proceso in self._procesos):
+                raise RuntimeError("Los procesos de reconocimiento terminaron inesperadamente")
+            if timeout is not None and esperado >= timeout:
+                raise TimeoutError(f"Sin resultado para la secuencia {secuencia}")
+        with self._lock:
+            del self._pendientes[secuencia]
+        return resultado[0], resultado[1]
+
+    def detectar_y_codificar(self, frame, escala=None, upsample=1, regiones=None, omitir=None):
+        """Llamada bloqueante con los mismos parámetros que detectar_y_codificar de este módulo
+
+        Es segura para varios hilos: cada hilo del pipeline espera solo su frame.
+        `omitir` se evalúa en este proceso (p. ej. con el seguidor de rostros), así
+        que en ese caso la detección y los encodings van en dos pasos sobre la
+        misma ranura.
+        """
+        if omitir is None:
+            return self.obtener(self.enviar(frame, escala, upsample, regiones))
+
+        ranura, forma = self._copiar(frame)
+        liberada = False
+        try:
+            face_locations, _ = self.obtener(self._encolar(
+                ranura, forma, ('detectar', escala or self.escala, upsample, regiones, False), liberar=False))
+            mascara = omitir(face_locations)
+            pendientes = [k for k in range(len(face_locations)) if not mascara[k]]
+            calculados = []
+            if pendientes:
+                liberada = True
+                _, calculados = self.obtener(self._encolar(
+                    ranura, forma, ('codificar', [face_locations[k] for k in pendientes])))
+        finally:
+            if not liberada:
+                self._ranuras_libres.put(ranura)
+
+        face_encodings = [None] * len(face_locations)
+        for k, encoding in zip(pendientes, calculados):
+            face_encodings[k] = encoding
+        return face_locations, face_encodings
+
+    def procesar_frames(self, frames):
+        """Procesar un iterable de frames (lotes offline) y devolver resultados en orden"""
+        en_vuelo = []
+        for frame in frames:
+            # Mantener ocupadas todas las ranuras sin bloquear el envío en orden
+            if len(en_vuelo) >= self.num_ranuras:
+                yield self.obtener(en_vuelo.pop(0))
+            en_vuelo.append(self.enviar(frame))
+        for secuencia in en_vuelo:
+            yield self.obtener(secuencia)
+
+    def cerrar(self):
+        """Detener los procesos y liberar la memoria compartida"""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        for _ in self._procesos:
+            self._cola_tareas.put(None)
+        for proceso in self._procesos:
+            proceso.join(timeout=5)
+            if proceso.is_alive():
+                proceso.terminate()
+        self._cola_resultados.put(None)
+        self._hilo_resultados.join(timeout=2)
+        del self._buffer
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
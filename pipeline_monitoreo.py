@@ -0,0 +1,344 @@
+# pipeline_monitoreo.py
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from camara_utils import CamaraManager
+
+
+class EstadisticasEtapa:
+    """Contador de latencia de una etapa del pipeline (thread-safe)"""
+
+    def __init__(self, nombre, ventana=300):
+        self.nombre = nombre
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.recientes = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._lock:
+            self.cantidad += 1
+            self.total += segundos
+            self.maximo = max(self.maximo, segundos)
+            self.recientes.append(segundos)
+
+    def reciente_ms(self):
+        """Latencia media de la ventana reciente, en milisegundos"""
+        with self._lock:
+            if not self.recientes:
+                return 0.0
+            return 1000 * sum(self.recientes) / len(self.recientes)
+
+    def resumen(self):
+        with self._lock:
+            recientes = sorted(self.recientes)
+            return {
+                'etapa': self.nombre,
+                'cantidad': self.cantidad,
+                'media_ms': 1000 * self.total / self.cantidad if self.cantidad else 0.0,
+                'p95_ms': 1000 * recientes[int(0.95 * (len(recientes) - 1))] if recientes else 0.0,
+                'max_ms': 1000 * self.maximo,
+            }
+
+
+class ColaDescartaAntiguos:
+    """Cola acotada: si está llena, el elemento más antiguo se descarta (y se pasa a `al_descartar`)"""
+
+    def __init__(self, capacidad, al_descartar=None):
+        self._items = deque(maxlen=capacidad)
+        self.al_descartar = al_descartar
+        self._condicion = threading.Condition()
+        self.descartados = 0
+        self.cerrada = False
+
+    def poner(self, item):
+        with self._condicion:
+            if len(self._items) == self._items.maxlen:
+                self.descartados += 1
+                if self.al_descartar is not None:
+                    self.al_descartar(self._items[0])
+            self._items.append(item)
+            self._condicion.notify()
+
+    def tomar(self, timeout=None):
+        """Devuelve el elemento más antiguo, o None si se cerró o venció el timeout"""
+        with self._condicion:
+            if not self._items and not self.cerrada:
+                self._condicion.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def profundidad(self):
+        with self._condicion:
+            return len(self._items)
+
+    def cerrar(self):
+        with self._condicion:
+            self.cerrada = True
+            self._condicion.notify_all()
+
+
+class PipelineMonitoreo:
+    """Pipeline por etapas: captura -> detección/encoding (pool) -> identificación -> render
+
+    - El hilo de captura conserva solo el último frame para mostrar y alimenta una
+      cola acotada de inferencia que descarta los frames más antiguos.
+    - Los trabajadores ejecutan la etapa pesada (detección y encodings) en paralelo;
+      la identificación (galería, asistencias, suavizado) se serializa con un lock.
+    - El render dibuja siempre el resultado más reciente sobre el frame más reciente.
+    """
+
+    def __init__(self, sistema, fuente=0, num_trabajadores=2, capacidad_cola=2, respetar_fps_archivo=True):
+        self.sistema = sistema
+        self.camara = fuente if isinstance(fuente, CamaraManager) else CamaraManager(fuente)
+        # Frames retenidos a la vez: cola, uno por trabajador, el último (render) y el que se captura
+        self.camara.num_buffers = max(self.camara.num_buffers, capacidad_cola + num_trabajadores + 2)
+        self.num_trabajadores = num_trabajadores
+        # El paso de frames se calcula con la capacidad total de los trabajadores
+        sistema.controlador.trabajadores = num_trabajadores
+        self.respetar_fps_archivo = respetar_fps_archivo
+
+        # Los frames son vistas del anillo de la cámara: se retienen mientras están en la cola
+        self.cola_inferencia = ColaDescartaAntiguos(capacidad_cola, al_descartar=lambda item: self.camara.liberar(item[2]))
+        self.estadisticas = {
+            nombre: EstadisticasEtapa(nombre)
+            for nombre in ('captura', 'deteccion', 'identificacion', 'render', 'extremo_a_extremo')
+        }
+
+        self._detener = threading.Event()
+        self._lock_identificacion = threading.Lock()
+        self._lock_frame = threading.Lock()
+        self._lock_resultado = threading.Lock()
+        self._ultimo_frame = None
+        self._secuencia_frame = 0
+        self._resultado = ((), (), (), ())
+        self._secuencia_resultado = -1
+        self.fin_de_fuente = threading.Event()
+        self.frames_capturados = 0
+        self.frames_procesados = 0
+        self.errores_trabajadores = 0
+        self._hilos = []
+        self._inicio = None
+        self._fin = None
+
+    # --- Etapas ---
+
+    def _bucle_captura(self):
+        intervalo = 0.0
+        if self.camara.es_archivo and self.respetar_fps_archivo:
+            fps = self.camara.fps_fuente()
+            intervalo = 1.0 / fps if fps > 0 else 0.0
+
+        siguiente = time.perf_counter()
+        while not self._detener.is_set():
+            inicio = time.perf_counter()
+            frame, success = self.camara.capturar_frame()
+            if not success:
+                self.fin_de_fuente.set()
+                break
+            self.estadisticas['captura'].registrar(time.perf_counter() - inicio)
+
+            with self._lock_frame:
+                self._secuencia_frame += 1
+                secuencia = self._secuencia_frame
+                self.camara.retener(frame)
+                if self._ultimo_frame is not None:
+                    self.camara.liberar(self._ultimo_frame)
+                self._ultimo_frame = frame
+            self.frames_capturados += 1
+
+            # Paso de frames (controlador adaptativo, 'f' lo fija) y compuerta de movimiento
+            regiones = self.sistema.preparar_frame(secuencia, frame)
+            if regiones is not None:
+                self.camara.retener(frame)
+                self.cola_inferencia.poner((secuencia, time.perf_counter(), frame, regiones))
+
+            if intervalo:
+                siguiente += intervalo
+                espera = siguiente - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    siguiente = time.perf_counter()
+
+        self.cola_inferencia.cerrar()
+
+    def _bucle_trabajador(self):
+        while not self._detener.is_set():
+            item = self.cola_inferencia.tomar(timeout=0.1)
+            if item is None:
+                if self.cola_inferencia.cerrada:
+                    break
+                continue
+            secuencia, capturado_en, frame, regiones = item
+
+            try:
+                inicio = time.perf_counter()
+                try:
+                    face_locations, face_encodings = self.sistema.detectar_y_codificar(frame, regiones)
+                finally:
+                    self.camara.liberar(frame)
+                self.estadisticas['deteccion'].registrar(time.perf_counter() - inicio)
+
+                inicio = time.perf_counter()
+                with self._lock_identificacion:
+                    resultado = self.sistema.identificar_rostros(face_locations, face_encodings)
+                self.estadisticas['identificacion'].registrar(time.perf_counter() - inicio)
+            except Exception as e:
+                # Un frame con error (cv2, dlib, sqlite) no debe terminar el hilo trabajador
+                with self._lock_resultado:
+                    self.errores_trabajadores += 1
+                    errores = self.errores_trabajadores
+                # Sin inundar la consola si el error se repite en cada frame
+                if errores <= 5 or errores % 100 == 0:
+                    print(f"❌ Error procesando el frame {secuencia} ({errores} en total): {e!r}")
+                continue
+
+            with self._lock_resultado:
+                # Los trabajadores pueden terminar fuera de orden: nunca retroceder
+                if secuencia > self._secuencia_resultado:
+                    self._secuencia_resultado = secuencia
+                    self._resultado = resultado
+                self.frames_procesados += 1
+            self.estadisticas['extremo_a_extremo'].registrar(time.perf_counter() - capturado_en)
+
+    # --- Control ---
+
+    def iniciar(self):
+        if not self.camara.inicializar_camara():
+            return False
+        self._detener.clear()
+        self._inicio = time.perf_counter()
+        self._hilos = [threading.Thread(target=self._bucle_captura, name="captura", daemon=True)]
+        self._hilos += [
+            threading.Thread(target=self._bucle_trabajador, name=f"inferencia-{i}", daemon=True)
+            for i in range(self.num_trabajadores)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+        return True
+
+    def detener(self):
+        self._detener.set()
+        self.cola_inferencia.cerrar()
+        for hilo in self._hilos:
+            hilo.join(timeout=2)
+        self._hilos = []
+        self._fin = time.perf_counter()
+        self.camara.liberar_camara(cerrar_ventanas=False)
+
+    def _trabajadores_activos(self):
+        return any(hilo.is_alive() for hilo in self._hilos if hilo.name.startswith("inferencia"))
+
+    def ultimo_frame(self):
+        """(secuencia, frame) más reciente; el frame queda retenido hasta `camara.liberar`"""
+        with self._lock_frame:
+            if self._ultimo_frame is not None:
+                self.camara.retener(self._ultimo_frame)
+            return self._secuencia_frame, self._ultimo_frame
+
+    def ultimo_resultado(self):
+        with self._lock_resultado:
+            return self._resultado
+
+    def resumen(self):
+        """Métricas por etapa más profundidad y descartes de la cola"""
+        duracion = ((self._fin or time.perf_counter()) - self._inicio) if self._inicio else 0.0
+        return {
+            'duracion_s': duracion,
+            'fps_procesados': self.frames_procesados / duracion if duracion else 0.0,
+            'etapas': [e.resumen() for e in self.estadisticas.values()],
+            'frames_capturados': self.frames_capturados,
+            'frames_procesados': self.frames_procesados,
+            'descartados_cola': self.cola_inferencia.descartados,
+            'errores_trabajadores': self.errores_trabajadores,
+            'profundidad_cola': self.cola_inferencia.profundidad(),
+            'controlador': self.sistema.controlador.metricas(),
+            'compuerta': self.sistema.compuerta.metricas(),
+        }
+
+    def imprimir_resumen(self):
+        resumen = self.resumen()
+        print("\n📊 LATENCIA POR ETAPA")
+        print(f"{'Etapa':<18} {'N':>7} {'media ms':>10} {'p95 ms':>10} {'máx ms':>10}")
+        for etapa in resumen['etapas']:
+            print(f"{etapa['etapa']:<18} {etapa['cantidad']:>7} {etapa['media_ms']:>10.1f} "
+                  f"{etapa['p95_ms']:>10.1f} {etapa['max_ms']:>10.1f}")
+        print(f"Frames capturados: {resumen['frames_capturados']} | procesados: {resumen['frames_procesados']} "
+              f"| descartados: {resumen['descartados_cola']} | errores: {resumen['errores_trabajadores']} "
+              f"| {resumen['fps_procesados']:.1f} FPS procesados")
+        controlador = resumen['controlador']
+        compuerta = resumen['compuerta']
+        print(f"🎛️ Controlador: paso {controlador['paso']} | escala {controlador['escala']} | "
+              f"upsample {controlador['upsample']} | sin movimiento: {compuerta['sin_cambios']}/"
+              f"{compuerta['evaluados']} | área detectada: {100 * compuerta['fraccion_area_media']:.0f}%")
+        for hora, motivo, paso, escala, upsample in controlador['decisiones'][-3:]:
+            print(f"   {hora} {motivo} -> paso {paso}, escala {escala}, upsample {upsample}")
+
+    def ejecutar(self, mostrar=True, max_segundos=None, ventana='Sistema de Asistencias - Reconocimiento Facial MEJORADO'):
+        """Bucle de render en el hilo principal; retorna el resumen de métricas
+
+        Lanza RuntimeError si todos los trabajadores terminaron antes que la fuente.
+        """
+        if not self.iniciar():
+            print("❌ No se puede acceder a la cámara")
+            return None
+
+        inicio_total = time.perf_counter()
+        ultima_secuencia = 0
+        sin_trabajadores = False
+        try:
+            while not self._detener.is_set():
+                if not self._trabajadores_activos():
+                    # Con la fuente agotada es el final normal; si no, nadie procesa los frames
+                    sin_trabajadores = not self.fin_de_fuente.is_set()
+                    break
+                if max_segundos and time.perf_counter() - inicio_total > max_segundos:
+                    break
+
+                secuencia, frame = self.ultimo_frame()
+                if frame is None or secuencia == ultima_secuencia or not mostrar:
+                    if frame is not None:
+                        self.camara.liberar(frame)
+                    ultima_secuencia = secuencia
+                    time.sleep(0.002)
+                    continue
+                ultima_secuencia = secuencia
+
+                inicio = time.perf_counter()
+                face_locations, face_names, face_ids, confianzas = self.ultimo_resultado()
+                # Dibujar sobre el lienzo reutilizado: el frame es de solo lectura y puede estar en la cola
+                lienzo = self.camara.lienzo(frame)
+                self.camara.liberar(frame)
+                lienzo = self.sistema.dibujar_resultados_mejorados(lienzo, face_locations, face_names, confianzas)
+                cv2.imshow(ventana, lienzo)
+                self.estadisticas['render'].registrar(time.perf_counter() - inicio)
+
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+                elif key == ord('r'):
+                    if not self.sistema.recargar_incremental():
+                        print("✅ Encodings ya actualizados")
+                elif key == ord('f'):
+                    controlador = self.sistema.controlador
+                    if controlador.activo:
+                        controlador.fijar()
+                    else:
+                        controlador.reanudar()
+                    print(f"✅ Ajuste automático: {'activo' if controlador.activo else 'fijo (paso 2, escala 0.5)'}")
+                elif key == ord('s'):
+                    self.imprimir_resumen()
+        finally:
+            self.detener()
+            if mostrar:
+                cv2.destroyAllWindows()
+
+        if sin_trabajadores:
+            raise RuntimeError("Todos los trabajadores de inferencia terminaron; monitoreo detenido")
+        return self.resumen()
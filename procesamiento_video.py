@@ -0,0 +1,236 @@
+# procesamiento_video.py
+"""Procesamiento offline de video grabado: asistencias con marca de tiempo del video
+
+Sin ventanas ni cámara: el video se divide por rangos de tiempo entre varios
+procesos, cada uno muestrea frames con un paso fijo (leyendo secuencialmente o
+saltando con seek) y reconoce los rostros con la misma lógica del monitor en
+vivo. Los eventos se combinan (primera aparición por estudiante) y se registran
+en asistencias bajo una fecha explícita.
+
+Uso: python procesamiento_video.py VIDEO --fecha 2024-03-15 [--hora-inicio 07:45:00]
+         [--paso 15] [--seek] [--procesos N] [--desde 0] [--hasta 600] [--detector hog|haar|dnn] [--sin-registrar]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+from datetime import datetime, timedelta
+
+import cv2
+
+from detectores import DETECTORES
+from snapshot_galeria import abrir_snapshot
+
+
+def propiedades_video(ruta):
+    """(fps, cantidad de frames) del video"""
+    cap = cv2.VideoCapture(ruta)
+    if not cap.isOpened():
+        raise ValueError(f"No se puede abrir el video: {ruta}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, total
+
+
+def _procesar_tramo(tarea):
+    """Proceso: reconocer los frames [inicio, fin) con el paso indicado; retorna (eventos, frames)"""
+    from galeria import GaleriaFacial, IndiceEstudiantes
+    from motor_procesos import detectar_y_codificar
+    from sistema_asistencias import clasificar_coincidencia
+
+    cv2.setNumThreads(1)
+    ruta_video, ruta_snapshot, inicio, fin, paso, con_seek, opciones = tarea
+
+    # Galería desde el snapshot mapeado: todos los procesos comparten las mismas páginas
+    snapshot = abrir_snapshot(ruta_snapshot)
+    if snapshot is None:
+        raise RuntimeError(f"Snapshot de la galería ausente o dañado: {ruta_snapshot}")
+    encoding_ids, encodings, nombres, ids, _ = snapshot
+    indice = IndiceEstudiantes(GaleriaFacial(encodings, nombres, ids, encoding_ids), opciones['modo_comparacion'],
+                               umbrales=opciones['umbrales'])
+
+    cap = cv2.VideoCapture(ruta_video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+
+    eventos = []
+    procesados = 0
+    posicion = inicio
+    while posicion < fin:
+        if con_seek and posicion != inicio:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, posicion)
+        ok, frame = cap.read()
+        if not ok:
+            break
+        procesados += 1
+
+        _, face_encodings = detectar_y_codificar(frame, opciones['escala'], opciones['detector'])
+        for resultado in indice.comparar_lote(face_encodings):
+            _, estudiante_id, confianza, registrable = clasificar_coincidencia(resultado, opciones['margen_minimo'])
+            if registrable:
+                eventos.append((posicion / fps, estudiante_id, confianza))
+
+        if not con_seek:
+            # Avanzar sin decodificar a color los frames intermedios
+            for _ in range(paso - 1):
+                if not cap.grab():
+                    break
+        posicion += paso
+
+    cap.release()
+    return eventos, procesados
+
+
+def combinar_eventos(eventos, min_detecciones=2):
+    """Primera aparición, cantidad de detecciones y confianza máxima por estudiante"""
+    por_estudiante = {}
+    for segundo, estudiante_id, confianza in sorted(eventos):
+        if estudiante_id not in por_estudiante:
+            por_estudiante[estudiante_id] = {'estudiante_id': estudiante_id, 'segundo': segundo,
+                                              'detecciones': 0, 'confianza': 0.0}
+        evento = por_estudiante[estudiante_id]
+        evento['detecciones'] += 1
+        evento['confianza'] = max(evento['confianza'], confianza)
+    # Varias detecciones independientes filtran falsos positivos de un solo frame
+    return sorted((e for e in por_estudiante.values() if e['detecciones'] >= min_detecciones),
+                  key=lambda e: e['segundo'])
+
+
+class ProcesadorVideo:
+    """Reconocimiento sobre un archivo de video, más rápido que tiempo real"""
+
+    def __init__(self, db, num_procesos=None, paso=15, con_seek=False, modo_comparacion='min',
+                 margen_minimo=0.05, escala=0.5, detector=None, min_detecciones=2):
+        self.db = db
+        self.num_procesos = num_procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.paso = max(1, paso)
+        self.con_seek = con_seek
+        self.min_detecciones = min_detecciones
+        self.opciones = {
+            'modo_comparacion': modo_comparacion,
+            'margen_minimo': margen_minimo,
+            'escala': escala,
+            'detector': detector or db.detector_configurado(),
+            'umbrales': db.cargar_umbrales(),
+        }
+
+    def _tramos(self, ruta_video, desde, hasta):
+        """(fps, frames a recorrer, tramos); frames es None si el contenedor no informa la cantidad"""
+        fps, total = propiedades_video(ruta_video)
+        inicio = int(desde * fps)
+        if total <= 0:
+            # Sin cantidad de frames no se puede repartir: una pasada secuencial hasta el final
+            print("⚠️ El video no informa su cantidad de frames; se procesa en un solo tramo secuencial")
+            fin = int(hasta * fps) if hasta is not None else float('inf')
+            return fps, None, [(inicio, fin)]
+        fin = min(total, int(hasta * fps)) if hasta is not None else total
+        muestras = max(0, (fin - inicio + self.paso - 1) // self.paso)
+        # Tramos alineados al paso: el muestreo es idéntico con cualquier cantidad de procesos
+        por_tramo = max(1, -(-muestras // self.num_procesos)) * self.paso
+        tramos = [(a, min(a + por_tramo, fin)) for a in range(inicio, fin, por_tramo)]
+        return fps, fin - inicio, tramos
+
+    def procesar(self, ruta_video, desde=0.0, hasta=None):
+        """Reconocer el video y retornar (eventos combinados, resumen)"""
+        # El snapshot debe estar al día y legible antes de que los procesos lo mapeen
+        self.db.actualizar_snapshot_galeria()
+        if abrir_snapshot(self.db.ruta_snapshot) is None:
+            # Archivo dañado con la firma correcta (p. ej. escritura interrumpida): reescribirlo
+            self.db.regenerar_snapshot_galeria()
+            if abrir_snapshot(self.db.ruta_snapshot) is None:
+                raise RuntimeError(f"No se pudo escribir el snapshot de la galería: {self.db.ruta_snapshot}")
+        fps, num_frames, tramos = self._tramos(ruta_video, desde, hasta)
+        # Con la cantidad de frames desconocida, el seek podría saltar más allá del final
+        con_seek = self.con_seek and num_frames is not None
+        tareas = [(ruta_video, self.db.ruta_snapshot, a, b, self.paso, con_seek, self.opciones)
+                  for a, b in tramos]
+
+        inicio = time.perf_counter()
+        if len(tareas) <= 1:
+            resultados = [_procesar_tramo(t) for t in tareas]
+        else:
+            contexto = mp.get_context("spawn")
+            with contexto.Pool(len(tareas)) as pool:
+                resultados = pool.map(_procesar_tramo, tareas)
+        transcurrido = time.perf_counter() - inicio
+
+        eventos = combinar_eventos([e for eventos_tramo, _ in resultados for e in eventos_tramo],
+                                   self.min_detecciones)
+        frames_procesados = sum(n for _, n in resultados)
+        if num_frames is None:
+            # Aproximada por los frames muestreados
+            num_frames = frames_procesados * self.paso
+        duracion_video = num_frames / fps if fps else 0.0
+        resumen = {
+            'duracion_video_s': duracion_video,
+            'segundos': transcurrido,
+            'frames_procesados': frames_procesados,
+            'tramos': len(tareas),
+            'factor_tiempo_real': duracion_video / transcurrido if transcurrido else 0.0,
+            'estudiantes': len(eventos),
+        }
+        return eventos, resumen
+
+    def registrar(self, eventos, fecha, hora_inicio):
+        """Registrar los eventos bajo la fecha indicada; la hora es hora_inicio + segundo del video"""
+        base = datetime.combine(fecha, hora_inicio)
+        registros = [(e['estudiante_id'], 'rostro', e['confianza'], base + timedelta(seconds=e['segundo']))
+                     for e in eventos]
+        estados = self.db.registrar_asistencias_lote(registros)
+        return sum(1 for estado in estados if estado is not None)
+
+
+def _formato_segundos(segundos):
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas:02d}:{minutos:02d}:{segundos:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('video')
+    parser.add_argument('--fecha', required=True, help='fecha de la clase (AAAA-MM-DD)')
+    parser.add_argument('--hora-inicio', default=None, help='hora real del primer frame (HH:MM:SS); por defecto la hora de entrada')
+    parser.add_argument('--db', default='asistencias.db')
+    parser.add_argument('--paso', type=int, default=15, help='procesar 1 de cada N frames')
+    parser.add_argument('--seek', action='store_true', help='saltar entre muestras con seek en lugar de leer en secuencia')
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--desde', type=float, default=0.0, help='segundo inicial')
+    parser.add_argument('--hasta', type=float, default=None, help='segundo final')
+    parser.add_argument('--min-detecciones', type=int, default=2)
+    parser.add_argument('--detector', choices=sorted(DETECTORES), default=None,
+                        help='por defecto el configurado en la base de datos')
+    parser.add_argument('--sin-registrar', action='store_true', help='solo mostrar eventos y tiempos')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager(args.db)
+    fecha = datetime.strptime(args.fecha, '%Y-%m-%d').date()
+    if args.hora_inicio:
+        hora_inicio = datetime.strptime(args.hora_inicio, '%H:%M:%S').time()
+    else:
+        cursor = db.conexion().execute("SELECT hora_entrada FROM configuracion WHERE id = 1")
+        hora_inicio = datetime.strptime(cursor.fetchone()[0], '%H:%M:%S').time()
+
+    procesador = ProcesadorVideo(db, args.procesos, args.paso, args.seek, min_detecciones=args.min_detecciones,
+                                 detector=args.detector)
+    eventos, resumen = procesador.procesar(args.video, args.desde, args.hasta)
+
+    nombres = {e[0]: f"{e[2]} {e[3]}" for e in db.obtener_estudiantes()}
+    print(f"\n🎬 {len(eventos)} estudiantes reconocidos")
+    for evento in eventos:
+        print(f"  {_formato_segundos(evento['segundo'])}  {nombres.get(evento['estudiante_id'], evento['estudiante_id'])} "
+              f"({evento['detecciones']} detecciones, confianza {evento['confianza']:.2f})")
+    print(f"⏱️ {resumen['duracion_video_s']:.0f} s de video en {resumen['segundos']:.1f} s "
+          f"({resumen['factor_tiempo_real']:.1f}x tiempo real, {resumen['frames_procesados']} frames, "
+          f"{resumen['tramos']} tramos)")
+
+    if not args.sin_registrar:
+        nuevos = procesador.registrar(eventos, fecha, hora_inicio)
+        print(f"✅ {nuevos} asistencias registradas para {fecha} ({len(eventos) - nuevos} ya existían)")
+    db.cerrar()
+
+
+if __name__ == "__main__":
+    main()
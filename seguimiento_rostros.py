@@ -0,0 +1,141 @@
+# seguimiento_rostros.py
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+def iou(cajas_a, cajas_b):
+    """Matriz de intersección sobre unión entre cajas (top, right, bottom, left)"""
+    a = np.asarray(cajas_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(cajas_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    interseccion = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - interseccion
+    return np.where(union > 0, interseccion / np.maximum(union, 1e-6), 0.0)
+
+
+class Pista:
+    """Estado de un rostro seguido entre frames"""
+
+    def __init__(self, id_pista, ubicacion, ahora):
+        self.id = id_pista
+        self.ubicacion = ubicacion
+        self.visto_en = ahora
+        self.codificado_en = None
+        # Identidad: candidato actual y cuántas observaciones consecutivas lo confirman
+        self.candidato = None
+        self.nombre_candidato = "Desconocido"
+        self.racha = 0
+        self.estudiante_id = None
+        self.nombre = "Desconocido"
+        self.confianza = 0.0
+
+    def observar(self, estudiante_id, nombre, confianza, ahora, confirmaciones):
+        """Registrar el resultado de un encoding nuevo para esta pista"""
+        self.codificado_en = ahora
+        if estudiante_id == self.candidato:
+            self.racha += 1
+        else:
+            self.candidato, self.nombre_candidato, self.racha = estudiante_id, nombre, 1
+        self.confianza = confianza
+        if self.racha >= confirmaciones:
+            self.estudiante_id, self.nombre = self.candidato, self.nombre_candidato
+
+    @property
+    def confirmada(self):
+        return self.estudiante_id is not None and self.estudiante_id == self.candidato
+
+
+class SeguidorRostros:
+    """Asociación por IoU de las detecciones entre frames
+
+    Una pista identificada reutiliza su identidad: el rostro solo se vuelve a
+    codificar cada `intervalo_recodificar` segundos o cuando la pista se pierde.
+    La identidad cambia únicamente tras `confirmaciones` observaciones seguidas.
+    """
+
+    def __init__(self, umbral_iou=0.3, intervalo_recodificar=2.0, max_perdida=1.0, confirmaciones=2):
+        self.umbral_iou = umbral_iou
+        self.intervalo_recodificar = intervalo_recodificar
+        self.max_perdida = max_perdida
+        self.confirmaciones = confirmaciones
+        self.pistas = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.encodings_calculados = 0
+        self.encodings_omitidos = 0
+
+    def _emparejar(self, face_locations, pistas):
+        """Emparejamiento voraz por IoU descendente: {índice de detección: pista}"""
+        if not face_locations or not pistas:
+            return {}
+        matriz = iou(face_locations, [p.ubicacion for p in pistas])
+        pares = {}
+        usadas = set()
+        for fila, columna in zip(*np.unravel_index(np.argsort(-matriz, axis=None), matriz.shape)):
+            if matriz[fila, columna] < self.umbral_iou:
+                break
+            if fila in pares or columna in usadas:
+                continue
+            pares[fila] = pistas[columna]
+            usadas.add(columna)
+        return pares
+
+    def omitir_encoding(self, face_locations, ahora=None):
+        """Máscara de detecciones cubiertas por una pista confirmada y codificada hace poco"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            vigentes = [p for p in self.pistas.values()
+                        if p.confirmada and ahora - p.codificado_en < self.intervalo_recodificar]
+            pares = self._emparejar(list(face_locations), vigentes)
+            mascara = [i in pares for i in range(len(face_locations))]
+            self.encodings_omitidos += len(pares)
+            self.encodings_calculados += len(mascara) - len(pares)
+        return mascara
+
+    def asociar(self, face_locations, ahora=None):
+        """Asignar cada detección a una pista (creando las nuevas) y descartar las perdidas"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            for id_pista in [i for i, p in self.pistas.items() if ahora - p.visto_en > self.max_perdida]:
+                del self.pistas[id_pista]
+
+            pares = self._emparejar(list(face_locations), list(self.pistas.values()))
+            asignadas = []
+            for i, ubicacion in enumerate(face_locations):
+                pista = pares.get(i)
+                if pista is None:
+                    pista = Pista(next(self._ids), ubicacion, ahora)
+                    self.pistas[pista.id] = pista
+                pista.ubicacion = ubicacion
+                pista.visto_en = ahora
+                asignadas.append(pista)
+            return asignadas
+
+    def ubicaciones_activas(self):
+        """Última ubicación de cada pista viva (regiones que la compuerta de movimiento no debe ignorar)"""
+        with self._lock:
+            return [p.ubicacion for p in self.pistas.values()]
+
+    def perdidas_recientes(self, excluir, ahora=None, ventana=0.5):
+        """Pistas identificadas no detectadas en este frame pero vistas hace menos de `ventana` s"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            return [p for p in self.pistas.values()
+                    if p.id not in excluir and p.estudiante_id is not None and ahora - p.visto_en < ventana]
+
+    def resumen(self):
+        total = self.encodings_calculados + self.encodings_omitidos
+        return {
+            'pistas_activas': len(self.pistas),
+            'encodings_calculados': self.encodings_calculados,
+            'encodings_omitidos': self.encodings_omitidos,
+            'fraccion_omitida': self.encodings_omitidos / total if total else 0.0,
+        }
@@ -1,48 +1,218 @@
 # sistema_asistencias.py (versión mejorada)
 import cv2
-import face_recognition
-import numpy as np
 from database import DatabaseManager
+from galeria import GaleriaFacial, IndiceEstudiantes, UMBRAL_DISTANCIA
+from indices_galeria import ruta_indice
+from pipeline_monitoreo import PipelineMonitoreo
+from motor_procesos import MotorReconocimientoProcesos, detectar_y_codificar
+from escritor_asistencias import EscritorAsistencias
+from cache_presencia import CachePresencia
+from seguimiento_rostros import SeguidorRostros
+from controlador_adaptativo import ControladorAdaptativo
+from compuerta_movimiento import CompuertaMovimiento
+from detectores import detector_compartido
 from datetime import datetime
+import threading
 import time
 
+# Umbral de confianza para registrar asistencia (el de distancia está en galeria.py y
+# puede ajustarse por estudiante con colisiones_galeria.py)
+UMBRAL_CONFIANZA = 0.6
+
+
+def clasificar_coincidencia(resultado, margen_minimo):
+    """Decidir sobre un resultado de comparar_lote: (nombre, estudiante_id, confianza, registrable)"""
+    best_distance = resultado['distancia']
+    if best_distance is None:
+        return "Desconocido", None, 0.0, False
+    if best_distance >= (resultado.get('umbral') or UMBRAL_DISTANCIA):
+        return "Desconocido", None, best_distance, False
+    
+    # Convertir distancia a confianza (0-1)
+    confianza = 1 - best_distance
+    # Prueba de margen: si el segundo estudiante está casi igual de cerca, es ambiguo
+    segunda_distancia = resultado['segunda_distancia']
+    ambiguo = (segunda_distancia is not None and
+               segunda_distancia - best_distance < margen_minimo)
+    registrable = confianza > UMBRAL_CONFIANZA and not ambiguo
+    return resultado['nombre'], resultado['estudiante_id'], confianza, registrable
+
+
 class SistemaAsistencias:
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, modo_comparacion='min', margen_minimo=0.05, backend_indice='auto', db_path='asistencias.db'):
+        self.db = DatabaseManager(db_path)
         self.known_face_encodings = []
         self.known_face_names = []
         self.known_face_ids = []
+        
+        # Comparación por estudiante: 'min' (todos sus encodings) o 'centroide'
+        self.modo_comparacion = modo_comparacion
+        # Diferencia mínima entre el primer y segundo estudiante para registrar asistencia
+        self.margen_minimo = margen_minimo
+        # Backend de búsqueda: 'fuerza_bruta', 'ivf' (aproximado) o 'auto' según el tamaño
+        self.backend_indice = backend_indice
+        self.galeria = GaleriaFacial([], [], [])
+        self.indice = IndiceEstudiantes(self.galeria, self.modo_comparacion)
+        
+        # Recarga incremental de la galería (manual con 'r' o en segundo plano)
+        self._firma_galeria = None
+        self._lock_recarga = threading.Lock()
+        self._detener_recarga = threading.Event()
+        self._hilo_recarga = None
+        
+        # Estudiantes ya marcados hoy (precargado desde asistencias, incluye lo encolado)
+        self.presencia = CachePresencia(self.db, 'rostro')
+        # Las asistencias se escriben en lotes desde un hilo aparte, fuera del bucle de video;
+        # un lote que no se pudo escribir se desmarca para que se vuelva a registrar
+        self.escritor = EscritorAsistencias(self.db, al_fallar=self._desmarcar_lote)
+        
+        # Detector de rostros de la instalación, compartido con la inscripción
+        self.detector = detector_compartido(self.db.detector_configurado())
+        
+        # Pool de procesos opcional para detección/encoding (ver usar_motor_procesos)
+        self.motor = None
         self.cargar_encodings()
         
-        # Mejor control de frames
-        self.frame_skip = 2  # Procesar cada 2 frames
+        # Paso de frames, escala y upsampling ajustados según la latencia medida
+        self.controlador = ControladorAdaptativo()
+        # Pre-filtro de movimiento: sin cambios no hay detección, y con cambios solo en esas regiones
+        self.compuerta = CompuertaMovimiento()
         self.frame_count = 0
         
-        # Suavizado para detecciones
-        self.detection_history = {}
-        self.history_length = 5
+        # Seguimiento entre frames: reutiliza la identidad y evita recodificar rostros quietos
+        self.seguidor = SeguidorRostros()
         
     def cargar_encodings(self):
-        """Cargar encodings faciales desde la base de datos"""
-        self.known_face_encodings, self.known_face_names, self.known_face_ids = self.db.cargar_encodings_faciales()
+        """Cargar encodings faciales desde el snapshot mapeado de la galería"""
+        with self._lock_recarga:
+            # El snapshot se regenera si está desactualizado; su firma es la de los datos que contiene
+            encoding_ids, encodings, nombres, ids, self._firma_galeria = self.db.abrir_snapshot_galeria()
+            # Matriz float32 en np.memmap: compartida entre procesos vía page cache
+            self._actualizar_galeria(GaleriaFacial(encodings, nombres, ids, encoding_ids))
         print(f"🔍 Sistema listo con {len(self.known_face_encodings)} encodings de {len(set(self.known_face_ids))} estudiantes")
     
+    def _actualizar_galeria(self, galeria):
+        """Construir el índice para la nueva galería y reemplazar las referencias"""
+        indice = IndiceEstudiantes(
+            galeria, self.modo_comparacion, self.backend_indice,
+            ruta_persistencia=ruta_indice(self.db.db_path, self.modo_comparacion),
+            umbrales=self.db.cargar_umbrales()
+        )
+        # Asignaciones simples: el hilo de video ve la galería anterior o la nueva, nunca una mezcla
+        self.galeria = galeria
+        self.indice = indice
+        self.known_face_encodings = galeria.matriz
+        self.known_face_names = galeria.nombres
+        self.known_face_ids = galeria.ids.tolist()
+    
+    def recargar_incremental(self):
+        """Aplicar solo los cambios de la galería desde la última carga
+
+        Compara los ids de encodings_faciales de estudiantes activos con los que ya
+        están en memoria: lee los BLOBs únicamente de las filas nuevas y descarta las
+        filas eliminadas o de estudiantes desactivados. Los nombres editados se
+        actualizan sin releer encodings.
+        """
+        with self._lock_recarga:
+            firma = self.db.firma_galeria()
+            if firma == self._firma_galeria:
+                return False
+            
+            ids_actuales = set(self.db.obtener_ids_galeria())
+            ids_en_memoria = set(self.galeria.encoding_ids.tolist())
+            nuevos = sorted(ids_actuales - ids_en_memoria)
+            eliminados = ids_en_memoria - ids_actuales
+            
+            encoding_ids, encodings, nombres, ids = self.db.cargar_encodings_por_id(nuevos)
+            galeria = self.galeria.con_cambios(encodings, nombres, ids, encoding_ids, eliminados)
+            actuales = self.db.nombres_estudiantes_activos()
+            nombres_galeria = [actuales.get(e, n) for e, n in zip(galeria.ids.tolist(), galeria.nombres)]
+            if nombres_galeria != galeria.nombres:
+                galeria = GaleriaFacial(galeria.matriz, nombres_galeria, galeria.ids, galeria.encoding_ids)
+            self._actualizar_galeria(galeria)
+            self._firma_galeria = firma
+        
+        print(f"🔄 Galería actualizada: +{len(encoding_ids)} / -{len(eliminados)} encodings "
+              f"({len(self.galeria)} en total)")
+        return True
+    
+    def iniciar_recarga_automatica(self, intervalo=5.0):
+        """Revisar cambios en la galería cada `intervalo` segundos en un hilo en segundo plano"""
+        if self._hilo_recarga and self._hilo_recarga.is_alive():
+            return
+        
+        def revisar():
+            while not self._detener_recarga.wait(intervalo):
+                try:
+                    self.recargar_incremental()
+                except Exception as e:
+                    print(f"⚠️ Error en recarga automática: {e}")
+        
+        self._detener_recarga.clear()
+        self._hilo_recarga = threading.Thread(target=revisar, name="recarga-galeria", daemon=True)
+        self._hilo_recarga.start()
+    
+    def detener_recarga_automatica(self):
+        """Detener el hilo de recarga automática"""
+        self._detener_recarga.set()
+        if self._hilo_recarga:
+            self._hilo_recarga.join(timeout=2)
+            self._hilo_recarga = None
+    
     def procesar_frame_mejorado(self, frame):
 
         self.frame_count += 1
     
-        # Procesar solo cada X frames para mejor performance
-        if self.frame_count % self.frame_skip != 0:
+        regiones = self.preparar_frame(self.frame_count, frame)
+        if regiones is None:
             return [], [], [], []
         
-        # Reducir tamaño para procesamiento más rápido
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        
-        # Usar modelo HOG para mejor performance
-        face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        face_locations, face_encodings = self.detectar_y_codificar(frame, regiones)
+        return self.identificar_rostros(face_locations, face_encodings)
+    
+    def preparar_frame(self, secuencia, frame):
+        """Etapa previa (en orden de captura): paso de frames y compuerta de movimiento
+
+        Retorna None si el paso de frames lo omite, o las regiones a detectar: una
+        lista vacía (escena sin cambios) no cuesta detección, pero sigue pasando
+        por identificar_rostros para que las pistas y el resultado se actualicen.
+        """
+        # El controlador decide el paso de frames
+        if not self.controlador.debe_procesar(secuencia):
+            return None
+        # Las pistas vivas se incluyen aunque el rostro esté quieto
+        return self.compuerta.regiones(frame, self.seguidor.ubicaciones_activas())
+    
+    def detectar_y_codificar(self, frame, regiones=None):
+        """Etapa pesada y sin estado compartido: detección de rostros y encodings de 128-d"""
+        if regiones is not None and len(regiones) == 0:
+            # Compuerta cerrada: nada que detectar (y nada que medir para el controlador)
+            return [], []
         
+        inicio = time.perf_counter()
+        # Escala y upsampling del controlador; sin encoding para rostros ya seguidos
+        if self.motor is not None:
+            face_locations, face_encodings = self.motor.detectar_y_codificar(
+                frame, escala=self.controlador.escala, upsample=self.controlador.upsample,
+                regiones=regiones, omitir=self.seguidor.omitir_encoding
+            )
+        else:
+            face_locations, face_encodings = detectar_y_codificar(
+                frame, escala=self.controlador.escala, detector=self.detector,
+                omitir=self.seguidor.omitir_encoding, upsample=self.controlador.upsample,
+                regiones=regiones
+            )
+        self.controlador.registrar(1000 * (time.perf_counter() - inicio), face_locations)
+        return face_locations, face_encodings
+    
+    def identificar_rostros(self, face_locations, face_encodings):
+        """Etapa ligera: asociar a pistas, comparar con la galería y registrar asistencias
+
+        Los rostros sin encoding (None) pertenecen a pistas ya identificadas y
+        reutilizan su identidad. Las pistas identificadas que no se detectaron
+        en este frame se mantienen un instante para evitar parpadeo.
+        """
+        ahora = time.monotonic()
         face_names = []
         face_ids = []
         confianzas = []
@@ -50,120 +220,39 @@ class SistemaAsistencias:
         # Lista para evitar registrar múltiples veces en el mismo frame
         estudiantes_registrados_este_frame = []
         
-        for face_encoding in face_encodings:
-            # Comparar con rostros conocidos
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                best_distance = face_distances[best_match_index]
-                
-                # Convertir distancia a confianza (0-1)
-                confianza = 1 - best_distance
+        # Comparar todos los rostros codificados del frame contra la galería en una sola operación
+        codificados = [encoding for encoding in face_encodings if encoding is not None]
+        resultados = iter(self.indice.comparar_lote(codificados))
+        pistas = self.seguidor.asociar(face_locations, ahora)
+        
+        for pista, encoding in zip(pistas, face_encodings):
+            if encoding is not None:
+                name, estudiante_id, confianza, registrable = clasificar_coincidencia(next(resultados), self.margen_minimo)
+                pista.observar(estudiante_id, name, confianza, ahora, self.seguidor.confirmaciones)
                 
-                # Umbral más permisivo para mejor detección
-                if best_distance < 0.6:  # Más permisivo que antes
-                    name = self.known_face_names[best_match_index]
-                    estudiante_id = self.known_face_ids[best_match_index]
-                    
-                    # Registrar asistencia solo si la confianza es alta y no se registró ya en este frame
-                    if confianza > 0.6 and estudiante_id not in estudiantes_registrados_este_frame:
-                        self.registrar_asistencia_unica(estudiante_id, confianza)
-                        estudiantes_registrados_este_frame.append(estudiante_id)
-                else:
-                    name = "Desconocido"
-                    estudiante_id = None
-                    confianza = best_distance
-            else:
-                name = "Desconocido"
-                estudiante_id = None
-                confianza = 0.0
+                # Registrar asistencia solo con identidad confirmada por la pista y una vez por frame
+                if registrable and pista.confirmada and estudiante_id not in estudiantes_registrados_este_frame:
+                    self.registrar_asistencia_unica(estudiante_id, confianza)
+                    estudiantes_registrados_este_frame.append(estudiante_id)
             
-            face_names.append(name)
-            face_ids.append(estudiante_id)
-            confianzas.append(confianza)
-        
-        # Escalar coordenadas de vuelta al tamaño original
-        face_locations = [(top * 2, right * 2, bottom * 2, left * 2) 
-                        for (top, right, bottom, left) in face_locations]
+            # Mostrar la identidad confirmada; mientras tanto, el candidato actual
+            if pista.estudiante_id is not None:
+                face_names.append(pista.nombre)
+                face_ids.append(pista.estudiante_id)
+            else:
+                face_names.append(pista.nombre_candidato)
+                face_ids.append(pista.candidato)
+            confianzas.append(pista.confianza)
         
-        # Aplicar suavizado a las detecciones
-        face_locations, face_names, face_ids, confianzas = self.aplicar_suavizado(
-            face_locations, face_names, face_ids, confianzas
-        )
+        face_locations = list(face_locations)
+        for pista in self.seguidor.perdidas_recientes({p.id for p in pistas}, ahora):
+            face_locations.append(pista.ubicacion)
+            face_names.append(pista.nombre)
+            face_ids.append(pista.estudiante_id)
+            confianzas.append(pista.confianza)
         
         return face_locations, face_names, face_ids, confianzas
     
-    def aplicar_suavizado(self, face_locations, face_names, face_ids, confianzas):
-        """Aplicar suavizado mejorado para reducir parpadeo"""
-        current_time = time.time()
-        
-        # Limpiar detecciones antiguas (más tiempo para mejor estabilidad)
-        to_remove = []
-        for key in self.detection_history:
-            if current_time - self.detection_history[key]['timestamp'] > 3.0:  # 3 segundos en lugar de 2
-                to_remove.append(key)
-        
-        for key in to_remove:
-            del self.detection_history[key]
-        
-        # Actualizar historial con detecciones actuales
-        for i, (location, name, face_id, confianza) in enumerate(zip(face_locations, face_names, face_ids, confianzas)):
-            if face_id and name != "Desconocido":
-                key = f"{face_id}"
-                if key not in self.detection_history:
-                    self.detection_history[key] = {
-                        'locations': [],
-                        'names': [],
-                        'confianzas': [],
-                        'timestamp': current_time,
-                        'count': 0
-                    }
-                
-                self.detection_history[key]['locations'].append(location)
-                self.detection_history[key]['names'].append(name)
-                self.detection_history[key]['confianzas'].append(confianza)
-                self.detection_history[key]['count'] += 1
-                self.detection_history[key]['timestamp'] = current_time
-                
-                # Mantener solo el historial reciente
-                if len(self.detection_history[key]['locations']) > self.history_length:
-                    self.detection_history[key]['locations'].pop(0)
-                    self.detection_history[key]['names'].pop(0)
-                    self.detection_history[key]['confianzas'].pop(0)
-        
-        # Usar historial para estabilizar detecciones actuales
-        stabilized_locations = []
-        stabilized_names = []
-        stabilized_ids = []
-        stabilized_confianzas = []
-        
-        for key, history in self.detection_history.items():
-            if history['count'] >= 2:  # Solo usar si se detectó al menos 2 veces
-                if len(history['locations']) > 0:
-                    # Usar la ubicación promedio del historial
-                    avg_location = (
-                        int(np.mean([loc[0] for loc in history['locations']])),
-                        int(np.mean([loc[1] for loc in history['locations']])),
-                        int(np.mean([loc[2] for loc in history['locations']])),
-                        int(np.mean([loc[3] for loc in history['locations']]))
-                    )
-                    avg_name = max(set(history['names']), key=history['names'].count)
-                    avg_confianza = np.mean(history['confianzas'])
-                    
-                    face_id = int(key) if key.isdigit() else None
-                    
-                    stabilized_locations.append(avg_location)
-                    stabilized_names.append(avg_name)
-                    stabilized_ids.append(face_id)
-                    stabilized_confianzas.append(avg_confianza)
-        
-        # Si hay detecciones actuales, priorizarlas sobre el historial
-        if face_locations:
-            return face_locations, face_names, face_ids, confianzas
-        else:
-            return stabilized_locations, stabilized_names, stabilized_ids, stabilized_confianzas
-    
     def dibujar_resultados_mejorados(self, frame, face_locations, face_names, confianzas):
         """Dibujar resultados mejorados con información de asistencias"""
         estudiantes_detectados = set()
@@ -227,68 +316,67 @@ class SistemaAsistencias:
         self.last_time = current_time
         return int(self.fps)
     
+    def _desmarcar_lote(self, lote):
+        for estudiante_id, _, _, momento in lote:
+            self.presencia.desmarcar(estudiante_id, momento.date())
+    
     def registrar_asistencia_unica(self, estudiante_id, confianza):
         """Registrar asistencia solo si no se ha registrado hoy"""
-        hoy = datetime.now().date()
-        conn = self.db._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id FROM asistencias 
-            WHERE estudiante_id = ? AND fecha = ? AND metodo_deteccion = 'rostro'
-        ''', (estudiante_id, hoy))
-        
-        if cursor.fetchone() is None:
-            self.db.registrar_asistencia(estudiante_id, 'rostro', confianza)
-            print(f"✅ Asistencia registrada: Estudiante {estudiante_id}")
-        
-        conn.close()
+        ahora = datetime.now()
+        # Verificación O(1) en memoria; el índice único de asistencias es la garantía final
+        if self.presencia.marcar_si_nuevo(estudiante_id, ahora.date()):
+            # La escritura real la hace el hilo escritor en lote
+            self.escritor.encolar(estudiante_id, 'rostro', confianza, ahora)
+    
+    def usar_motor_procesos(self, num_procesos=None):
+        """Repartir detección y encoding entre varios procesos (todos los núcleos)"""
+        if self.motor is None:
+            self.motor = MotorReconocimientoProcesos(num_procesos, detector=self.detector.nombre)
+            print(f"⚙️ Motor de reconocimiento con {self.motor.num_procesos} procesos")
+        return self.motor
     
-    def iniciar_monitoreo_mejorado(self):
-        """Iniciar el sistema de monitoreo mejorado"""
+    def cerrar_motor_procesos(self):
+        if self.motor is not None:
+            self.motor.cerrar()
+            self.motor = None
+    
+    def iniciar_monitoreo_mejorado(self, fuente=0, num_trabajadores=2, num_procesos=0):
+        """Iniciar el sistema de monitoreo mejorado
+
+        `fuente` puede ser el índice de la cámara o la ruta de un archivo de video o
+        de una carpeta de imágenes.
+        Con `num_procesos` > 0 la detección y el encoding corren en un pool de procesos.
+        """
         print("🚀 INICIANDO SISTEMA DE ASISTENCIAS MEJORADO")
         print("Presiona 'q' para salir")
-        print("Presiona 'r' para recargar encodings")
-        print("Presiona 'f' para cambiar modo de detección")
+        print("Presiona 'r' para recargar encodings (también se actualizan automáticamente)")
+        print("Presiona 'f' para alternar entre ajuste automático y modo fijo")
+        print("Presiona 's' para ver la latencia por etapa")
         
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("❌ No se puede acceder a la cámara")
-            return
+        # Un monitoreo anterior cerró el escritor: uno nuevo para escribir en lote otra vez
+        if self.escritor.cerrado:
+            self.escritor = EscritorAsistencias(self.db, al_fallar=self._desmarcar_lote)
+        
+        # Los estudiantes registrados desde GestorEstudiantes aparecen sin detener el video
+        self.iniciar_recarga_automatica()
         
-        # Configurar cámara para mejor performance
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
+        if num_procesos:
+            # Un hilo del pipeline por proceso: cada hilo espera el resultado de su frame
+            num_trabajadores = self.usar_motor_procesos(num_procesos).num_procesos
         
+        # Captura, inferencia y render en hilos separados con colas acotadas
+        pipeline = PipelineMonitoreo(self, fuente, num_trabajadores=num_trabajadores)
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    print("❌ Error al capturar frame")
-                    break
-                
-                # Procesar frame mejorado
-                face_locations, face_names, face_ids, confianzas = self.procesar_frame_mejorado(frame)
-                
-                # Dibujar resultados mejorados
-                frame = self.dibujar_resultados_mejorados(frame, face_locations, face_names, confianzas)
-                
-                # Mostrar frame
-                cv2.imshow('Sistema de Asistencias - Reconocimiento Facial MEJORADO', frame)
-                
-                # Controles
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    break
-                elif key == ord('r'):
-                    self.cargar_encodings()
-                    print("✅ Encodings recargados")
-                elif key == ord('f'):
-                    self.frame_skip = 1 if self.frame_skip == 2 else 2
-                    print(f"✅ Modo frame skip: {self.frame_skip}")
-                
+            if pipeline.ejecutar() is not None:
+                pipeline.imprimir_resumen()
         finally:
-            cap.release()
-            cv2.destroyAllWindows()
-            print("✅ Sistema de monitoreo detenido")
\ No newline at end of file
+            self.detener_recarga_automatica()
+            # El hilo escritor termina su lote en curso y vacía la cola antes de salir
+            self.escritor.cerrar()
+            print(f"📝 Escritor de asistencias: {self.escritor.estadisticas()}")
+            print(f"👣 Seguimiento de rostros: {self.seguidor.resumen()}")
+            print(f"🎛️ Controlador adaptativo: {self.controlador.metricas()}")
+            print(f"🚪 Compuerta de movimiento: {self.compuerta.metricas()}")
+            if num_procesos:
+                self.cerrar_motor_procesos()
+            print("✅ Sistema de monitoreo detenido")
@@ -0,0 +1,96 @@
+# snapshot_galeria.py
+"""Snapshot de la galería en un único archivo para abrirlo con np.memmap
+
+Estructura (little-endian):
+  [cabecera de 64 bytes] b'GALSNAP1', n, dimensión, firma (3 × int64), bytes de nombres
+  [matriz float32 (n, dimensión)]
+  [estudiante_id int64 (n)]
+  [encoding_id int64 (n)]
+  [nombres en JSON UTF-8]
+
+Las filas se guardan ordenadas por estudiante para que IndiceEstudiantes no
+tenga que reordenar (ni copiar) la matriz. El archivo se reemplaza de forma
+atómica: los procesos que ya lo tienen mapeado siguen viendo la versión anterior.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGICO = b'GALSNAP1'
+CABECERA = struct.Struct('<8sQQqqqQ')
+TAMANO_CABECERA = 64
+
+
+def ruta_snapshot(db_path):
+    """Archivo de snapshot asociado a una base de datos"""
+    base, _ = os.path.splitext(db_path)
+    return f"{base}.galeria.snap"
+
+
+def escribir_snapshot(ruta, matriz, nombres, ids, encoding_ids, firma):
+    """Escribir el snapshot en un temporal y reemplazar el anterior"""
+    matriz = np.asarray(matriz, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+    orden = np.lexsort((encoding_ids, ids))
+    nombres_json = json.dumps([nombres[i] for i in orden], ensure_ascii=False).encode('utf-8')
+
+    cabecera = CABECERA.pack(MAGICO, len(ids), matriz.shape[1], *firma, len(nombres_json))
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as archivo:
+        archivo.write(cabecera.ljust(TAMANO_CABECERA, b'\0'))
+        archivo.write(np.ascontiguousarray(matriz[orden]).tobytes())
+        archivo.write(ids[orden].tobytes())
+        archivo.write(encoding_ids[orden].tobytes())
+        archivo.write(nombres_json)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def leer_firma(ruta):
+    """Firma de la galería guardada en el snapshot, o None si no existe o no es válido"""
+    try:
+        with open(ruta, 'rb') as archivo:
+            datos = archivo.read(CABECERA.size)
+    except OSError:
+        return None
+    if len(datos) < CABECERA.size:
+        return None
+    magico, _, _, *firma, _ = CABECERA.unpack(datos)
+    return tuple(firma) if magico == MAGICO else None
+
+
+def abrir_snapshot(ruta):
+    """Mapear el snapshot en memoria: (encoding_ids, matriz, nombres, ids, firma)
+
+    La matriz y los ids son np.memmap de solo lectura: varios procesos que abren
+    el mismo archivo comparten las páginas del page cache. Retorna None si el
+    archivo no existe o está incompleto.
+    """
+    try:
+        tamano = os.path.getsize(ruta)
+        with open(ruta, 'rb') as archivo:
+            magico, n, dimension, *resto = CABECERA.unpack(archivo.read(CABECERA.size))
+            firma, bytes_nombres = tuple(resto[:3]), resto[3]
+            if magico != MAGICO:
+                return None
+            inicio_ids = TAMANO_CABECERA + n * dimension * 4
+            inicio_nombres = inicio_ids + 2 * n * 8
+            if tamano != inicio_nombres + bytes_nombres:
+                return None
+            archivo.seek(inicio_nombres)
+            nombres = json.loads(archivo.read(bytes_nombres).decode('utf-8'))
+    except (OSError, struct.error, ValueError):
+        return None
+
+    if n == 0:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, np.empty((0, dimension), dtype=np.float32), nombres, vacio, firma
+
+    matriz = np.memmap(ruta, dtype=np.float32, mode='r', offset=TAMANO_CABECERA, shape=(n, dimension))
+    ids = np.memmap(ruta, dtype=np.int64, mode='r', offset=inicio_ids, shape=(n,))
+    encoding_ids = np.memmap(ruta, dtype=np.int64, mode='r', offset=inicio_ids + n * 8, shape=(n,))
+    return encoding_ids, matriz, nombres, ids, firma